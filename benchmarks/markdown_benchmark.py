@@ -0,0 +1,117 @@
+"""
+Benchmark HTML cleaning and markdown conversion over a corpus of saved pages.
+
+Compares the original regex + markdownify implementation of get_markdown_content with the
+tree-based convert_html_to_markdown, reporting time and peak memory per page and the HTML
+parser in use.
+
+It also checks that the tree-based markdown matches a regex reference that strips the same
+STRIPPED_TAGS (the legacy cleaner only stripped script/img/head/style/footer, so its output
+is not expected to match on pages with nav, svg or similar chrome). Markdown is compared with
+whitespace collapsed, and the command exits with status 1 if any page differs.
+
+Usage:
+    uv run -m benchmarks.markdown_benchmark --corpus logs --repeat 3
+"""
+import argparse
+import os
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from markdownify import markdownify as md
+from src.utils.utils import HTML_PARSER, MARKDOWN_CONVERTED_TAGS, STRIPPED_TAGS, convert_html_to_markdown
+
+
+def legacy_convert_html_to_markdown(html: str) -> tuple[str, str]:
+    """The regex-based implementation get_markdown_content used before the tree-based cleaner."""
+    cleaned_html = re.sub(r'<(script|img|head|style|footer)[^>]*>.*?</\1>|<(script|img|head|style|footer)[^>]*?/>', '', html, flags=re.DOTALL)
+    markdown_content = md(cleaned_html, convert=['a', 'button', 'div', 'span', 'li', 'h1', 'h2', 'h3', 'h4', 'p', 'tr'])
+    return cleaned_html, markdown_content
+
+
+_REFERENCE_PATTERN = re.compile(
+    rf'<({"|".join(STRIPPED_TAGS)})\b[^>]*?/>|<({"|".join(STRIPPED_TAGS)})\b[^>]*>.*?</\2\s*>|<(?:img)\b[^>]*>',
+    flags=re.DOTALL | re.IGNORECASE,
+)
+
+
+def reference_markdown(html: str) -> str:
+    """Regex cleaning of the same tags the tree cleaner removes, for the output check."""
+    return md(_REFERENCE_PATTERN.sub('', html), convert=MARKDOWN_CONVERTED_TAGS)
+
+
+def normalize(markdown_content: str) -> str:
+    return " ".join(markdown_content.split())
+
+
+def first_difference(expected: str, actual: str, context: int = 80) -> str:
+    """Short excerpt of both texts around where they first differ."""
+    offset = len(os.path.commonprefix([expected, actual]))
+    return f"reference: ...{expected[max(0, offset - 20):offset + context]!r}\n    tree:      ...{actual[max(0, offset - 20):offset + context]!r}"
+
+
+def measure(convert: Callable[[str], tuple[str, str]], html: str, repeat: int) -> tuple[float, int, int]:
+    """Return the best wall time in seconds, the peak traced memory in bytes, and the markdown length."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, markdown_content = convert(html)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    convert(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(markdown_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default="logs", help="Directory searched recursively for saved .html pages")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per page; the fastest is reported")
+    args = parser.parse_args()
+
+    pages = sorted(Path(args.corpus).rglob("*.html"))
+    if not pages:
+        raise SystemExit(f"No .html files found under {args.corpus}")
+
+    implementations = {"legacy": legacy_convert_html_to_markdown, "tree": convert_html_to_markdown}
+    totals = {name: [0.0, 0] for name in implementations}
+    mismatches = []
+
+    print(f"HTML parser: {HTML_PARSER}")
+    print(f"{'page':<60} {'KB':>8} {'legacy ms':>10} {'tree ms':>10} {'legacy MB':>10} {'tree MB':>10}")
+    for page in pages:
+        html = page.read_text(encoding="utf-8", errors="ignore")
+        results = {name: measure(convert, html, args.repeat) for name, convert in implementations.items()}
+        for name, (seconds, peak, _) in results.items():
+            totals[name][0] += seconds
+            totals[name][1] = max(totals[name][1], peak)
+        print(
+            f"{str(page)[-60:]:<60} {len(html) / 1024:>8.0f} "
+            f"{results['legacy'][0] * 1000:>10.1f} {results['tree'][0] * 1000:>10.1f} "
+            f"{results['legacy'][1] / 2**20:>10.1f} {results['tree'][1] / 2**20:>10.1f}"
+        )
+
+        expected = normalize(reference_markdown(html))
+        actual = normalize(convert_html_to_markdown(html)[1])
+        if expected != actual:
+            mismatches.append(page)
+            print(f"  output differs from the reference:\n    {first_difference(expected, actual)}")
+
+    legacy_seconds, legacy_peak = totals["legacy"]
+    tree_seconds, tree_peak = totals["tree"]
+    print(
+        f"\n{len(pages)} pages: legacy {legacy_seconds:.2f}s (peak {legacy_peak / 2**20:.1f} MB), "
+        f"tree {tree_seconds:.2f}s (peak {tree_peak / 2**20:.1f} MB), "
+        f"speedup {legacy_seconds / tree_seconds if tree_seconds else float('inf'):.2f}x"
+    )
+    print(f"Output check: {len(pages) - len(mismatches)}/{len(pages)} pages match the reference")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
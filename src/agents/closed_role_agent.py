@@ -1,118 +1,207 @@
-from typing import Literal
-import openai
+from typing import Literal, Optional
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 import os
+import asyncio
+from contextlib import AsyncExitStack
 from pydantic import BaseModel
 from loguru import logger
-from browserbase import Browserbase
-from playwright.async_api import async_playwright
+from src.services.browserbase import browser_pool
+from src.services.domain_limiter import domain_limiter
 from src.utils.utils import get_markdown_content, sanitize_url_for_filename, save_content_to_files
-import base64
+from src.services.llm import get_openai_client, parse_response
+from src.services.llm_cache import llm_cache, make_cache_key
+from src.utils.compaction import compact_markdown
+from src.services.http_client import get_http_client
+from src.utils.job_status_heuristics import classify_http_response
+from src.utils.precheck import extract_validators
+from src.utils.screenshots import Screenshot, capture_screenshot, SCREENSHOT_DETAIL
+import httpx
+import re
 
 load_dotenv(override=True)
 
+MODEL = "gpt-4o-2024-08-06"
+# Bump whenever the status prompt or ClosedRoleAuditResult changes so cached results are not reused
+PROMPT_VERSION = "2"
+
+# Blocks carrying status signals are kept even when they repeat across a site's pages
+STATUS_SIGNAL_PATTERN = re.compile(r"apply|application|accepting|closed|filled|expired|no longer", re.IGNORECASE)
+
+# Try a plain HTTP fetch before rendering the page in Browserbase
+HTTP_FAST_PATH_ENABLED = os.getenv("CLOSED_ROLE_HTTP_FAST_PATH", "true").lower() == "true"
+
 
 class ClosedRoleAuditResult(BaseModel):
     result: Literal["open", "closed", "unsure"]
     justification: str
 
 
+@dataclass
+class ClosedRoleCheck:
+    """Outcome of a job status check, including which tier decided it."""
+    result: ClosedRoleAuditResult
+    tier: Literal["http", "browser"]
+    screenshot: Optional[Screenshot] = None
+    validators: dict = field(default_factory=dict)
+    # Model tokens spent on the check, counted against the daily audit budget
+    tokens: int = 0
+
+
 class ClosedRoleAgent:
     def __init__(self):
         """Initialize the closed role checking agent."""
-        self.client = openai.OpenAI()
+        self.client = get_openai_client()
 
-    async def check_job_status(self, url: str) -> tuple[ClosedRoleAuditResult, str, bytes]:
+    async def check_job_status(self, url: str) -> ClosedRoleCheck:
         """
         Check if a job posting is still open or closed.
         
+        A plain HTTP fetch decides unambiguous cases (404/410, redirects away from the posting,
+        known closed or open markers). Only inconclusive pages are rendered in Browserbase and
+        sent to the vision model.
+        
         Args:
             url (str): URL of the job posting to check
             
         Returns:
-            tuple[ClosedRoleAuditResult, str]: A tuple containing:
-                - ClosedRoleAuditResult: Object containing the status and justification
-                - str: Base64 encoded screenshot of the page
+            ClosedRoleCheck: The result, the tier that decided it, the screenshot (browser tier only),
+                the page's cache validators and the tokens used
+        """
+        validators = {}
+        if HTTP_FAST_PATH_ENABLED:
+            http_check, validators = await self._check_with_http(url)
+            if http_check:
+                logger.info(f"HTTP tier decided {url} is {http_check.result.result}: {http_check.result.justification}")
+                return http_check
+        
+        check = await self._check_with_browser(url)
+        check.validators = validators
+        return check
+
+    async def _check_with_http(self, url: str) -> tuple[Optional[ClosedRoleCheck], dict]:
+        """
+        Check a job posting with a plain HTTP fetch.
+        
+        Args:
+            url (str): URL of the job posting to check
+            
+        Returns:
+            tuple[Optional[ClosedRoleCheck], dict]: The check, or None if inconclusive, and the response's cache validators
+        """
+        try:
+            async with domain_limiter.limit(url):
+                response = await get_http_client().get(url)
+        except httpx.HTTPError as e:
+            logger.info(f"HTTP tier inconclusive for {url}: {str(e)}")
+            return None, {}
+        
+        validators = extract_validators(response)
+        verdict = await asyncio.to_thread(classify_http_response, url, response)
+        if not verdict:
+            logger.info(f"HTTP tier inconclusive for {url} (status {response.status_code}), escalating to browser")
+            return None, validators
+        
+        result, justification = verdict
+        return ClosedRoleCheck(
+            result=ClosedRoleAuditResult(result=result, justification=justification),
+            tier="http",
+            validators=validators
+        ), validators
+
+    async def _check_with_browser(self, url: str) -> ClosedRoleCheck:
         """
-        async with async_playwright() as playwright:
+        Check a job posting by rendering it in Browserbase and asking the vision model.
+        
+        Args:
+            url (str): URL of the job posting to check
+            
+        Returns:
+            ClosedRoleCheck: The result with the page screenshot
+        """
+        async with AsyncExitStack() as stack:
+            session = None
             try:
-                bb = Browserbase(api_key=os.environ["BB_API_KEY"])
-                session = bb.sessions.create(project_id=os.environ["BB_PROJECT_ID"])
-                chromium = playwright.chromium
-                browser = await chromium.connect_over_cdp(session.connect_url)
-                context = browser.contexts[0]
-                page = context.pages[0]
-                
-                try:
+                # Wait for the domain's slot before leasing a session, so the wait costs no session time.
+                # The slot is freed once the page has loaded; the session stays leased until the check ends
+                async with domain_limiter.limit(url):
+                    session = await stack.enter_async_context(browser_pool.lease())
+                    page = await session.get_page()
                     await page.goto(url)
                     html = await page.content()
-                    html, markdown_content = await get_markdown_content(html)
-                    save_content_to_files(html, markdown_content, f"logs/{sanitize_url_for_filename(url)}/page")
-                    screenshot = await page.screenshot()
-                    
-                    # Convert screenshot to base64
-                    screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-                    
-                    # Prepare the prompt for OpenAI
-                    prompt = f"""
-                    Analyze the following job posting content and determine if the position is still open or closed.
-                    Source URL: {url}
-                    
-                    Rules:
-                    1. Look for indicators that the position is:
-                       - "open": If the job is actively accepting applications
-                       - "closed": If there are clear signs the position is no longer accepting applications
-                       - "unsure": If you cannot definitively determine the status
-                    2. Provide a clear justification for your decision
-                    3. Look for specific phrases like:
-                       - "Position closed"
-                       - "No longer accepting applications"
-                       - "Apply now"
-                       - "Applications open"
-                       - "Position filled"
-                    4. Also analyze the visual elements in the screenshot for any status indicators
-                    5. If there appears to be a cookie banner or popup blocking the content:
-                       - Use the provided screenshot to look past/through any overlays
-                       - Try to identify job status information visible in the background
-                       - Note in your justification if a blocking element affected your analysis
-                    
-                    Content:
-                    {markdown_content}
-                    """
-                    
-                    # Call OpenAI API with structured output and vision
-                    response = self.client.responses.parse(
-                        model="gpt-4o-2024-08-06",
-                        input=[
-                            {"role": "system", "content": "You are a specialized job status checking agent that determines if job postings are still open."},
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "input_text", "text": prompt},
-                                    {
-                                        "type": "input_image",
-                                        "image_url": f"data:image/png;base64,{screenshot_base64}"
-                                    }
-                                ]
-                            }
-                        ],
-                        text_format=ClosedRoleAuditResult
-                    )
-                    
-                    result = response.output_parsed
-                    logger.info(f"Used {response.usage.total_tokens} tokens to check job status for {url}")
-                    
-                    return result, screenshot_base64, screenshot
-                    
-                except Exception as e:
-                    logger.error(f"Error checking job status for {url}: {str(e)}")
-                    raise
-                    
+                
+                html, markdown_content = await get_markdown_content(html)
+                save_content_to_files(html, markdown_content, f"logs/{sanitize_url_for_filename(url)}/page")
+                screenshot = await capture_screenshot(page)
+                
+                compacted = await asyncio.to_thread(compact_markdown, markdown_content, url, keep_pattern=STATUS_SIGNAL_PATTERN)
+                
+                cache_key = make_cache_key("job_status", compacted.text, PROMPT_VERSION, MODEL, url=url)
+                cached = await llm_cache.get(cache_key)
+                if cached:
+                    logger.info(f"Using cached job status for {url}")
+                    return ClosedRoleCheck(ClosedRoleAuditResult.model_validate(cached), "browser", screenshot)
+                
+                # Prepare the prompt for OpenAI
+                prompt = f"""
+                Analyze the following job posting content and determine if the position is still open or closed.
+                Source URL: {url}
+                
+                Rules:
+                1. Look for indicators that the position is:
+                   - "open": If the job is actively accepting applications
+                   - "closed": If there are clear signs the position is no longer accepting applications
+                   - "unsure": If you cannot definitively determine the status
+                2. Provide a clear justification for your decision
+                3. Look for specific phrases like:
+                   - "Position closed"
+                   - "No longer accepting applications"
+                   - "Apply now"
+                   - "Applications open"
+                   - "Position filled"
+                4. Also analyze the visual elements in the screenshot for any status indicators
+                5. If there appears to be a cookie banner or popup blocking the content:
+                   - Use the provided screenshot to look past/through any overlays
+                   - Try to identify job status information visible in the background
+                   - Note in your justification if a blocking element affected your analysis
+                
+                Content:
+                {compacted.text}
+                """
+                
+                # Call OpenAI API with structured output and vision
+                response = await parse_response(
+                    self.client,
+                    model=MODEL,
+                    input=[
+                        {"role": "system", "content": "You are a specialized job status checking agent that determines if job postings are still open."},
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "input_text", "text": prompt},
+                                {
+                                    "type": "input_image",
+                                    "image_url": screenshot.data_url,
+                                    "detail": SCREENSHOT_DETAIL
+                                }
+                            ]
+                        }
+                    ],
+                    text_format=ClosedRoleAuditResult
+                )
+                
+                result = response.output_parsed
+                logger.info(f"Used {response.usage.total_tokens} tokens to check job status for {url}")
+                
+                if result:
+                    await llm_cache.set(cache_key, result.model_dump(mode="json"))
+                
+                return ClosedRoleCheck(result, "browser", screenshot, tokens=response.usage.total_tokens)
+                
             except Exception as e:
-                logger.error(f"Error in browser session: {str(e)}")
+                logger.error(f"Error checking job status for {url}: {str(e)}")
                 raise
                 
             finally:
-                await page.close() if page else None
-                await browser.close() if browser else None
-                logger.info(f"Session complete! View replay at https://browserbase.com/sessions/{session.id}")
+                if session:
+                    logger.info(f"Session complete! View replay at https://browserbase.com/sessions/{session.id}")
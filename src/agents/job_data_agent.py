@@ -1,84 +1,141 @@
-from typing import Optional, List, Dict
-import openai
+from typing import Awaitable, Callable, Optional, List, Dict
+import asyncio
+from contextlib import AsyncExitStack
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 from pydantic import BaseModel, Field
 from loguru import logger
 from src.types.audit import ScrapedJobAgent
-from browserbase import Browserbase
-from playwright.async_api import async_playwright, Playwright
+from playwright.async_api import BrowserContext, Page
+from src.services.browserbase import browser_pool
+from src.services.domain_limiter import domain_limiter
 from src.utils.utils import get_markdown_content, sanitize_url_for_filename, save_content_to_files
+from src.services.llm import get_openai_client, parse_response
+from src.services.llm_cache import llm_cache, make_cache_key
+from src.utils.compaction import compact_markdown
 
 load_dotenv(override=True)
 
+# Number of job pages loaded in parallel tabs, and the per-URL time limit
+FETCH_CONCURRENCY = int(os.getenv("JOB_FETCH_CONCURRENCY", "5"))
+FETCH_TIMEOUT_SECONDS = float(os.getenv("JOB_FETCH_TIMEOUT_SECONDS", "45"))
+
+MODEL = "gpt-4o-2024-08-06"
+# Bump whenever the extraction prompt or ScrapedJobAgent changes so cached results are not reused
+PROMPT_VERSION = "2"
+
 
 class JobDataAgent:
     def __init__(self):
         """Initialize the job data extraction agent."""
-        self.client = openai.OpenAI()
+        self.client = get_openai_client()
 
-    async def fetch_markdown_contents(self, urls: List[str], main_url: str) -> List[Dict[str, str]]:
+    async def fetch_markdown_contents(self, urls: List[str], main_url: str, concurrency: int = FETCH_CONCURRENCY) -> List[Dict[str, str]]:
         """
         Fetch markdown content from multiple URLs using Browserbase.
         
+        Pages are loaded in up to `concurrency` tabs of one session leased from the browser pool,
+        and no faster than the per-domain limiter allows. The session is leased once the first
+        URL has its domain slot, so waiting for the limiter costs no session time. Each URL is
+        bounded by FETCH_TIMEOUT_SECONDS, and results are returned in input order.
+        
         Args:
             urls (List[str]): List of URLs to fetch content from
+            main_url (str): The listing URL the job URLs were found on, used for log paths
+            concurrency (int): Maximum number of tabs to load at once
             
         Returns:
             List[Dict[str, str]]: List of dictionaries containing URL and markdown content
         """
-        async with async_playwright() as playwright:
-            try:
-                bb = Browserbase(api_key=os.environ["BB_API_KEY"])
-                session = bb.sessions.create(project_id=os.environ["BB_PROJECT_ID"])
-                chromium = playwright.chromium
-                browser = await chromium.connect_over_cdp(session.connect_url)
-                context = browser.contexts[0]
-                page = context.pages[0]
+        try:
+            async with AsyncExitStack() as stack:
+                session = None
+                lease_lock = asyncio.Lock()
+                
+                async def get_context() -> BrowserContext:
+                    nonlocal session
+                    async with lease_lock:
+                        if session is None:
+                            session = await stack.enter_async_context(browser_pool.lease())
+                    return session.context
                 
-                markdown_contents = []
+                semaphore = asyncio.Semaphore(max(1, concurrency))
+                results = await asyncio.gather(*[
+                    self._fetch_markdown_content(get_context, semaphore, url, main_url)
+                    for url in urls
+                ])
+                if session:
+                    logger.info(f"Session complete! View replay at https://browserbase.com/sessions/{session.id}")
                 
-                for url in urls:
-                    try:
-                        await page.goto(url)
-                        html = await page.content()
-                        html, markdown_content = await get_markdown_content(html)
-                        save_content_to_files(html, markdown_content, f"logs/{sanitize_url_for_filename(main_url)}/{sanitize_url_for_filename(url)}/page")
-                        logger.info(f"Fetched markdown content from {url}")
-                        markdown_contents.append({
-                            "url": url,
-                            "markdown": markdown_content
-                        })
-                    except Exception as e:
-                        logger.error(f"Error fetching content from {url}: {str(e)}")
-                        continue
+                return [result for result in results if result]
                 
-                return markdown_contents
-                    
+        except Exception as e:
+            logger.error(f"Error in browser session: {str(e)}")
+            raise
+
+    async def _fetch_markdown_content(self, get_context: Callable[[], Awaitable[BrowserContext]], semaphore: asyncio.Semaphore, url: str, main_url: str) -> Optional[Dict[str, str]]:
+        """
+        Load a single URL in its own tab and convert it to markdown.
+        
+        Args:
+            get_context (Callable[[], Awaitable[BrowserContext]]): Returns the leased browser context to open the tab in
+            semaphore (asyncio.Semaphore): Limits the number of tabs open at once
+            url (str): URL to fetch
+            main_url (str): The listing URL the job URL was found on, used for log paths
+            
+        Returns:
+            Optional[Dict[str, str]]: URL and markdown content, or None if the fetch failed or timed out
+        """
+        async with semaphore:
+            page = None
+            try:
+                # The tab is opened, and the time limit starts, once the domain has a free slot
+                async with domain_limiter.limit(url):
+                    page = await (await get_context()).new_page()
+                    html = await asyncio.wait_for(self._load_page_html(page, url), timeout=FETCH_TIMEOUT_SECONDS)
+                html, markdown_content = await get_markdown_content(html)
+                save_content_to_files(html, markdown_content, f"logs/{sanitize_url_for_filename(main_url)}/{sanitize_url_for_filename(url)}/page")
+                logger.info(f"Fetched markdown content from {url}")
+                return {
+                    "url": url,
+                    "markdown": markdown_content
+                }
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out after {FETCH_TIMEOUT_SECONDS}s fetching content from {url}")
+                return None
             except Exception as e:
-                logger.error(f"Error in browser session: {str(e)}")
-                raise
-                    
+                logger.error(f"Error fetching content from {url}: {str(e)}")
+                return None
             finally:
                 await page.close() if page else None
-                await browser.close() if browser else None
-                logger.info(f"Session complete! View replay at https://browserbase.com/sessions/{session.id}")
+
+    async def _load_page_html(self, page: Page, url: str) -> str:
+        """Navigate a page to the given URL and return its HTML."""
+        await page.goto(url, timeout=FETCH_TIMEOUT_SECONDS * 1000)
+        return await page.content()
 
     async def process_markdown_contents(self, markdown_contents: List[Dict[str, str]]) -> List[Dict]:
         """
         Process markdown contents through OpenAI to extract job data.
         
+        Pages are extracted concurrently, bounded by the shared LLM_CONCURRENCY limit.
+        
         Args:
             markdown_contents (List[Dict[str, str]]): List of dictionaries containing URL and markdown content
             
         Returns:
             List[Dict]: List of processed job data
         """
-        jobs = []
+        results = await asyncio.gather(*[
+            self.parse_page_with_ai(content["markdown"], content["url"])
+            for content in markdown_contents
+        ], return_exceptions=True)
         
-        for content in markdown_contents:
-            job_data = await self.parse_page_with_ai(content["markdown"], content["url"])
+        jobs = []
+        for content, job_data in zip(markdown_contents, results):
+            if isinstance(job_data, Exception):
+                raise job_data
             if job_data:
                 job_dict = job_data.model_dump()
                 job_dict["url"] = content["url"]
@@ -110,6 +167,10 @@ class JobDataAgent:
         Returns:
             Optional[ScrapedJob]: A ScrapedJob object containing the extracted data, or None if extraction fails
         """
+        # Location, employment type, salary and visa lines repeat across a company's postings but are the
+        # fields being extracted, so boilerplate is not dropped here
+        compacted = await asyncio.to_thread(compact_markdown, markdown_content, source_url, drop_boilerplate=False)
+        
         # Prepare the prompt for OpenAI
         prompt = f"""
         Analyze the following Markdown content and extract job-related information.
@@ -136,13 +197,20 @@ class JobDataAgent:
         4. Ensure all extracted data matches the expected format and types defined in the ScrapedJobAgent model
         
         Markdown Content:
-        {markdown_content}
+        {compacted.text}
         """
         
+        cache_key = make_cache_key("job_data", compacted.text, PROMPT_VERSION, MODEL, url=source_url)
+        cached = await llm_cache.get(cache_key)
+        if cached:
+            logger.info(f"Using cached job data for {source_url}")
+            return ScrapedJobAgent.model_validate(cached)
+        
         try:
             # Call OpenAI API with structured output
-            response = self.client.responses.parse(
-                model="gpt-4o-2024-08-06",
+            response = await parse_response(
+                self.client,
+                model=MODEL,
                 input=[
                     {"role": "system", "content": "You are a specialized job data extraction agent that identifies and structures job-related information from content."},
                     {"role": "user", "content": prompt}
@@ -155,6 +223,9 @@ class JobDataAgent:
             
             logger.info(f"Used {response.usage.total_tokens} tokens to extract job data from {source_url}")
             
+            if job_data:
+                await llm_cache.set(cache_key, job_data.model_dump(mode="json"))
+            
             return job_data
             
         except Exception as e:
@@ -3,7 +3,8 @@ from dotenv import load_dotenv
 from browser_use import Controller, Agent, ActionResult
 from pydantic import BaseModel, Field
 from typing import Optional
-from src.services.browserbase import setup_browser
+from src.services.browserbase import setup_browser, browser_pool
+from src.services.domain_limiter import domain_limiter
 from markdownify import markdownify as md
 from playwright.async_api import Page
 from src.utils.utils import get_markdown_content, sanitize_url_for_filename, save_content_to_files
@@ -83,27 +84,31 @@ Your task is to:
 """
     
     browser = None
-    context = None
+    session = None
     
     try:
-        # Initialize browser
-        browser, _ = await setup_browser()
-        
-        agent = Agent(
-            task=task_instructions,
-            context=MESSAGE_CONTEXT,
-            llm=llm,
-            browser=browser,
-            initial_actions=initial_actions,
-            controller=controller,
-            use_vision=True,
-            save_conversation_path=f"logs/{clean_url}/"
-        )
-        
-        history = await agent.run(
-            max_steps=10,
-            on_step_end=lambda agent: on_step_end(agent, url)
-        )
+        # The agent keeps loading pages of the career site until it finishes, so it holds one slot throughout
+        # (renewed by the limiter however long the run takes), taken before the browser session is created
+        # so waiting costs no session time
+        async with domain_limiter.limit(url):
+            # Initialize browser
+            browser, session = await setup_browser()
+            
+            agent = Agent(
+                task=task_instructions,
+                context=MESSAGE_CONTEXT,
+                llm=llm,
+                browser=browser,
+                initial_actions=initial_actions,
+                controller=controller,
+                use_vision=True,
+                save_conversation_path=f"logs/{clean_url}/"
+            )
+            
+            history = await agent.run(
+                max_steps=10,
+                on_step_end=lambda agent: on_step_end(agent, url)
+            )
         
         # Get the final HTML from the last step
         html = getattr(agent, 'html', "")
@@ -124,4 +129,5 @@ Your task is to:
         raise
     finally:
         if browser:
-            await browser.close()
\ No newline at end of file
+            await browser.close()
+        await browser_pool.release(session)
\ No newline at end of file
@@ -1,14 +1,26 @@
-from typing import List, Dict
-import openai
+from typing import List, Dict, Optional
 from urllib.parse import urljoin
 import re
 from dotenv import load_dotenv
 import os
 from pydantic import BaseModel, Field
 from loguru import logger
+from src.services.llm import get_openai_client, parse_response
+from src.services.llm_cache import llm_cache, make_cache_key
+from src.utils.compaction import compact_markdown
+from src.utils.link_extraction import extract_job_links_with_rules
+import time
+import asyncio
 
 load_dotenv(override=True)
 
+MODEL = "gpt-4o-2024-08-06"
+# Bump whenever the extraction prompt or JobLinks changes so cached results are not reused
+PROMPT_VERSION = "2"
+
+# Listing pages can hold hundreds of links, so link extraction gets a larger budget than other calls
+LINK_EXTRACTION_TOKEN_BUDGET = int(os.getenv("LINK_EXTRACTION_TOKEN_BUDGET", "30000"))
+
 class JobLinks(BaseModel):
     """Model for structured job link output."""
     job_postings: List[str] = Field(default_factory=list, description="Direct links to specific job postings")
@@ -16,19 +28,43 @@ class JobLinks(BaseModel):
 class URLExtractionAgent:
     def __init__(self):
         """Initialize the URL extraction agent."""
-        self.client = openai.OpenAI()
+        self.client = get_openai_client()
         
-    def extract_job_links(self, markdown_content: str, source_url: str) -> JobLinks:
+    async def extract_job_links(self, markdown_content: str, source_url: str, html: Optional[str] = None) -> JobLinks:
         """
         Extract job-related links from Markdown content.
         
+        When the page HTML is available, anchors are first matched against known ATS and
+        per-domain job URL patterns. The LLM is only called when no rule yields a link.
+        
         Args:
             markdown_content (str): The Markdown content to analyze
             source_url (str): The source URL of the Markdown content
+            html (Optional[str]): The HTML the Markdown was generated from
             
         Returns:
             JobLinks: A Pydantic model containing categorized job links
         """
+        if html:
+            start = time.perf_counter()
+            rule_links = extract_job_links_with_rules(html, source_url)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if rule_links:
+                logger.info(f"Extracted {len(rule_links)} job links with URL rules in {elapsed_ms:.1f}ms")
+                return JobLinks(job_postings=rule_links)
+            logger.info(f"No URL rule matched links on {source_url}, falling back to LLM extraction")
+        
+        # Only blocks with links can contain job links; navigation is left in since job lists are link-dense
+        compacted = await asyncio.to_thread(
+            compact_markdown,
+            markdown_content,
+            source_url,
+            max_tokens=LINK_EXTRACTION_TOKEN_BUDGET,
+            drop_navigation=False,
+            drop_boilerplate=False,
+            require_links=True
+        )
+        
         # Prepare the prompt for OpenAI
         prompt = f"""
         Analyze the following Markdown content and extract all job or application links. 
@@ -41,13 +77,23 @@ class URLExtractionAgent:
            - job_postings: Direct links to job postings
         
         Markdown Content:
-        {markdown_content}
+        {compacted.text}
         """
         
+        # Links are cached as returned by the model and resolved against source_url afterwards
+        cache_key = make_cache_key("job_links", compacted.text, PROMPT_VERSION, MODEL)
+        cached = await llm_cache.get(cache_key)
+        if cached:
+            logger.info(f"Using cached job links for {source_url}")
+            job_links = JobLinks.model_validate(cached)
+            job_links.job_postings = [urljoin(source_url, url) for url in job_links.job_postings]
+            return job_links
+        
         try:
             # Call OpenAI API with structured output
-            response = self.client.responses.parse(
-                model="gpt-4o-2024-08-06",
+            response = await parse_response(
+                self.client,
+                model=MODEL,
                 input=[
                     {"role": "system", "content": "You are a specialized URL extraction agent that identifies job-related links from HTML content."},
                     {"role": "user", "content": prompt}
@@ -61,6 +107,7 @@ class URLExtractionAgent:
             if not job_links:
                 return None
             
+            await llm_cache.set(cache_key, job_links.model_dump(mode="json"))
             job_links.job_postings = [urljoin(source_url, url) for url in job_links.job_postings]
             
             logger.info(f"Used {response.usage.total_tokens} tokens to extract job links")
@@ -1,19 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
 from loguru import logger
 import sys
-from src.utils.logging_config import setup_logging
+from src.utils.logging_config import configure_logging, drain_log_uploads
+from src.services.http_client import close_http_client
+from src.services.directus import get_directus_client, close_directus_client
+from src.services.browserbase import browser_pool
+from src.services.supabase import start_status_buffers, close_status_buffers
+from src.utils.compaction import load_encoding
+import asyncio
 
-# Configure logging
-# run_id = setup_logging()
+# Configure the console sink once; each task adds its own file sinks with setup_logging
+configure_logging(os.getenv("LOG_LEVEL", "INFO"))
 
 # Load environment variables
 load_dotenv(override=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared resources on startup and release them when the server shuts down."""
+    await browser_pool.start()
+    get_directus_client()
+    # The tokenizer may download its vocabulary, so it is loaded before the first request
+    await asyncio.to_thread(load_encoding)
+    start_status_buffers()
+    yield
+    await drain_log_uploads()
+    await close_status_buffers()
+    await browser_pool.close()
+    await close_http_client()
+    await close_directus_client()
+
 # Create FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="Audit Backend API",
     description="Backend API for Audit System",
     version="1.0.0",
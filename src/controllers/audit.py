@@ -1,56 +1,183 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from loguru import logger
 from ..services.supabase import (
-    clear_closed_role_audit_tasks,
+    reset_closed_role_audit_tasks,
     get_open_jobs,
     insert_closed_role_audit_tasks,
-    get_closed_role_audit_tasks_by_ids,
-    get_all_closed_role_audit_tasks,
-    get_all_open_role_audit_tasks,
-    insert_open_role_audit_task,
-    update_closed_role_task_status,
-    get_open_role_audit_tasks_by_ids,
-    update_open_role_task_status,
-    delete_open_role_audit_task
+    get_closed_role_audit_history,
+    delete_closed_role_audit_tasks_by_ids,
+    iter_pages,
+    get_open_role_audit_tasks_page,
+    get_position_statuses_page,
+    get_audit_usage
 )
-from ..services.cloud_tasks import create_task
+from ..services.cloud_tasks import enqueue_tasks
 from ..types.audit import AuditStatus
-import asyncio
-from src.utils.scrape import get_job_postings
-from loguru import logger
-from src.utils.logging_config import setup_logging, upload_logs_to_cloud
-from src.utils.utils import sanitize_url_for_filename
-from src.services.supabase import get_all_open_role_audit_tasks, get_last_scrape_broadcast, get_new_jobs_to_send_out, update_config_last_updated_time
-import requests
-from datetime import datetime
+from src.utils.precheck import fetch_validators_for_urls, page_changed
+from src.utils.audit_scheduler import schedule_closed_role_audits
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+
+# Completed audits younger than this are only re-run if the page changed
+CLOSED_ROLE_AUDIT_TTL_HOURS = float(os.getenv("CLOSED_ROLE_AUDIT_TTL_HOURS", "24"))
+# Audit tasks packed into each Cloud Task; 1 sends one taskId per Cloud Task as before
+CLOSED_ROLE_AUDIT_BATCH_SIZE = int(os.getenv("CLOSED_ROLE_AUDIT_BATCH_SIZE", "1"))
+OPEN_ROLE_AUDIT_BATCH_SIZE = int(os.getenv("OPEN_ROLE_AUDIT_BATCH_SIZE", "1"))
+
+def _default_run_id(mode: str) -> str:
+    """
+    Run ID of an audit start when the caller does not pass one.
+    
+    Derived from the UTC date and the audit mode, so a retried start on the same day is
+    deduped without passing a runId; a deliberate second run that day needs its own runId.
+    
+    Args:
+        mode: Audit mode, e.g. "full", "incremental" or "open"
+    """
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%d')}-{mode}"
+
+
+def _build_task_payloads(task_type: str, task_ids: List[int], batch_size: int) -> List[dict]:
+    """Pack audit task IDs into Cloud Task payloads of up to batch_size tasks each."""
+    if batch_size <= 1:
+        return [{"type": task_type, "taskId": task_id} for task_id in task_ids]
+    return [
+        {"type": task_type, "taskIds": task_ids[i:i + batch_size]}
+        for i in range(0, len(task_ids), batch_size)
+    ]
+
+
+def _task_dedupe_key(prefix: str, payload: dict, run_id: str, keys_by_task: Optional[dict] = None) -> str:
+    """
+    Dedupe key of a payload; batches are keyed by a hash of their tasks' keys.
+    
+    Args:
+        prefix: Task type prefix of the key
+        payload: Cloud Task payload with taskId or taskIds
+        run_id: Run ID of the audit start
+        keys_by_task: Stable key of each task ID, e.g. its job ID; defaults to the task ID itself
+    """
+    keys_by_task = keys_by_task or {}
+    if "taskIds" in payload:
+        keys = sorted(str(keys_by_task.get(task_id, task_id)) for task_id in payload["taskIds"])
+        keys_digest = hashlib.sha256(",".join(keys).encode()).hexdigest()[:16]
+        return f"{prefix}-batch-{keys_digest}-{run_id}"
+    return f"{prefix}-{keys_by_task.get(payload['taskId'], payload['taskId'])}-{run_id}"
+
+
+def _is_audit_due(task: dict, now: datetime) -> bool:
+    """Whether a closed role audit task has no successful check within the TTL."""
+    if task.get("status") != AuditStatus.COMPLETED or not task.get("checkedAt"):
+        return True
+    checked_at = datetime.fromisoformat(task["checkedAt"].replace('Z', '+00:00'))
+    if checked_at.tzinfo is None:
+        checked_at = checked_at.replace(tzinfo=timezone.utc)
+    return now - checked_at > timedelta(hours=CLOSED_ROLE_AUDIT_TTL_HOURS)
 
-async def start_closed_role_audit():
+
+async def _sync_closed_role_audit_tasks(jobs_by_id: dict, history: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Keep one audit task per open job: remove tasks of jobs that are no longer open and add tasks for new jobs.
+    
+    Existing tasks keep their IDs, so Cloud Tasks of a retried start still point at them.
+    
+    Args:
+        jobs_by_id: Open jobs keyed by ID
+        history: Audit tasks from get_closed_role_audit_history
+        
+    Returns:
+        Tuple[List[dict], List[dict]]: The new tasks and the existing tasks of open jobs
+    """
+    removed_task_ids = [task["id"] for task in history if task["job"] not in jobs_by_id]
+    if removed_task_ids:
+        await delete_closed_role_audit_tasks_by_ids(removed_task_ids)
+    
+    tasks_by_job = {task["job"]: task for task in history}
+    new_job_ids = [job_id for job_id in jobs_by_id if job_id not in tasks_by_job]
+    new_tasks = await insert_closed_role_audit_tasks(new_job_ids) if new_job_ids else []
+    
+    existing_tasks = [task for job_id, task in tasks_by_job.items() if job_id in jobs_by_id]
+    logger.info(f"Synced audit tasks: {len(new_tasks or [])} new, {len(existing_tasks)} existing, {len(removed_task_ids)} removed")
+    return new_tasks or [], existing_tasks
+
+
+async def _select_incremental_closed_role_audit_tasks(jobs_by_id: dict, history: List[dict]) -> List[dict]:
+    """
+    Sync audit tasks with the open jobs and pick the ones that need checking.
+    
+    Tasks are kept between runs as per-job audit history. New jobs are always checked.
+    Existing tasks are re-run when their last successful check is older than
+    CLOSED_ROLE_AUDIT_TTL_HOURS, or when a conditional HTTP precheck shows the page changed.
+    
+    Args:
+        jobs_by_id: Open jobs keyed by ID
+        history: Audit tasks from get_closed_role_audit_history
+        
+    Returns:
+        List[dict]: Audit tasks to enqueue
+    """
+    new_tasks, existing_tasks = await _sync_closed_role_audit_tasks(jobs_by_id, history)
+    
+    now = datetime.now(timezone.utc)
+    due_tasks = [task for task in existing_tasks if _is_audit_due(task, now)]
+    fresh_tasks = [task for task in existing_tasks if not _is_audit_due(task, now)]
+    
+    validators = await fetch_validators_for_urls([jobs_by_id[task["job"]]["url"] for task in fresh_tasks])
+    changed_tasks = [task for task, current in zip(fresh_tasks, validators) if page_changed(task, current)]
+    
+    logger.info(
+        f"Incremental audit: {len(new_tasks)} new, {len(due_tasks)} stale, {len(changed_tasks)} changed, "
+        f"{len(fresh_tasks) - len(changed_tasks)} skipped"
+    )
+    return new_tasks + due_tasks + changed_tasks
+
+
+async def start_closed_role_audit(run_id: Optional[str] = None, incremental: bool = False, batch_size: Optional[int] = None):
     try:
+        run_id = run_id or _default_run_id("incremental" if incremental else "full")
+        batch_size = batch_size or CLOSED_ROLE_AUDIT_BATCH_SIZE
         jobs = await get_open_jobs()
+        jobs_by_id = {job["id"]: job for job in jobs}
         logger.info(f"Found {len(jobs)} open jobs")
-        await clear_closed_role_audit_tasks()
+        # Read before a full audit resets the tasks, as the scheduler scores jobs by their previous checks
+        history = await get_closed_role_audit_history()
         
-        # Extract job IDs and create audit tasks (default status is NOT_RUN)
-        job_ids = [job['id'] for job in jobs]
-        await insert_closed_role_audit_tasks(job_ids)
-
-        tasks = await get_all_closed_role_audit_tasks()
+        if incremental:
+            tasks = await _select_incremental_closed_role_audit_tasks(jobs_by_id, history)
+        else:
+            # Reset every task to NOT_RUN rather than re-creating them, so task IDs stay stable
+            await _sync_closed_role_audit_tasks(jobs_by_id, history)
+            tasks = await reset_closed_role_audit_tasks()
         
-        # Create a cloud task for each audit task
-        task_promises = [
-            create_task({
-                "type": "CLOSED_ROLE_AUDIT",
-                "taskId": task["id"],
-            })
-            for task in tasks
-        ]
+        # Dispatch the jobs most likely to have closed first, within the daily budget
+        positions = [position async for page in iter_pages(get_position_statuses_page) for position in page]
+        usage = await get_audit_usage(datetime.now(timezone.utc).date())
+        schedule = schedule_closed_role_audits(tasks or [], jobs_by_id, history, positions, usage)
+        logger.info(
+            f"Scheduled {len(schedule.selected)} closed role audits, deferred {len(schedule.deferred)} "
+            f"(planned {schedule.planned.sessions} browser sessions, {schedule.planned.tokens} tokens)"
+        )
         
-        await asyncio.gather(*task_promises)
+        # Create a cloud task for each batch of audit tasks. Tasks are deduped by job, and batches
+        # are cut from the selection sorted by job rather than by priority, which shifts between
+        # attempts, so a retried start with the same runId never checks a job twice
+        selected = sorted(schedule.selected, key=lambda task: str(task["job"]))
+        job_by_task = {task["id"]: task["job"] for task in selected}
+        enqueue_result = await enqueue_tasks(
+            _build_task_payloads("CLOSED_ROLE_AUDIT", [task["id"] for task in selected], batch_size),
+            dedupe_key=lambda payload: _task_dedupe_key("closed-role-audit", payload, run_id, job_by_task),
+        )
         
         return {
             "message": "Closed role audit started successfully",
-            "tasksCount": len(tasks)
+            "tasksCount": len(schedule.selected),
+            "runId": run_id,
+            "incremental": incremental,
+            "batchSize": batch_size,
+            **schedule.to_dict(),
+            **enqueue_result.to_dict()
         }
     except HTTPException:
         raise
@@ -59,19 +186,20 @@ async def start_closed_role_audit():
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-async def start_open_role_audit():
-    # fetch open role audit tasks
-    tasks = await get_all_open_role_audit_tasks()
-    # Create a cloud task for each audit task
-    task_promises = [
-        create_task({
-            "type": "OPEN_ROLE_AUDIT",
-            "taskId": task["id"],
-        })
-        for task in tasks
-    ]
-        
-    await asyncio.gather(*task_promises)
+async def start_open_role_audit(run_id: Optional[str] = None, batch_size: Optional[int] = None):
+    run_id = run_id or _default_run_id("open")
+    batch_size = batch_size or OPEN_ROLE_AUDIT_BATCH_SIZE
+    # fetch open role audit task IDs
+    tasks = [task async for page in iter_pages(get_open_role_audit_tasks_page, fields=["id"]) for task in page]
+    # Create a cloud task for each batch of audit tasks, cut from the sorted IDs so retries build the same batches
+    enqueue_result = await enqueue_tasks(
+        _build_task_payloads("OPEN_ROLE_AUDIT", sorted((task["id"] for task in tasks), key=str), batch_size),
+        dedupe_key=lambda payload: _task_dedupe_key("open-role-audit", payload, run_id),
+    )
     return {
         "message": "Scrape tasks started successfully",
+        "tasksCount": len(tasks),
+        "runId": run_id,
+        "batchSize": batch_size,
+        **enqueue_result.to_dict()
     }
@@ -1,81 +1,115 @@
 from loguru import logger
 from src.types.tasks import TaskRequest
-from src.services.supabase import update_closed_role_task_status, update_open_role_task_status, insert_scraped_jobs, get_open_role_audit_tasks_by_ids, get_closed_role_audit_tasks_by_ids, upload_screenshot_to_storage
+from src.services.supabase import update_closed_role_task_status, update_open_role_task_status, insert_scraped_jobs, get_open_role_audit_tasks_by_ids, get_closed_role_audit_tasks_by_ids, upload_screenshot_to_storage, record_audit_usage
+from src.services.cloud_tasks import enqueue_tasks
 from src.types.audit import AuditStatus
 from src.agents.closed_role_agent import ClosedRoleAgent
+from src.utils.audit_scheduler import check_cost
 from src.agents.open_role_agent import find_open_roles
 from src.utils.scrape import get_job_postings
-from src.utils.logging_config import setup_logging, upload_logs_to_cloud
+from src.utils.logging_config import setup_logging, discard_logs, schedule_log_upload
 from src.utils.utils import sanitize_url_for_filename
 from fastapi import HTTPException
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import hashlib
+import os
 
-async def handle_closed_role_audit_task(task_request: TaskRequest):
+# Maximum number of tasks from one batched request processed at the same time
+TASK_BATCH_CONCURRENCY = int(os.getenv("TASK_BATCH_CONCURRENCY", "5"))
+
+async def handle_closed_role_audit_task(task_id: int, task: Optional[dict] = None):
     """
     Handles the execution of a task, including status updates and result processing
     
     Args:
-        task_request (TaskRequest): Request object containing:
-            - type: string - Type of task
-            - taskId: string - ID of the task
+        task_id (int): ID of the closed role audit task
+        task (Optional[dict]): The task row, if already fetched and marked in progress by the caller
     """
+    clean_url = None
     try:
-        logger.info(f"Starting task processing for taskId: {task_request.taskId}")
-        await update_closed_role_task_status([task_request.taskId], AuditStatus.IN_PROGRESS, "Task is running")
-        tasks = await get_closed_role_audit_tasks_by_ids([task_request.taskId])
-        if not tasks:
-            raise HTTPException(status_code=404, detail="Task not found")
-        task = tasks[0]
+        logger.info(f"Starting task processing for taskId: {task_id}")
+        if task is None:
+            await update_closed_role_task_status([task_id], AuditStatus.IN_PROGRESS, "Task is running")
+            tasks = await get_closed_role_audit_tasks_by_ids([task_id])
+            if not tasks:
+                raise HTTPException(status_code=404, detail="Task not found")
+            task = tasks[0]
         url = task["job"]["url"]
         clean_url = sanitize_url_for_filename(url)
         setup_logging(clean_url)
         
         # Log that we would check role here
         closed_role_agent = ClosedRoleAgent()
-        response = await closed_role_agent.check_job_status(url)
+        check = await closed_role_agent.check_job_status(url)
         
-        if not response:
+        if not check or not check.result:
             raise Exception("No result from check_closed_role")
         
-        result, screenshot, screenshot_bytes = response
-        screenshot_url = await upload_screenshot_to_storage(screenshot_bytes, f"closed_role/{task_request.taskId}.png")
+        # Counted before anything else can fail, as the budget was spent either way
+        cost = check_cost(check.tier, check.tokens)
+        if cost.sessions or cost.tokens:
+            try:
+                await record_audit_usage(cost.sessions, cost.tokens)
+            except Exception as e:
+                logger.warning(f"Failed to record audit usage for task {task_id}: {str(e)}")
+        
+        result = check.result
+        screenshot_url = None
+        if check.screenshot:
+            screenshot_url = await upload_screenshot_to_storage(
+                check.screenshot.data,
+                f"closed_role/{task_id}.{check.screenshot.extension}",
+                check.screenshot.content_type
+            )
         
         
         # Log task completion
-        await update_closed_role_task_status([task_request.taskId], AuditStatus.COMPLETED, "Task is complete", {
+        await update_closed_role_task_status([task_id], AuditStatus.COMPLETED, "Task is complete", {
             "result": result.result,
             "justification": result.justification,
-            "screenshot": screenshot_url
+            "screenshot": screenshot_url,
+            "tier": check.tier,
+            "tokens": check.tokens,
+            "checkedAt": datetime.now(timezone.utc).isoformat(),
+            # Cache validators let incremental audits detect page changes
+            "etag": check.validators.get("etag"),
+            "lastModified": check.validators.get("lastModified"),
+            "contentLength": check.validators.get("contentLength")
         })
         
-        logger.success(f"Task {task_request.taskId} completed successfully")
-        await upload_logs_to_cloud(clean_url, f"closed_role_audit")
+        logger.success(f"Task {task_id} completed successfully by the {check.tier} tier")
+        schedule_log_upload(clean_url, "closed_role_audit")
         return {"message": "Task completed successfully"}
 
     except Exception as error:
         error_message = str(error)
-        logger.error(f"Error processing task {task_request.taskId}: {error_message}")
-        await update_closed_role_task_status([task_request.taskId], AuditStatus.FAILED, error_message)
-        # await upload_logs_to_cloud(clean_url, f"closed_role_audit")
+        logger.error(f"Error processing task {task_id}: {error_message}")
+        await update_closed_role_task_status([task_id], AuditStatus.FAILED, error_message)
+        # schedule_log_upload(clean_url, "closed_role_audit")
+        # Failed runs are not uploaded, so their files are deleted rather than left on disk
+        if clean_url:
+            await discard_logs(clean_url)
         raise
     
-async def handle_open_role_audit_task(task_request: TaskRequest):
+async def handle_open_role_audit_task(task_id: int, task: Optional[dict] = None):
     """
     Handles the execution of an open role audit task, including status updates and result processing
     
     Args:
-        task_request (TaskRequest): Request object containing:
-            - type: string - Type of task 
-            - url: string - URL to be processed
-            - taskId: string - ID of the task
-            - extra_notes: string - Optional additional notes
+        task_id (int): ID of the open role audit task
+        task (Optional[dict]): The task row, if already fetched and marked in progress by the caller
     """
+    clean_url = None
     try:
-        logger.info(f"Starting open role audit task processing for taskId: {task_request.taskId}")
-        await update_open_role_task_status([task_request.taskId], AuditStatus.IN_PROGRESS, "Task is running")
-        task = await get_open_role_audit_tasks_by_ids([task_request.taskId])
-        if not task:
-            raise HTTPException(status_code=404, detail="Task not found")
-        task = task[0]
+        logger.info(f"Starting open role audit task processing for taskId: {task_id}")
+        if task is None:
+            await update_open_role_task_status([task_id], AuditStatus.IN_PROGRESS, "Task is running")
+            tasks = await get_open_role_audit_tasks_by_ids([task_id])
+            if not tasks:
+                raise HTTPException(status_code=404, detail="Task not found")
+            task = tasks[0]
         
         url = task["url"]
         clean_url = sanitize_url_for_filename(url)
@@ -87,15 +121,97 @@ async def handle_open_role_audit_task(task_request: TaskRequest):
     
         
         # Log task completion
-        await update_open_role_task_status([task_request.taskId], AuditStatus.COMPLETED, "Task is complete")
+        await update_open_role_task_status([task_id], AuditStatus.COMPLETED, "Task is complete")
         
-        logger.success(f"Open role audit task {task_request.taskId} completed successfully")
-        await upload_logs_to_cloud(clean_url, f"open_role_audit")
+        logger.success(f"Open role audit task {task_id} completed successfully")
+        schedule_log_upload(clean_url, "open_role_audit")
         return {"message": "Task completed successfully"}
 
     except Exception as error:
         error_message = str(error)
-        logger.error(f"Error processing open role audit task {task_request.taskId}: {error_message}")
-        await update_open_role_task_status([task_request.taskId], AuditStatus.FAILED, error_message)
-        await upload_logs_to_cloud(clean_url, f"open_role_audit")
-        raise
\ No newline at end of file
+        logger.error(f"Error processing open role audit task {task_id}: {error_message}")
+        await update_open_role_task_status([task_id], AuditStatus.FAILED, error_message)
+        if clean_url:
+            schedule_log_upload(clean_url, "open_role_audit")
+        raise
+
+
+async def handle_task_batch(task_request: TaskRequest, concurrency: int = TASK_BATCH_CONCURRENCY) -> dict:
+    """
+    Runs every task of a batched request concurrently, marking them in progress and
+    fetching their rows with one query each instead of one per task
+    
+    Args:
+        task_request (TaskRequest): Request object with the task type and taskIds
+        concurrency (int): Maximum number of tasks processed at the same time
+        
+    Returns:
+        dict: Completed and failed counts, plus a status entry per task
+    """
+    if task_request.is_closed_role_task:
+        handler, update_status, get_tasks = handle_closed_role_audit_task, update_closed_role_task_status, get_closed_role_audit_tasks_by_ids
+    else:
+        handler, update_status, get_tasks = handle_open_role_audit_task, update_open_role_task_status, get_open_role_audit_tasks_by_ids
+    
+    task_ids = list(dict.fromkeys(task_request.task_ids))
+    logger.info(f"Starting batch of {len(task_ids)} {task_request.type} tasks")
+    await update_status(task_ids, AuditStatus.IN_PROGRESS, "Task is running")
+    tasks_by_id = {task["id"]: task for task in await get_tasks(task_ids)}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(task_id: int) -> dict:
+        task = tasks_by_id.get(task_id)
+        if task is None:
+            await update_status([task_id], AuditStatus.FAILED, "Task not found")
+            return {"taskId": task_id, "status": "failed", "error": "Task not found", "retryable": False}
+        async with semaphore:
+            try:
+                await handler(task_id, task)
+                return {"taskId": task_id, "status": "completed"}
+            except Exception as e:
+                return {"taskId": task_id, "status": "failed", "error": str(e), "retryable": True}
+    
+    results = await asyncio.gather(*[run(task_id) for task_id in task_ids])
+    failed = sum(1 for result in results if result["status"] == "failed")
+    logger.info(f"Finished batch of {len(task_ids)} {task_request.type} tasks, {failed} failed")
+    return {
+        "message": "Batch processed",
+        "completed": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+
+async def retry_failed_batch_tasks(task_request: TaskRequest, result: dict, task_name: Optional[str]) -> bool:
+    """
+    Enqueues the retryable failures of a batch as a new batch, so they are retried without
+    re-running the tasks that completed. The new task's name is derived from the current
+    Cloud Task's name and the failed IDs, so a redelivery of this batch does not enqueue
+    them twice.
+    
+    Args:
+        task_request (TaskRequest): The batched request
+        result (dict): Result of handle_task_batch
+        task_name (Optional[str]): Name of the Cloud Task delivering the request, from X-CloudTasks-TaskName
+        
+    Returns:
+        bool: Whether every retryable failure is taken care of, either enqueued or there were none.
+        False means the whole request must fail so Cloud Tasks retries it.
+    """
+    failed_ids = sorted(item["taskId"] for item in result["results"] if item.get("retryable"))
+    if not failed_ids:
+        return True
+    # Without a Cloud Task name there is no stable dedupe key, and when every task failed a
+    # smaller batch would not help; both fall back to Cloud Tasks retrying the request
+    if not task_name or len(failed_ids) == len(result["results"]):
+        return False
+    
+    digest = hashlib.sha256(f"{task_name}:{','.join(map(str, failed_ids))}".encode()).hexdigest()[:16]
+    enqueue_result = await enqueue_tasks(
+        [{"type": task_request.type, "taskIds": failed_ids}],
+        dedupe_key=lambda payload: f"{task_request.type.lower().replace('_', '-')}-retry-{digest}",
+    )
+    if enqueue_result.failed:
+        return False
+    logger.info(f"Re-enqueued {len(failed_ids)} failed {task_request.type} tasks")
+    return True
\ No newline at end of file
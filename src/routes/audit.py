@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from src.controllers.audit import (
-    get_all_closed_role_audit_tasks,
     start_closed_role_audit,
     start_open_role_audit,
 )
-from src.services.supabase import get_all_open_role_audit_tasks
+from src.services.supabase import (
+    iter_pages,
+    get_closed_role_audit_tasks_page,
+    get_open_role_audit_tasks_page
+)
+from src.utils.response_cache import cached_json_response
+import json
 
 router = APIRouter(
     prefix="/audit",
@@ -14,7 +21,7 @@ router = APIRouter(
 
 @router.post("/start/closed",
     summary="Start closed role audit",
-    description="Creates cloud tasks for specified closed role audit tasks",
+    description="Creates cloud tasks for specified closed role audit tasks. With incremental=true, audit history is kept and only new, stale or changed jobs are checked. Starts with the same runId never enqueue a task twice; without a runId it defaults to the UTC date and mode (e.g. 20261018-full), so same-day retries are deduped and a deliberate second run that day must pass its own runId. batchSize packs that many audit tasks into each cloud task. Jobs most likely to have closed are dispatched first, and jobs beyond the remaining daily browser session and token budget are deferred.",
     responses={
         200: {"description": "Closed role audit started successfully"},
         400: {"description": "Invalid request - taskIds must be an array of integers"},
@@ -22,13 +29,13 @@ router = APIRouter(
         500: {"description": "Internal server error"}
     }
 )
-async def start_closed_role_audit_route():
-    return await start_closed_role_audit()
+async def start_closed_role_audit_route(runId: Optional[str] = None, incremental: bool = False, batchSize: Optional[int] = None):
+    return await start_closed_role_audit(runId, incremental, batchSize)
     
 
 @router.post("/start/open",
     summary="Start scrape tasks",
-    description="Creates cloud tasks for specified scrape tasks",
+    description="Creates cloud tasks for specified scrape tasks. Starts with the same runId never enqueue a task twice; without a runId it defaults to the UTC date (e.g. 20261018-open), so same-day retries are deduped and a deliberate second run that day must pass its own runId. batchSize packs that many scrape tasks into each cloud task.",
     responses={
         200: {"description": "Scrape tasks started successfully"},
         400: {"description": "Invalid request - taskIds must be an array of integers"},
@@ -36,40 +43,134 @@ async def start_closed_role_audit_route():
         500: {"description": "Internal server error"}
     }
 )
-async def scrape_open_jobs():
-    return await start_open_role_audit()
+async def scrape_open_jobs(runId: Optional[str] = None, batchSize: Optional[int] = None):
+    return await start_open_role_audit(runId, batchSize)
+
+
+def _split_param(value: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated query parameter into its values."""
+    if not value:
+        return None
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+async def _stream_rows(pages: AsyncIterator[List[dict]], format: Literal["json", "ndjson"]) -> StreamingResponse:
+    """
+    Stream every row of a page iterator as a JSON array or as newline-delimited JSON.
+    
+    The first page is fetched before the response starts, so query errors still return a 500.
+    """
+    first_page = await anext(pages, [])
+    
+    async def rows():
+        yield first_page
+        async for page in pages:
+            yield page
+    
+    async def ndjson():
+        async for page in rows():
+            yield "".join(json.dumps(row, default=str) + "\n" for row in page)
+    
+    async def json_array():
+        separator = "["
+        async for page in rows():
+            for row in page:
+                yield separator + json.dumps(row, default=str)
+                separator = ","
+        yield "[]" if separator == "[" else "]"
+    
+    if format == "ndjson":
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    return StreamingResponse(json_array(), media_type="application/json")
+
+
+async def _list_audit_tasks(request: Request, tags: List[str], fetch_page, limit: Optional[int], after: Optional[int], format: Literal["json", "ndjson"], **filters):
+    """
+    Return one page with its next cursor when limit or after is given, otherwise stream every matching task.
+    
+    Pages are served through the response cache, tagged with the tables they are read from. The
+    full listing is streamed past the cache, so the worker never holds the whole table in memory.
+    """
+    if limit is None and after is None:
+        return await _stream_rows(iter_pages(fetch_page, **filters), format)
+    limit = limit or 100
+    
+    async def fetch():
+        items = await fetch_page(after_id=after, limit=limit, **filters)
+        return {
+            "items": items,
+            "nextCursor": items[-1]["id"] if len(items) == limit else None
+        }
+    
+    return await cached_json_response(request, tags, fetch)
 
 
 @router.get("/closed",
-    summary="Get all closed role audit tasks",
-    description="Retrieves all closed role audit tasks with their associated job and company information",
+    summary="Get closed role audit tasks",
+    description=(
+        "Retrieves closed role audit tasks with their associated job and company information, ordered by ID. "
+        "With limit or after, returns one page as {items, nextCursor}; pass nextCursor as after to get the next page. "
+        "Otherwise streams every matching task as a JSON array, or as newline-delimited JSON with format=ndjson. "
+        "status and result take comma-separated values; fields takes a comma-separated list of columns (job embeds the job and company)."
+    ),
     responses={
-        200: {"description": "Successfully retrieved all closed role audit tasks"},
+        200: {"description": "Successfully retrieved closed role audit tasks"},
+        304: {"description": "Page unchanged since the ETag sent in If-None-Match"},
+        400: {"description": "Invalid field name"},
         500: {"description": "Internal server error"}
     }
 )
-async def get_all_closed_role_audit_tasks_route():    
+async def get_all_closed_role_audit_tasks_route(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    status: Optional[str] = None,
+    result: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json"
+):
     try:
-        tasks = await get_all_closed_role_audit_tasks()
-        return tasks
+        return await _list_audit_tasks(
+            request, ["closed_role_audit_tasks", "positions"], get_closed_role_audit_tasks_page, limit, after, format,
+            status=_split_param(status), result=_split_param(result), fields=_split_param(fields)
+        )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except Exception as error:
-        logger.error(f"Error getting all closed role audit tasks: {error}")
+        logger.error(f"Error getting closed role audit tasks: {error}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
 
 @router.get("/open",
-    summary="Get all open role audit tasks",
-    description="Retrieves all open role audit tasks with their associated company information",
+    summary="Get open role audit tasks",
+    description=(
+        "Retrieves open role audit tasks with their associated company information, ordered by ID. "
+        "With limit or after, returns one page as {items, nextCursor}; pass nextCursor as after to get the next page. "
+        "Otherwise streams every matching task as a JSON array, or as newline-delimited JSON with format=ndjson. "
+        "status takes comma-separated values; fields takes a comma-separated list of columns (company embeds the company)."
+    ),
     responses={
-        200: {"description": "Successfully retrieved all open role audit tasks"},
+        200: {"description": "Successfully retrieved open role audit tasks"},
+        304: {"description": "Page unchanged since the ETag sent in If-None-Match"},
+        400: {"description": "Invalid field name"},
         500: {"description": "Internal server error"}
     }
 )
-async def get_all_open_role_audit_tasks_route():    
+async def get_all_open_role_audit_tasks_route(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json"
+):
     try:
-        tasks = await get_all_open_role_audit_tasks()
-        return tasks
+        return await _list_audit_tasks(
+            request, ["open_role_audit_tasks"], get_open_role_audit_tasks_page, limit, after, format,
+            status=_split_param(status), fields=_split_param(fields)
+        )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
     except Exception as error:
-        logger.error(f"Error getting all open role audit tasks: {error}")
+        logger.error(f"Error getting open role audit tasks: {error}")
         raise HTTPException(status_code=500, detail="Internal server error")
-
@@ -1,19 +1,190 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Literal
-from src.services.supabase import supabase
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import List, Literal, Union
+from src.services.supabase import supabase, execute_query, FILTER_URL_CHUNK_SIZE
 from src.types.jobs import JobStatus
 from datetime import datetime
-from src.services.directus import add_position_to_directus, update_position_in_directus
+from src.services.directus import add_position_to_directus, update_position_in_directus, add_positions_to_directus, update_positions_in_directus
+from src.utils.response_cache import cached_json_response, response_cache
+from src.utils.canonical_url import canonicalize_url
 
 router = APIRouter(
     prefix="/positions",
     tags=["Positions"]
 )
 
+# Maximum number of IDs accepted by the bulk endpoints
+BULK_MAX_ITEMS = 500
+
 class UpdatePositionStatusRequest(BaseModel):
     status: Literal["open", "closed"]
 
+class BulkPromoteRequest(BaseModel):
+    ids: List[Union[int, str]] = Field(min_length=1, max_length=BULK_MAX_ITEMS, description="Scraped position IDs")
+
+class BulkUpdatePositionStatusRequest(BaseModel):
+    ids: List[Union[int, str]] = Field(min_length=1, max_length=BULK_MAX_ITEMS, description="Position IDs")
+    status: Literal["open", "closed"]
+
+def build_position_data(scraped_data: dict, scraped_position_id) -> dict:
+    """Map a scraped_positions row (with its company) to positions table fields."""
+    return {
+        "title": scraped_data["title"],
+        "url": scraped_data["url"],
+        "canonical_url": canonicalize_url(scraped_data["url"]),
+        "description": scraped_data["description"],
+        "jobType": scraped_data["jobType"],
+        "status": "open",  # Default to open when promoting
+        "company": scraped_data["company"]["id"],
+        "salaryText": scraped_data["salaryText"],
+        "visaSponsored": scraped_data["visaSponsored"],
+        "location": scraped_data["location"],
+        "other": scraped_data["other"],
+        "site": scraped_data["site"],
+        "hidden": False,  # Default to visible
+        "scraped_position": scraped_position_id,
+        "min_years_experience": scraped_data["min_years_experience"],
+        "min_education_level": scraped_data["min_education_level"]
+    }
+
+async def _get_existing_canonical_urls(urls: List[str]) -> set:
+    """
+    Canonical URLs of the given job URLs that are already in positions, looked up in chunks
+    of FILTER_URL_CHUNK_SIZE.
+
+    Positions created in Directus carry no canonical_url, so rows are matched on either
+    canonical_url or url, with url compared against both the raw and the canonical form.
+
+    Args:
+        urls: Raw job posting URLs
+
+    Returns:
+        set: Canonical forms of the URLs that already have a position
+    """
+    lookup_urls = list({variant for url in urls for variant in (url, canonicalize_url(url))})
+    existing_urls = set()
+    for i in range(0, len(lookup_urls), FILTER_URL_CHUNK_SIZE):
+        chunk = lookup_urls[i:i + FILTER_URL_CHUNK_SIZE]
+        for column in ("canonical_url", "url"):
+            query = supabase.from_("positions").select("url, canonical_url").in_(column, chunk)
+            response = await execute_query(query, f"get_positions_by_{column}s")
+            for row in response.data or []:
+                if row.get("canonical_url") or row.get("url"):
+                    existing_urls.add(row.get("canonical_url") or canonicalize_url(row["url"]))
+    return existing_urls
+
+def _unique_ids(ids: List[Union[int, str]]) -> List[Union[int, str]]:
+    """Drop repeated IDs, keeping the first occurrence of each."""
+    return list({str(item_id): item_id for item_id in ids}.values())
+
+@router.put(
+    "/bulk/promote",
+    summary="Promote many scraped positions to the positions table",
+    description="Takes scraped_position ids and adds them to the positions table with one Directus batch request. Each id gets its own result: promoted, not_found, conflict (canonical URL already in positions or repeated in the batch) or failed.",
+    responses={
+        200: {"description": "Per-item promotion results"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def bulk_promote_scraped_positions(request: BulkPromoteRequest):
+    try:
+        ids = _unique_ids(request.ids)
+        scraped_positions = await execute_query(supabase.from_("scraped_positions").select("*, company(*)").in_("id", ids), "get_scraped_positions_by_ids")
+        scraped_by_id = {str(row["id"]): row for row in scraped_positions.data or []}
+        
+        results = {}
+        # Rows that cannot be mapped (missing URL, company or fields) fail on their own instead of failing the request
+        positions_by_id = {}
+        for scraped_position_id in ids:
+            scraped_data = scraped_by_id.get(str(scraped_position_id))
+            if not scraped_data:
+                results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "not_found"}
+                continue
+            try:
+                positions_by_id[str(scraped_position_id)] = build_position_data(scraped_data, scraped_position_id)
+            except (KeyError, TypeError, AttributeError) as e:
+                results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "failed", "error": f"Invalid scraped position: {type(e).__name__} {str(e)}"}
+        
+        existing_urls = await _get_existing_canonical_urls([position["url"] for position in positions_by_id.values()])
+        batch_urls = set()
+        
+        to_promote = []
+        for scraped_position_id in ids:
+            position_data = positions_by_id.get(str(scraped_position_id))
+            if not position_data:
+                continue
+            if position_data["canonical_url"] in existing_urls:
+                results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "conflict", "error": "Position already exists in positions table"}
+            elif position_data["canonical_url"] in batch_urls:
+                results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "conflict", "error": "Another scraped position in this request has the same URL"}
+            else:
+                batch_urls.add(position_data["canonical_url"])
+                to_promote.append((scraped_position_id, position_data))
+        
+        if to_promote:
+            try:
+                result = await add_positions_to_directus([position_data for _, position_data in to_promote])
+                created = (result or {}).get("data") or []
+                for index, (scraped_position_id, _) in enumerate(to_promote):
+                    position_id = created[index].get("id") if index < len(created) and isinstance(created[index], dict) else None
+                    results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "promoted", "positionId": position_id}
+                response_cache.invalidate("positions")
+            except Exception as e:
+                for scraped_position_id, _ in to_promote:
+                    results[str(scraped_position_id)] = {"id": scraped_position_id, "status": "failed", "error": str(e)}
+        
+        ordered = [results[str(scraped_position_id)] for scraped_position_id in ids]
+        return {
+            "message": "Bulk promotion processed",
+            "promoted": sum(1 for item in ordered if item["status"] == "promoted"),
+            "results": ordered
+        }
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put(
+    "/bulk/status",
+    summary="Update the status of many positions",
+    description="Sets the status of many positions with one Directus batch request. Each id gets its own result: updated, not_found or failed.",
+    responses={
+        200: {"description": "Per-item update results"},
+        500: {"description": "Internal server error"}
+    }
+)
+async def bulk_update_position_status(request: BulkUpdatePositionStatusRequest):
+    try:
+        ids = _unique_ids(request.ids)
+        positions = await execute_query(supabase.from_("positions").select("id").in_("id", ids), "get_positions_by_ids")
+        found_ids = {str(row["id"]) for row in positions.data or []}
+        to_update = [position_id for position_id in ids if str(position_id) in found_ids]
+        
+        status, error = "updated", None
+        if to_update:
+            try:
+                await update_positions_in_directus(to_update, {"status": request.status})
+                response_cache.invalidate("positions")
+            except Exception as e:
+                status, error = "failed", str(e)
+        
+        results = [
+            {"id": position_id, "status": status, **({"error": error} if error else {})}
+            if str(position_id) in found_ids else {"id": position_id, "status": "not_found"}
+            for position_id in ids
+        ]
+        return {
+            "message": "Bulk status update processed",
+            "updated": sum(1 for item in results if item["status"] == "updated"),
+            "results": results
+        }
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put(
     "/{position_id}/status",
     summary="Update position status",
@@ -28,7 +199,7 @@ class UpdatePositionStatusRequest(BaseModel):
 async def update_position_status(position_id: str, request: UpdatePositionStatusRequest):
     try:
         # Validate that the position exists
-        position = supabase.from_("positions").select("*").eq("id", position_id).execute()
+        position = await execute_query(supabase.from_("positions").select("*").eq("id", position_id), "get_position")
         if not position.data:
             raise HTTPException(status_code=404, detail="Position not found")
 
@@ -44,6 +215,7 @@ async def update_position_status(position_id: str, request: UpdatePositionStatus
         
         if not result:
             raise HTTPException(status_code=500, detail="Failed to update position status")
+        response_cache.invalidate("positions")
             
         return {"message": "Position status updated successfully"}
         
@@ -66,41 +238,25 @@ async def update_position_status(position_id: str, request: UpdatePositionStatus
 async def promote_scraped_position(scraped_position_id: str):
     try:
         # Get the scraped position data
-        scraped_position = supabase.from_("scraped_positions").select("*, company(*)").eq("id", scraped_position_id).execute()
+        scraped_position = await execute_query(supabase.from_("scraped_positions").select("*, company(*)").eq("id", scraped_position_id), "get_scraped_position")
         if not scraped_position.data:
             raise HTTPException(status_code=404, detail="Scraped position not found")
         
         scraped_data = scraped_position.data[0]
         
-        # Check if position already exists in positions table (by URL)
-        existing_position = supabase.from_("positions").select("*").eq("url", scraped_data["url"]).execute()
-        if existing_position.data:
+        # Check if position already exists in positions table (by canonical URL, or by url for rows without one)
+        if canonicalize_url(scraped_data["url"]) in await _get_existing_canonical_urls([scraped_data["url"]]):
             raise HTTPException(status_code=409, detail="Position already exists in positions table")
         
         # Map scraped_position fields to positions table fields
-        position_data = {
-            "title": scraped_data["title"],
-            "url": scraped_data["url"],
-            "description": scraped_data["description"],
-            "jobType": scraped_data["jobType"],
-            "status": "open",  # Default to open when promoting
-            "company": scraped_data["company"]["id"],
-            "salaryText": scraped_data["salaryText"],
-            "visaSponsored": scraped_data["visaSponsored"],
-            "location": scraped_data["location"],
-            "other": scraped_data["other"],
-            "site": scraped_data["site"],
-            "hidden": False,  # Default to visible
-            "scraped_position": scraped_position_id,
-            "min_years_experience": scraped_data["min_years_experience"],
-            "min_education_level": scraped_data["min_education_level"]
-        }
+        position_data = build_position_data(scraped_data, scraped_position_id)
         
         # we need to directly post to directus
         result = await add_position_to_directus(position_data)
         
         if not result:
             raise HTTPException(status_code=500, detail="Failed to promote position")
+        response_cache.invalidate("positions")
             
         return {
             "message": "Position promoted successfully"
@@ -114,14 +270,15 @@ async def promote_scraped_position(scraped_position_id: str):
 @router.get(
     "/scraped-positions",
     summary="Get positions scraped on a specific date",
-    description="Retrieves all positions that were scraped on the given date",
+    description="Retrieves all positions that were scraped on the given date. Responses are cached and carry an ETag; send it in If-None-Match to get a 304 when nothing changed.",
     responses={
         200: {"description": "Successfully retrieved scraped positions"},
+        304: {"description": "Scraped positions unchanged since the ETag sent in If-None-Match"},
         400: {"description": "Invalid date format"},
         500: {"description": "Internal server error"}
     }
 )
-async def get_scraped_positions(date: str):
+async def get_scraped_positions(request: Request, date: str):
     try:
         # Validate date format
         try:
@@ -129,15 +286,17 @@ async def get_scraped_positions(date: str):
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
-        # Query positions scraped on the given date
-        result = supabase.from_("scraped_positions") \
-            .select("*, company(*, logo(filename_disk)), positions(id)") \
-            .gte("createdAt", date) \
-            .lt("createdAt", f"{date}T23:59:59") \
-            .order("createdAt") \
-            .execute()
+        async def fetch():
+            # Query positions scraped on the given date
+            query = supabase.from_("scraped_positions") \
+                .select("*, company(*, logo(filename_disk)), positions(id)") \
+                .gte("createdAt", date) \
+                .lt("createdAt", f"{date}T23:59:59") \
+                .order("createdAt")
+            result = await execute_query(query, "get_scraped_positions")
+            return result.data or []
 
-        return result.data or []
+        return await cached_json_response(request, ["scraped_positions", "positions"], fetch)
 
     except HTTPException as he:
         raise he
@@ -157,16 +316,17 @@ async def get_scraped_positions(date: str):
 async def delete_positions_by_scraped_position_id(scraped_position_id: str):
     try:
         # First, check if any positions exist with this scraped_position_id
-        existing_positions = supabase.from_("positions").select("id").eq("scraped_position", scraped_position_id).execute()
+        existing_positions = await execute_query(supabase.from_("positions").select("id").eq("scraped_position", scraped_position_id), "get_positions_by_scraped_position")
         
         if not existing_positions.data:
             raise HTTPException(status_code=404, detail="No positions found with the given scraped_position_id")
         
         # Delete all positions with the matching scraped_position_id
-        result = supabase.from_("positions").delete().eq("scraped_position", scraped_position_id).execute()
+        result = await execute_query(supabase.from_("positions").delete().eq("scraped_position", scraped_position_id), "delete_positions_by_scraped_position")
         
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to delete positions")
+        response_cache.invalidate("positions")
             
         return {
             "message": f"Successfully deleted {len(result.data)} position(s)",
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException
-from src.controllers.tasks import handle_closed_role_audit_task, handle_open_role_audit_task
+from fastapi import APIRouter, Header, HTTPException
+from loguru import logger
+from typing import Optional
+from src.controllers.tasks import handle_closed_role_audit_task, handle_open_role_audit_task, handle_task_batch, retry_failed_batch_tasks
 from src.types.tasks import TaskRequest
+from src.services.supabase import flush_status_buffers
 
 router = APIRouter(
     prefix="/tasks",
@@ -8,16 +11,32 @@ router = APIRouter(
 )
 
 @router.post("/handle")
-async def handle_task_route(task_request: TaskRequest):
+async def handle_task_route(task_request: TaskRequest, x_cloudtasks_taskname: Optional[str] = Header(None)):
     """
-    Route handler for task processing
+    Route handler for task processing. A request carries either one taskId or a batch of taskIds.
+    When some tasks of a batch fail, they are enqueued again as a new batch so Cloud Tasks does
+    not re-run the tasks that completed; the batch fails as a whole when every task failed or
+    the failures could not be enqueued, so Cloud Tasks retries it. Buffered status updates are flushed before responding; if that
+    flush fails, the task's own response is still returned and the updates stay buffered for the
+    background flusher.
     """
     try:
-        if task_request.is_closed_role_task:
-            return await handle_closed_role_audit_task(task_request)
-        elif task_request.is_open_role_task:
-            return await handle_open_role_audit_task(task_request)
-        else:
+        if not (task_request.is_closed_role_task or task_request.is_open_role_task):
             raise HTTPException(status_code=400, detail="Invalid task type")
+        if task_request.is_batch:
+            result = await handle_task_batch(task_request)
+            if not await retry_failed_batch_tasks(task_request, result, x_cloudtasks_taskname):
+                raise HTTPException(status_code=500, detail=result)
+            return result
+        if task_request.is_closed_role_task:
+            return await handle_closed_role_audit_task(task_request.taskId)
+        return await handle_open_role_audit_task(task_request.taskId)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        try:
+            await flush_status_buffers()
+        except Exception as e:
+            logger.error(f"Failed to flush task status updates, retrying in the background: {str(e)}")
@@ -1,17 +1,58 @@
 from dotenv import load_dotenv
 import os
 import asyncio
-from typing import Optional
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+import browserbase
 from browserbase import Browserbase
 from browser_use import Agent, Browser, BrowserConfig
 from browser_use.browser.context import BrowserContext, BrowserContextConfig, BrowserSession
 from langchain_anthropic import ChatAnthropic
-from playwright.async_api import Page, BrowserContext as PlaywrightContext
+from playwright.async_api import async_playwright, Playwright, Page, Browser as PlaywrightBrowser, BrowserContext as PlaywrightContext
 from loguru import logger
+from src.utils.resilience import dependency_from_env
 load_dotenv(override=True)
 BB_API_KEY = os.getenv("BB_API_KEY")
 BB_PROJECT_ID = os.getenv("BB_PROJECT_ID")
 
+# Connect to this CDP endpoint (e.g. a local Chromium started with --remote-debugging-port=9222)
+# instead of creating Browserbase sessions
+BROWSER_CDP_URL = os.getenv("BROWSER_CDP_URL")
+BROWSER_POOL_MAX_SESSIONS = int(os.getenv("BROWSER_POOL_MAX_SESSIONS", "5"))
+BROWSER_POOL_MAX_SESSION_AGE_SECONDS = float(os.getenv("BROWSER_POOL_MAX_SESSION_AGE_SECONDS", "1200"))
+BROWSER_POOL_IDLE_TIMEOUT_SECONDS = float(os.getenv("BROWSER_POOL_IDLE_TIMEOUT_SECONDS", "120"))
+BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+# Give up waiting for a free session after this long
+BROWSER_POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT_SECONDS", "300"))
+
+
+def is_transient_browserbase_error(error: BaseException, idempotent: bool) -> bool:
+    """
+    Failed connections, rate limits and 5xx are retried. A timed out request is only retried
+    when idempotent, as a session create may have gone through and would be billed twice.
+    """
+    if isinstance(error, browserbase.APITimeoutError):
+        return idempotent
+    if isinstance(error, (browserbase.APIConnectionError, browserbase.RateLimitError, browserbase.InternalServerError)):
+        return True
+    return isinstance(error, browserbase.APIStatusError) and error.status_code >= 500
+
+
+browserbase_dependency = dependency_from_env("Browserbase", "BROWSERBASE", is_transient_browserbase_error, deadline_seconds=30)
+
+
+def get_browserbase_client() -> Browserbase:
+    """
+    Browserbase API client with its own retries disabled, so calls retry through browserbase_dependency.
+
+    The SDK runs in threads that cannot be cancelled, so the dependency's deadline is enforced
+    as the SDK's request timeout rather than by abandoning the thread, which could still create
+    a keep-alive session that nobody releases.
+    """
+    return Browserbase(api_key=BB_API_KEY, max_retries=0, timeout=browserbase_dependency.deadline_seconds or 60)
+
 class ExtendedBrowserSession(BrowserSession):
     """Extended version of BrowserSession that includes current_page"""
     def __init__(
@@ -49,17 +90,253 @@ class UseBrowserbaseContext(BrowserContext):
     
     
 
-async def setup_browser() -> tuple[Browser, UseBrowserbaseContext]:
-    """Set up browser and context configurations.
+class BrowserPoolTimeout(Exception):
+    """Raised when no browser session became free within the acquire timeout."""
+
+
+@dataclass
+class PooledSession:
+    """A browser session leased from BrowserSessionPool, with its CDP connection."""
+    id: str
+    connect_url: str
+    browser: PlaywrightBrowser
+    created_at: float
+    last_used_at: float
+    is_browserbase: bool = True
+    # Local CDP connections share the browser's default context, so each session gets its own
+    own_context: Optional[PlaywrightContext] = None
+
+    @property
+    def context(self) -> PlaywrightContext:
+        return self.own_context or self.browser.contexts[0]
+
+    async def get_page(self) -> Page:
+        """Return the session's first page, opening one if the context has none."""
+        return self.context.pages[0] if self.context.pages else await self.context.new_page()
+
+
+class BrowserSessionPool:
+    """
+    Pool of warm browser sessions with lease/return semantics.
+
+    Creating a Browserbase session and connecting over CDP is a large fixed cost, so returned
+    sessions are kept connected and handed to the next lease. Sessions are retired once they
+    exceed the maximum age or fail a health check, idle sessions are reaped in the background,
+    and at most `max_sessions` are open at a time.
+    """
+
+    def __init__(self, max_sessions: int, max_session_age: float, idle_timeout: float, cdp_url: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.max_session_age = max_session_age
+        self.idle_timeout = idle_timeout
+        self.cdp_url = cdp_url
+        self._idle: List[PooledSession] = []
+        self._semaphore = asyncio.Semaphore(max(1, max_sessions))
+        self._playwright: Optional[Playwright] = None
+        self._playwright_lock = asyncio.Lock()
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background task that closes idle and expired sessions."""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle_sessions())
+
+    async def close(self):
+        """Stop the reaper, close idle sessions and shut down Playwright."""
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        while self._idle:
+            await self._close_session(self._idle.pop())
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def acquire(self, timeout: Optional[float] = BROWSER_POOL_ACQUIRE_TIMEOUT_SECONDS) -> PooledSession:
+        """
+        Lease a session, reusing a healthy idle one when available.
+
+        Waits while `max_sessions` sessions are leased.
+
+        Args:
+            timeout: Seconds to wait for a free session, None to wait indefinitely
+
+        Returns:
+            PooledSession: The leased session, to be handed back with release()
+
+        Raises:
+            BrowserPoolTimeout: If all sessions stayed leased for `timeout` seconds
+        """
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise BrowserPoolTimeout(f"No browser session became free within {timeout:g}s")
+        try:
+            while self._idle:
+                session = self._idle.pop()
+                if self._is_expired(session) or not await self._is_healthy(session):
+                    await self._close_session(session)
+                    continue
+                session.last_used_at = time.monotonic()
+                logger.info(f"Reusing browser session {session.id}")
+                return session
+            return await self._create_session()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def release(self, session: Optional[PooledSession]):
+        """
+        Return a leased session to the pool, or close it if it is expired or unhealthy.
+
+        Args:
+            session: The session returned by acquire()
+        """
+        if session is None:
+            return
+        try:
+            if not self._is_expired(session) and await self._is_healthy(session) and await self._reset(session):
+                session.last_used_at = time.monotonic()
+                self._idle.append(session)
+            else:
+                await self._close_session(session)
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[PooledSession]:
+        """Lease a session for the duration of the context."""
+        session = await self.acquire()
+        try:
+            yield session
+        finally:
+            await self.release(session)
+
+    async def _get_playwright(self) -> Playwright:
+        async with self._playwright_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            return self._playwright
+
+    async def _create_session(self) -> PooledSession:
+        playwright = await self._get_playwright()
+        now = time.monotonic()
+
+        if self.cdp_url:
+            browser = await playwright.chromium.connect_over_cdp(self.cdp_url)
+            context = await browser.new_context()
+            logger.info(f"Connected to local browser at {self.cdp_url}")
+            return PooledSession(f"local-{id(context)}", self.cdp_url, browser, now, now, is_browserbase=False, own_context=context)
+
+        bb = get_browserbase_client()
+        bb_session = await browserbase_dependency.call(
+            lambda: asyncio.to_thread(
+                bb.sessions.create,
+                project_id=BB_PROJECT_ID,
+                # Keep the session alive between CDP connections so it can be reused, for as long as
+                # the pool may hand it out. `timeout` is the HTTP request timeout, left to the client
+                keep_alive=True,
+                api_timeout=int(self.max_session_age + self.idle_timeout),
+            ),
+            idempotent=False,
+            label="Browserbase sessions.create",
+            threaded=True,
+        )
+        logger.info(f"View replay at https://browserbase.com/sessions/{bb_session.id}")
+        try:
+            browser = await playwright.chromium.connect_over_cdp(bb_session.connect_url)
+        except BaseException:
+            await self._release_browserbase_session(bb_session.id)
+            raise
+        return PooledSession(bb_session.id, bb_session.connect_url, browser, now, now)
+
+    def _is_expired(self, session: PooledSession) -> bool:
+        return time.monotonic() - session.created_at > self.max_session_age
+
+    async def _is_healthy(self, session: PooledSession) -> bool:
+        try:
+            if not session.browser.is_connected() or not session.browser.contexts:
+                return False
+            page = await session.get_page()
+            await asyncio.wait_for(page.evaluate("1"), timeout=BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SECONDS)
+            return True
+        except Exception as e:
+            logger.warning(f"Browser session {session.id} failed health check: {str(e)}")
+            return False
+
+    async def _reset(self, session: PooledSession) -> bool:
+        """Close extra tabs and blank the first page so the next lease starts clean."""
+        try:
+            page = await session.get_page()
+            for extra_page in session.context.pages:
+                if extra_page is not page:
+                    await extra_page.close()
+            await page.goto("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to reset browser session {session.id}: {str(e)}")
+            return False
+
+    async def _close_session(self, session: PooledSession):
+        try:
+            if session.own_context:
+                await session.own_context.close()
+            await session.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser for session {session.id}: {str(e)}")
+        if session.is_browserbase:
+            await self._release_browserbase_session(session.id)
+        logger.info(f"Closed browser session {session.id}")
+
+    async def _release_browserbase_session(self, session_id: str):
+        """Keep-alive sessions are not ended by disconnecting, so ask Browserbase to release them."""
+        try:
+            bb = get_browserbase_client()
+            await browserbase_dependency.call(
+                lambda: asyncio.to_thread(bb.sessions.update, session_id, project_id=BB_PROJECT_ID, status="REQUEST_RELEASE"),
+                label="Browserbase sessions.update",
+                threaded=True,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to release Browserbase session {session_id}: {str(e)}")
+
+    async def _reap_idle_sessions(self):
+        interval = max(1.0, min(self.idle_timeout, 30.0))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            stale = [
+                session for session in self._idle
+                if now - session.last_used_at > self.idle_timeout or self._is_expired(session)
+            ]
+            for session in stale:
+                if session in self._idle:
+                    self._idle.remove(session)
+                    await self._close_session(session)
+
+
+browser_pool = BrowserSessionPool(
+    max_sessions=BROWSER_POOL_MAX_SESSIONS,
+    max_session_age=BROWSER_POOL_MAX_SESSION_AGE_SECONDS,
+    idle_timeout=BROWSER_POOL_IDLE_TIMEOUT_SECONDS,
+    cdp_url=BROWSER_CDP_URL,
+)
+
+
+async def setup_browser() -> tuple[Browser, PooledSession]:
+    """Set up a browser-use Browser on a session leased from the pool.
 
     Returns:
-        tuple[Browser, UseBrowserbaseContext]: Configured browser and context.
+        tuple[Browser, PooledSession]: Configured browser and the leased session, which must be
+            handed back with browser_pool.release() once the browser is closed.
     """
-    bb = Browserbase(api_key=BB_API_KEY)
-    bb_session = bb.sessions.create(
-        project_id=BB_PROJECT_ID,
-    )
-    logger.info(f"View replay at https://browserbase.com/sessions/{bb_session.id}")
+    bb_session = await browser_pool.acquire()
+    try:
+        browser = Browser(config=BrowserConfig(cdp_url=bb_session.connect_url))
+    except BaseException:
+        # The caller only gets the session to release once setup succeeds
+        await browser_pool.release(bb_session)
+        raise
     
     # # Basic configuration
 # browser = Browser(
@@ -75,7 +352,6 @@ async def setup_browser() -> tuple[Browser, UseBrowserbaseContext]:
 # 		),
 # ))
 
-    browser = Browser(config=BrowserConfig(cdp_url=bb_session.connect_url))
     # context = UseBrowserbaseContext(
     #     browser,
     #     BrowserContextConfig(
@@ -84,4 +360,4 @@ async def setup_browser() -> tuple[Browser, UseBrowserbaseContext]:
     #     )
     # )
 
-    return browser, None
\ No newline at end of file
+    return browser, bb_session
\ No newline at end of file
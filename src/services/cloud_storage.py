@@ -1,6 +1,10 @@
 from google.cloud import storage
 from dotenv import load_dotenv
+from loguru import logger
+import asyncio
+import gzip
 import os
+import shutil
 
 load_dotenv(override=True)
 
@@ -11,6 +15,11 @@ storage_client = storage.Client()
 # The name for the new bucket
 bucket_name = "audit-backend-bucket"
 
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", "1"))
+# Read size used when streaming a local file into the upload
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
 
 async def upload_file_to_bucket(file_path: str, content: str, content_type: str):
     """Uploads a file or content to the bucket.
@@ -29,4 +38,37 @@ async def upload_file_to_bucket(file_path: str, content: str, content_type: str)
     # Upload content directly
     blob.upload_from_string(content, content_type=content_type)
     
-    return f"File uploaded to {file_path}"
\ No newline at end of file
+    return f"File uploaded to {file_path}"
+
+
+def _upload_local_file_gzipped(file_path: str, local_path: str, content_type: str):
+    """Stream a local file into the bucket, gzip-compressing it on the way, without reading it into memory."""
+    blob = storage_client.bucket(bucket_name=bucket_name).blob(file_path)
+    blob.content_encoding = "gzip"
+    with open(local_path, "rb") as source, blob.open("wb", content_type=content_type, ignore_flush=True) as destination:
+        with gzip.GzipFile(fileobj=destination, mode="wb") as compressed:
+            shutil.copyfileobj(source, compressed, UPLOAD_CHUNK_BYTES)
+
+
+async def upload_local_file_to_bucket(file_path: str, local_path: str, content_type: str, max_attempts: int = UPLOAD_MAX_ATTEMPTS):
+    """Uploads a local file to the bucket gzip-compressed, retrying with exponential backoff.
+    
+    The object is stored with Content-Encoding: gzip, so clients that accept gzip
+    (browsers, gsutil) receive the original content transparently.
+    
+    Args:
+        file_path: The path where the file should be stored in the bucket
+        local_path: Path of the local file to upload
+        content_type: The content type of the file (text/plain, text/html, text/markdown)
+        max_attempts: Number of attempts before giving up
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await asyncio.to_thread(_upload_local_file_gzipped, file_path, local_path, content_type)
+            return f"File uploaded to {file_path}"
+        except Exception as e:
+            if attempt == max_attempts:
+                raise
+            delay = UPLOAD_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Upload of {file_path} failed (attempt {attempt}/{max_attempts}), retrying in {delay:.1f}s: {str(e)}")
+            await asyncio.sleep(delay)
@@ -1,13 +1,17 @@
 from google.cloud import tasks_v2
+from google.api_core.exceptions import AlreadyExists
+from typing import Callable, List, Optional
+import asyncio
+import hashlib
 import os
+import re
 import json
 import base64
-import logging
+from loguru import logger
 from dotenv import load_dotenv
+from src.types.tasks import EnqueueResult
 
 load_dotenv(override=True)
-# Initialize the client
-client = tasks_v2.CloudTasksClient()
 
 # Get configuration from environment variables
 PROJECT_ID = os.getenv("PROJECT_ID")
@@ -15,34 +19,121 @@ LOCATION = os.getenv("CLOUD_TASKS_LOCATION")
 QUEUE = os.getenv("CLOUD_TASKS_QUEUE")
 SERVER_URL = os.getenv("SERVER_URL")
 
-async def create_task(payload: dict):
+# Number of create_task calls in flight at once, and how many payloads are enqueued per progress step
+ENQUEUE_CONCURRENCY = int(os.getenv("CLOUD_TASKS_ENQUEUE_CONCURRENCY", "50"))
+ENQUEUE_CHUNK_SIZE = int(os.getenv("CLOUD_TASKS_ENQUEUE_CHUNK_SIZE", "500"))
+
+# The async client binds to the running event loop, so it is created on first use
+_client: Optional[tasks_v2.CloudTasksAsyncClient] = None
+
+
+def get_client() -> tasks_v2.CloudTasksAsyncClient:
+    """Return the shared async Cloud Tasks client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = tasks_v2.CloudTasksAsyncClient()
+    return _client
+
+
+def build_task_name(key: str) -> str:
+    """
+    Build a deterministic, fully qualified task name from a dedupe key.
+
+    Cloud Tasks rejects a second task with the same name, so enqueueing the same key twice
+    creates only one task. A hash prefix spreads names across the keyspace, as sequential
+    task IDs increase enqueue latency.
+
+    Args:
+        key: Unique key for the unit of work, e.g. "closed-role-audit-123-20250101"
+
+    Returns:
+        str: The task name, e.g. projects/.../queues/.../tasks/<id>
+    """
+    digest = hashlib.sha256(key.encode()).hexdigest()[:12]
+    task_id = f"{digest}-{re.sub(r'[^A-Za-z0-9_-]', '-', key)}"[:500]
+    return tasks_v2.CloudTasksAsyncClient.task_path(PROJECT_ID, LOCATION, QUEUE, task_id)
+
+
+async def create_task(payload: dict, task_name: Optional[str] = None):
     """
     Create a new task in Cloud Tasks.
-    
+
     Args:
         payload (dict): The payload to be sent with the task
-        
+        task_name (Optional[str]): Fully qualified task name used to dedupe the task, see build_task_name
+
     Returns:
         The created task response
     """
     # Construct the fully qualified queue name
-    parent = client.queue_path(PROJECT_ID, LOCATION, QUEUE)
-
-    request = tasks_v2.CreateTaskRequest(
-        parent=parent,
-        task={
-            "http_request": {
-                "http_method": tasks_v2.HttpMethod.POST,
-                "url": f"{SERVER_URL}/tasks/handle",
-                "body": base64.b64encode(json.dumps(payload).encode()).decode(),
-                "headers": {
-                    "Content-Type": "application/json"
-                }
+    parent = tasks_v2.CloudTasksAsyncClient.queue_path(PROJECT_ID, LOCATION, QUEUE)
+
+    task = {
+        "http_request": {
+            "http_method": tasks_v2.HttpMethod.POST,
+            "url": f"{SERVER_URL}/tasks/handle",
+            "body": base64.b64encode(json.dumps(payload).encode()).decode(),
+            "headers": {
+                "Content-Type": "application/json"
             }
         }
-    )
-    
+    }
+    if task_name:
+        task["name"] = task_name
+
+    request = tasks_v2.CreateTaskRequest(parent=parent, task=task)
+
     # Create the task
-    response = client.create_task(request)
-    
+    response = await get_client().create_task(request)
+
     return response
+
+
+async def enqueue_tasks(
+    payloads: List[dict],
+    dedupe_key: Callable[[dict], str],
+    concurrency: int = ENQUEUE_CONCURRENCY,
+    chunk_size: int = ENQUEUE_CHUNK_SIZE,
+) -> EnqueueResult:
+    """
+    Enqueue many tasks with bounded parallelism, one chunk at a time.
+
+    Each payload gets a deterministic task name derived from `dedupe_key`, so re-running
+    the same enqueue skips tasks that already exist instead of creating duplicates.
+    Progress is logged after every chunk, and failures are collected rather than raised.
+
+    Args:
+        payloads: Task payloads to enqueue
+        dedupe_key: Function returning the unique key for a payload
+        concurrency: Maximum number of create_task calls in flight
+        chunk_size: Number of payloads enqueued per progress step
+
+    Returns:
+        EnqueueResult: Counts of created and already enqueued tasks, plus any failures
+    """
+    result = EnqueueResult()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def enqueue(payload: dict):
+        key = dedupe_key(payload)
+        async with semaphore:
+            try:
+                await create_task(payload, build_task_name(key))
+                result.created += 1
+            except AlreadyExists:
+                result.already_enqueued += 1
+            except Exception as e:
+                logger.error(f"Failed to enqueue task {key}: {str(e)}")
+                result.failed.append({"key": key, "error": str(e)})
+
+    chunk_size = max(1, chunk_size)
+    chunk_count = (len(payloads) + chunk_size - 1) // chunk_size
+    for index in range(chunk_count):
+        chunk = payloads[index * chunk_size:(index + 1) * chunk_size]
+        await asyncio.gather(*[enqueue(payload) for payload in chunk])
+        logger.info(
+            f"Enqueued chunk {index + 1}/{chunk_count}: {result.created} created, "
+            f"{result.already_enqueued} already enqueued, {len(result.failed)} failed"
+        )
+
+    return result
@@ -1,11 +1,110 @@
 import dotenv
 import os
+from typing import List, Optional
 import httpx
+from src.utils.resilience import dependency_from_env, is_not_rate_limited, retry_after_seconds
 
 dotenv.load_dotenv()
 
 DIRECTUS_TOKEN = os.getenv("DIRECTUS_API_KEY")
-base_url = "https://directus.apmseason.com"
+# Point at a local mock server for testing, e.g. DIRECTUS_URL=http://localhost:8055
+DIRECTUS_URL = os.getenv("DIRECTUS_URL", "https://directus.apmseason.com").rstrip("/")
+base_url = DIRECTUS_URL
+
+DIRECTUS_TIMEOUT_SECONDS = float(os.getenv("DIRECTUS_TIMEOUT_SECONDS", "15"))
+DIRECTUS_MAX_CONNECTIONS = int(os.getenv("DIRECTUS_MAX_CONNECTIONS", "20"))
+# Retries and the circuit breaker are configured with DIRECTUS_MAX_ATTEMPTS, DIRECTUS_RETRY_BASE_SECONDS,
+# DIRECTUS_RETRY_MAX_SECONDS, DIRECTUS_BREAKER_FAILURES and DIRECTUS_BREAKER_RECOVERY_SECONDS
+
+# Responses worth retrying for idempotent requests
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# Responses after which a create is retried, but only when they carry Retry-After: a rejection
+# by Directus itself. A 502/504 from the gateway may arrive after Directus committed the create.
+RETRYABLE_CREATE_STATUS_CODES = {429, 503}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_directus_client() -> httpx.AsyncClient:
+    """
+    Return the shared Directus client, creating it on first use.
+
+    The client is opened and closed with the app lifespan and keeps connections (HTTP/2
+    when available) alive between calls, so promotes and status changes reuse one TLS session.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=DIRECTUS_URL,
+            headers={
+                "Authorization": f"Bearer {DIRECTUS_TOKEN}",
+                "Content-Type": "application/json"
+            },
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(DIRECTUS_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(max_connections=DIRECTUS_MAX_CONNECTIONS, max_keepalive_connections=DIRECTUS_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close_directus_client():
+    """Close the shared Directus client, if it was created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def is_transient_directus_error(error: BaseException, idempotent: bool) -> bool:
+    """
+    Failed connections are always transient. For idempotent requests other transport errors
+    and 429/502/503/504 are too. A non-idempotent request may have been committed once it was
+    sent, so it is only retried on a 429 or 503 carrying Retry-After.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return idempotent
+    if isinstance(error, httpx.HTTPStatusError):
+        if idempotent:
+            return error.response.status_code in RETRYABLE_STATUS_CODES
+        return error.response.status_code in RETRYABLE_CREATE_STATUS_CODES and retry_after_seconds(error) is not None
+    return False
+
+
+# Rate limits are retried, honouring Retry-After, but do not open the circuit
+directus_dependency = dependency_from_env("Directus", "DIRECTUS", is_transient_directus_error, is_breaker_failure=is_not_rate_limited)
+
+
+async def _request(method: str, path: str, payload, idempotent: bool) -> dict:
+    """
+    Send a request to Directus through `directus_dependency`, which retries transient
+    failures (see is_transient_directus_error) with backoff behind a circuit breaker.
+
+    Args:
+        method: HTTP method
+        path: Path below DIRECTUS_URL
+        payload: JSON body
+        idempotent: Whether the request can safely be repeated after it may have been processed
+
+    Returns:
+        dict: The response from Directus
+    """
+    client = get_directus_client()
+
+    async def send() -> dict:
+        response = await client.request(method, path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    return await directus_dependency.call(send, idempotent=idempotent, label=f"Directus {method} {path}")
+
 
 async def add_position_to_directus(position: dict):
     """
@@ -17,19 +116,7 @@ async def add_position_to_directus(position: dict):
     Returns:
         dict: The response from Directus
     """
-    headers = {
-        "Authorization": f"Bearer {DIRECTUS_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{base_url}/items/positions",
-            json=position,
-            headers=headers
-        )
-        response.raise_for_status()
-        return response.json()
+    return await _request("POST", "/items/positions", position, idempotent=False)
 
 async def update_position_in_directus(position_id: str, new_position: dict):
     """
@@ -42,17 +129,31 @@ async def update_position_in_directus(position_id: str, new_position: dict):
     Returns:
         dict: The response from Directus
     """
-    headers = {
-        "Authorization": f"Bearer {DIRECTUS_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    return await _request("PATCH", f"/items/positions/{position_id}", new_position, idempotent=True)
+
+async def add_positions_to_directus(positions: List[dict]):
+    """
+    Add many positions to Directus with one request to the bulk /items/positions endpoint
     
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(
-            f"{base_url}/items/positions/{position_id}",
-            json=new_position,
-            headers=headers
-        )
-        response.raise_for_status()
-        return response.json()
-    
\ No newline at end of file
+    Directus creates the items in a single transaction, so either all positions are created or none.
+    
+    Args:
+        positions (List[dict]): The position data to add
+        
+    Returns:
+        dict: The response from Directus, whose data lists the created positions in input order
+    """
+    return await _request("POST", "/items/positions", positions, idempotent=False)
+
+async def update_positions_in_directus(position_ids: List[str], new_position: dict):
+    """
+    Apply the same update to many positions with one request to the bulk /items/positions endpoint
+    
+    Args:
+        position_ids (List[str]): The IDs of the positions to update
+        new_position (dict): The fields to set on every position
+        
+    Returns:
+        dict: The response from Directus, whose data lists the updated positions
+    """
+    return await _request("PATCH", "/items/positions", {"keys": position_ids, "data": new_position}, idempotent=True)
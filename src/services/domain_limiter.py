@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv(override=True)
+
+# "supabase" shares limits across instances through Postgres, "memory" keeps them per process
+DOMAIN_LIMITER_BACKEND = os.getenv("DOMAIN_LIMITER_BACKEND", "supabase").lower()
+# Page loads started per second per domain, with bursts of up to DOMAIN_BURST loads
+DOMAIN_RATE_PER_SECOND = float(os.getenv("DOMAIN_RATE_PER_SECOND", "0.5"))
+DOMAIN_BURST = float(os.getenv("DOMAIN_BURST", "3"))
+# Page loads in flight per domain across all workers
+DOMAIN_MAX_CONCURRENCY = int(os.getenv("DOMAIN_MAX_CONCURRENCY", "2"))
+# Per-domain overrides as JSON, e.g. {"jobs.lever.co": {"rate": 1, "burst": 5, "concurrency": 4}}
+DOMAIN_LIMITS = json.loads(os.getenv("DOMAIN_LIMITS", "{}"))
+# Slots of a worker that died without releasing them are freed after this long; held slots are
+# renewed every third of it, so a long page load or agent run keeps its slot
+DOMAIN_LEASE_SECONDS = float(os.getenv("DOMAIN_LEASE_SECONDS", "300"))
+# Give up waiting for a slot after this long
+DOMAIN_MAX_WAIT_SECONDS = float(os.getenv("DOMAIN_MAX_WAIT_SECONDS", "300"))
+# Poll interval while a domain is at its concurrency cap
+DOMAIN_POLL_SECONDS = float(os.getenv("DOMAIN_POLL_SECONDS", "1"))
+# After a shared store error, use the in-memory backend for this long before trying the store again
+DOMAIN_LIMITER_FALLBACK_SECONDS = float(os.getenv("DOMAIN_LIMITER_FALLBACK_SECONDS", "60"))
+
+
+class DomainLimitTimeout(Exception):
+    """Raised when no slot for a domain became free within DOMAIN_MAX_WAIT_SECONDS."""
+
+
+@dataclass
+class DomainLimits:
+    rate: float
+    burst: float
+    concurrency: int
+
+
+def get_domain(url: str) -> str:
+    """Host a URL's requests are limited by, e.g. jobs.lever.co."""
+    host = (urlsplit(url).hostname or "").lower().rstrip(".")
+    return host.removeprefix("www.")
+
+
+def get_domain_limits(domain: str) -> DomainLimits:
+    """Limits of a domain, from DOMAIN_LIMITS or the defaults."""
+    override = DOMAIN_LIMITS.get(domain, {})
+    return DomainLimits(
+        rate=float(override.get("rate", DOMAIN_RATE_PER_SECOND)),
+        burst=float(override.get("burst", DOMAIN_BURST)),
+        concurrency=int(override.get("concurrency", DOMAIN_MAX_CONCURRENCY)),
+    )
+
+
+@dataclass
+class _DomainState:
+    tokens: float
+    updated_at: float
+    leases: Dict[str, float] = field(default_factory=dict)
+
+
+class MemoryDomainLimiterBackend:
+    """Token buckets and concurrency slots kept in this process, for tests and as a fallback."""
+
+    def __init__(self):
+        self._states: Dict[str, _DomainState] = {}
+
+    async def try_acquire(self, domain: str, limits: DomainLimits, lease_seconds: float) -> Tuple[Optional[str], Optional[float]]:
+        """
+        Take a token and a concurrency slot for a domain if both are available.
+
+        Returns:
+            Tuple[Optional[str], Optional[float]]: The lease ID, or None with the seconds until a token
+                is available (None if the domain is at its concurrency cap)
+        """
+        now = time.monotonic()
+        state = self._states.setdefault(domain, _DomainState(tokens=limits.burst, updated_at=now))
+        state.leases = {lease_id: expires_at for lease_id, expires_at in state.leases.items() if expires_at > now}
+        state.tokens = min(limits.burst, state.tokens + (now - state.updated_at) * limits.rate)
+        state.updated_at = now
+
+        if len(state.leases) >= limits.concurrency:
+            return None, None
+        if state.tokens < 1:
+            return None, (1 - state.tokens) / limits.rate
+        state.tokens -= 1
+        lease_id = uuid.uuid4().hex
+        state.leases[lease_id] = now + lease_seconds
+        return lease_id, 0.0
+
+    async def extend(self, domain: str, lease_id: str, lease_seconds: float) -> None:
+        state = self._states.get(domain)
+        if state and lease_id in state.leases:
+            state.leases[lease_id] = time.monotonic() + lease_seconds
+
+    async def release(self, domain: str, lease_id: str) -> None:
+        state = self._states.get(domain)
+        if state:
+            state.leases.pop(lease_id, None)
+
+
+class SupabaseDomainLimiterBackend:
+    """
+    Token buckets and concurrency slots shared by every instance through two Postgres functions.
+
+    The bucket row of a domain is locked while a slot is taken, so concurrent workers never
+    oversubscribe it. Expects this schema:
+
+        create table domain_rate_limits (
+            domain text primary key,
+            tokens double precision not null,
+            updated_at timestamptz not null default now()
+        );
+        create table domain_leases (
+            id uuid primary key default gen_random_uuid(),
+            domain text not null,
+            expires_at timestamptz not null
+        );
+        create index on domain_leases (domain, expires_at);
+
+        create or replace function acquire_domain_slot(
+            p_domain text, p_rate double precision, p_burst double precision,
+            p_max_concurrency int, p_lease_seconds double precision
+        ) returns json language plpgsql as $$
+        declare
+            v_tokens double precision;
+            v_updated_at timestamptz;
+            v_active int;
+            v_lease_id uuid;
+        begin
+            insert into domain_rate_limits (domain, tokens) values (p_domain, p_burst) on conflict (domain) do nothing;
+            select tokens, updated_at into v_tokens, v_updated_at from domain_rate_limits where domain = p_domain for update;
+            delete from domain_leases where domain = p_domain and expires_at <= now();
+            select count(*) into v_active from domain_leases where domain = p_domain;
+            v_tokens := least(p_burst, v_tokens + extract(epoch from now() - v_updated_at) * p_rate);
+            if v_active >= p_max_concurrency or v_tokens < 1 then
+                update domain_rate_limits set tokens = v_tokens, updated_at = now() where domain = p_domain;
+                return json_build_object(
+                    'lease_id', null,
+                    'wait_seconds', case when v_active >= p_max_concurrency then null else (1 - v_tokens) / p_rate end
+                );
+            end if;
+            update domain_rate_limits set tokens = v_tokens - 1, updated_at = now() where domain = p_domain;
+            insert into domain_leases (domain, expires_at)
+                values (p_domain, now() + make_interval(secs => p_lease_seconds))
+                returning id into v_lease_id;
+            return json_build_object('lease_id', v_lease_id, 'wait_seconds', 0);
+        end $$;
+
+        create or replace function extend_domain_slot(p_lease_id uuid, p_lease_seconds double precision)
+        returns void language sql as $$
+            update domain_leases set expires_at = now() + make_interval(secs => p_lease_seconds) where id = p_lease_id;
+        $$;
+
+        create or replace function release_domain_slot(p_lease_id uuid) returns void language sql as $$
+            delete from domain_leases where id = p_lease_id;
+        $$;
+    """
+
+    async def try_acquire(self, domain: str, limits: DomainLimits, lease_seconds: float) -> Tuple[Optional[str], Optional[float]]:
+        from src.services.supabase import supabase, execute_query
+
+        response = await execute_query(supabase.rpc("acquire_domain_slot", {
+            "p_domain": domain,
+            "p_rate": limits.rate,
+            "p_burst": limits.burst,
+            "p_max_concurrency": limits.concurrency,
+            "p_lease_seconds": lease_seconds,
+        }), "acquire_domain_slot")
+        result = response.data or {}
+        return result.get("lease_id"), result.get("wait_seconds")
+
+    async def extend(self, domain: str, lease_id: str, lease_seconds: float) -> None:
+        from src.services.supabase import supabase, execute_query
+
+        await execute_query(supabase.rpc("extend_domain_slot", {
+            "p_lease_id": lease_id,
+            "p_lease_seconds": lease_seconds,
+        }), "extend_domain_slot")
+
+    async def release(self, domain: str, lease_id: str) -> None:
+        from src.services.supabase import supabase, execute_query
+
+        await execute_query(supabase.rpc("release_domain_slot", {"p_lease_id": lease_id}), "release_domain_slot")
+
+
+class DomainLimiter:
+    """
+    Per-domain politeness limiter for page loads.
+
+    Each load of a URL takes a token from its domain's bucket and holds one of the domain's
+    concurrency slots until it finishes. The slot's lease is renewed while it is held, so it
+    only expires early when the worker dies. When the shared store fails, the limiter falls
+    back to the in-memory backend for DOMAIN_LIMITER_FALLBACK_SECONDS rather than failing the task.
+    """
+
+    def __init__(self, backend, fallback: Optional[MemoryDomainLimiterBackend] = None):
+        self.backend = backend
+        self.fallback = fallback or (backend if isinstance(backend, MemoryDomainLimiterBackend) else MemoryDomainLimiterBackend())
+        self._fallback_until = 0.0
+
+    def _active_backend(self):
+        if self.backend is self.fallback or time.monotonic() < self._fallback_until:
+            return self.fallback
+        return self.backend
+
+    async def _try_acquire(self, domain: str, limits: DomainLimits):
+        backend = self._active_backend()
+        try:
+            lease_id, wait_seconds = await backend.try_acquire(domain, limits, DOMAIN_LEASE_SECONDS)
+            return backend, lease_id, wait_seconds
+        except Exception as e:
+            if backend is self.fallback:
+                raise
+            logger.warning(f"Domain limiter store failed, limiting in memory for {DOMAIN_LIMITER_FALLBACK_SECONDS:.0f}s: {str(e)}")
+            self._fallback_until = time.monotonic() + DOMAIN_LIMITER_FALLBACK_SECONDS
+            lease_id, wait_seconds = await self.fallback.try_acquire(domain, limits, DOMAIN_LEASE_SECONDS)
+            return self.fallback, lease_id, wait_seconds
+
+    async def _renew_lease(self, backend, domain: str, lease_id: str) -> None:
+        """Extend a held slot's lease every third of DOMAIN_LEASE_SECONDS until cancelled."""
+        while True:
+            await asyncio.sleep(DOMAIN_LEASE_SECONDS / 3)
+            try:
+                await backend.extend(domain, lease_id, DOMAIN_LEASE_SECONDS)
+            except Exception as e:
+                logger.warning(f"Failed to renew slot for {domain}: {str(e)}")
+
+    @asynccontextmanager
+    async def limit(self, url: str) -> AsyncIterator[None]:
+        """
+        Wait for a token and a concurrency slot for the URL's domain, holding the slot for the block.
+
+        Args:
+            url: URL about to be loaded
+
+        Raises:
+            DomainLimitTimeout: If no slot became free within DOMAIN_MAX_WAIT_SECONDS
+        """
+        domain = get_domain(url)
+        if not domain:
+            yield
+            return
+
+        limits = get_domain_limits(domain)
+        deadline = time.monotonic() + DOMAIN_MAX_WAIT_SECONDS
+        waited = False
+        while True:
+            backend, lease_id, wait_seconds = await self._try_acquire(domain, limits)
+            if lease_id:
+                break
+            delay = DOMAIN_POLL_SECONDS if wait_seconds is None else max(wait_seconds, 0.05)
+            if time.monotonic() + delay > deadline:
+                raise DomainLimitTimeout(f"No slot for {domain} within {DOMAIN_MAX_WAIT_SECONDS:.0f}s")
+            if not waited:
+                logger.info(f"Waiting for a slot for {domain}")
+                waited = True
+            # Jitter keeps workers waiting on the same domain from retrying in lockstep
+            await asyncio.sleep(delay * random.uniform(1.0, 1.25))
+
+        renewal = asyncio.create_task(self._renew_lease(backend, domain, lease_id))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                await backend.release(domain, lease_id)
+            except Exception as e:
+                logger.warning(f"Failed to release slot for {domain}, it expires in {DOMAIN_LEASE_SECONDS:.0f}s: {str(e)}")
+
+
+def _create_backend():
+    if DOMAIN_LIMITER_BACKEND == "memory":
+        return MemoryDomainLimiterBackend()
+    return SupabaseDomainLimiterBackend()
+
+
+domain_limiter = DomainLimiter(_create_backend())
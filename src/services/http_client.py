@@ -0,0 +1,44 @@
+import os
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+
+# Career sites commonly block non-browser user agents outright
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client used for plain page fetches, creating it on first use.
+
+    The client keeps connections alive between requests, so repeated fetches against the
+    same career site reuse TCP and TLS sessions.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS // 2),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client, if it was created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import re
+import time
+from typing import Optional
+import openai
+from dotenv import load_dotenv
+from loguru import logger
+from src.utils.resilience import dependency_from_env, is_not_rate_limited
+
+load_dotenv(override=True)
+
+# Maximum number of OpenAI requests in flight per worker
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# Hold new requests until the window resets once remaining quota drops below these values
+LLM_MIN_REMAINING_REQUESTS = int(os.getenv("LLM_MIN_REMAINING_REQUESTS", "2"))
+LLM_MIN_REMAINING_TOKENS = int(os.getenv("LLM_MIN_REMAINING_TOKENS", "20000"))
+
+_client: Optional[openai.AsyncOpenAI] = None
+_semaphore = asyncio.Semaphore(max(1, LLM_CONCURRENCY))
+_resume_at = 0.0
+
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def is_transient_openai_error(error: BaseException, idempotent: bool) -> bool:
+    """Connection errors, timeouts, 409s, 5xx and rate limits are retried; an exhausted quota is not."""
+    if isinstance(error, openai.RateLimitError):
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError, openai.ConflictError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+# The client's own retries are disabled so every attempt goes through this policy and its circuit breaker.
+# Rate limits are retried with backoff but do not open the circuit
+openai_dependency = dependency_from_env("OpenAI", "OPENAI", is_transient_openai_error, max_attempts=4, deadline_seconds=120, is_breaker_failure=is_not_rate_limited)
+
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Return the shared async OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(max_retries=0, timeout=openai_dependency.deadline_seconds or 600)
+    return _client
+
+
+def parse_reset_duration(value: Optional[str]) -> float:
+    """
+    Parse an OpenAI rate limit reset header into seconds.
+
+    Args:
+        value: Header value such as "1s", "6m0s" or "120ms"
+
+    Returns:
+        float: Number of seconds until the limit resets, 0 if unknown
+    """
+    if not value:
+        return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value))
+
+
+def _update_rate_limit(headers) -> None:
+    """Push back the time new requests may start if the rate limit headers show quota is nearly used up."""
+    global _resume_at
+    try:
+        remaining_requests = int(headers.get("x-ratelimit-remaining-requests", LLM_MIN_REMAINING_REQUESTS + 1))
+        remaining_tokens = int(headers.get("x-ratelimit-remaining-tokens", LLM_MIN_REMAINING_TOKENS + 1))
+    except ValueError:
+        return
+
+    delay = 0.0
+    if remaining_requests <= LLM_MIN_REMAINING_REQUESTS:
+        delay = max(delay, parse_reset_duration(headers.get("x-ratelimit-reset-requests")))
+    if remaining_tokens <= LLM_MIN_REMAINING_TOKENS:
+        delay = max(delay, parse_reset_duration(headers.get("x-ratelimit-reset-tokens")))
+
+    if delay > 0:
+        _resume_at = max(_resume_at, time.monotonic() + delay)
+        logger.warning(f"OpenAI rate limit nearly exhausted ({remaining_requests} requests, {remaining_tokens} tokens left), pausing for {delay:.1f}s")
+
+
+async def parse_response(client: openai.AsyncOpenAI, **kwargs):
+    """
+    Call `client.responses.parse` under the shared concurrency limit.
+
+    Requests wait while a previous response's rate limit headers indicated the quota
+    was nearly exhausted, so a burst of extractions backs off instead of hitting 429s.
+    Transient failures are retried with backoff through `openai_dependency`, which also
+    bounds each attempt by OPENAI_DEADLINE_SECONDS and fails fast while OpenAI is down.
+
+    Args:
+        client: Async OpenAI client to use
+        **kwargs: Arguments forwarded to `responses.parse`
+
+    Returns:
+        The parsed response, as returned by `responses.parse`
+    """
+    async with _semaphore:
+        delay = _resume_at - time.monotonic()
+        if delay > 0:
+            logger.info(f"Waiting {delay:.1f}s for OpenAI rate limit to reset")
+            await asyncio.sleep(delay)
+
+        raw_response = await openai_dependency.call(lambda: client.responses.with_raw_response.parse(**kwargs), label="OpenAI responses.parse")
+        _update_rate_limit(raw_response.headers)
+        return raw_response.parse()
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv(override=True)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+LLM_CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MAX_MEMORY_ENTRIES", "1024"))
+LLM_CACHE_MAX_DB_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DB_ENTRIES", "100000"))
+
+# Expired and excess rows are pruned from the SQLite tier once every this many writes
+_EVICT_EVERY_N_WRITES = 100
+
+
+def normalize_content(content: str) -> str:
+    """Collapse whitespace so formatting-only differences between fetches share a cache entry."""
+    return re.sub(r"\s+", " ", content or "").strip()
+
+
+def make_cache_key(namespace: str, content: str, prompt_version: str, model: str, url: str = "") -> str:
+    """
+    Build a cache key from the final model inputs and everything else that shapes the LLM output.
+
+    Screenshots are left out: their bytes differ on every render of the same page, so keying on
+    them would never hit.
+
+    Args:
+        namespace: Name of the agent call, e.g. "job_data"
+        content: Page content exactly as sent to the model, i.e. after compaction
+        prompt_version: Version of the prompt, bumped whenever the prompt changes
+        model: Model name used for the call
+        url: Source URL when the result depends on it, e.g. because the prompt includes it
+
+    Returns:
+        str: Hex SHA-256 digest identifying the call
+    """
+    digest = hashlib.sha256()
+    for part in (namespace, prompt_version, model, url, normalize_content(content)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache for structured LLM results.
+
+    An in-process LRU answers repeated lookups within a worker, and a local SQLite file
+    keeps results across restarts. Both tiers expire entries after `ttl_seconds`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_memory_entries: int, max_db_entries: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_db_entries = max_db_entries
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+        return self._connection
+
+    def _remember(self, key: str, expires_at: float, value: dict) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str) -> Optional[tuple[float, dict]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if not row:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _db_set(self, key: str, value: dict, expires_at: float) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY_N_WRITES == 0:
+                self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Delete expired rows, then the soonest-expiring rows beyond max_db_entries."""
+        connection.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_db_entries,),
+        )
+
+    async def get(self, key: str) -> Optional[dict]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Optional[dict]: The cached result, or None on a miss or if caching is disabled
+        """
+        if not LLM_CACHE_ENABLED:
+            return None
+
+        entry = self._memory.get(key)
+        if entry:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                return value
+            del self._memory[key]
+
+        try:
+            entry = await asyncio.to_thread(self._db_get, key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            return None
+        if not entry:
+            return None
+
+        expires_at, value = entry
+        self._remember(key, expires_at, value)
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        """
+        Store a result in both tiers.
+
+        Args:
+            key: Cache key from make_cache_key
+            value: JSON-serializable result, e.g. model.model_dump(mode="json")
+        """
+        if not LLM_CACHE_ENABLED:
+            return
+
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, value)
+        try:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+
+llm_cache = LLMCache(
+    path=LLM_CACHE_PATH,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    max_memory_entries=LLM_CACHE_MAX_MEMORY_ENTRIES,
+    max_db_entries=LLM_CACHE_MAX_DB_ENTRIES,
+)
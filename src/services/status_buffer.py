@@ -0,0 +1,129 @@
+from typing import Awaitable, Callable, Dict, List
+import asyncio
+import json
+import os
+from loguru import logger
+
+# Seconds between background flushes of buffered status updates
+STATUS_BUFFER_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATUS_BUFFER_FLUSH_INTERVAL_SECONDS", "2"))
+# Number of tasks with pending updates that triggers an immediate flush
+STATUS_BUFFER_MAX_PENDING = int(os.getenv("STATUS_BUFFER_MAX_PENDING", "200"))
+# Failed writes of a task's update are retried on this many flushes before the update is dropped
+STATUS_BUFFER_MAX_ATTEMPTS = int(os.getenv("STATUS_BUFFER_MAX_ATTEMPTS", "5"))
+
+
+class StatusUpdateBuffer:
+    """
+    Write-behind buffer for task status updates.
+
+    Updates are merged per task ID, so a task that moves from IN_PROGRESS to COMPLETED
+    between two flushes costs a single write. On flush, tasks whose merged payloads are
+    identical are written together with one bulk update.
+
+    A failed write is kept for the next flush only when `is_transient` says the error may
+    clear up, and at most `max_attempts` times. Other failures are dead-lettered: the update
+    is logged as an error with its payload and dropped, so one bad update (e.g. a column
+    missing from the table) does not fail every later flush.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[dict, List[int]], Awaitable[None]],
+        is_transient: Callable[[BaseException], bool] = lambda error: True,
+        flush_interval: float = STATUS_BUFFER_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = STATUS_BUFFER_MAX_PENDING,
+        max_attempts: int = STATUS_BUFFER_MAX_ATTEMPTS,
+    ):
+        self.name = name
+        self.write_batch = write_batch
+        self.is_transient = is_transient
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self._pending: Dict[int, dict] = {}
+        self._attempts: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+
+    async def add(self, task_ids: List[int], payload: dict) -> None:
+        """
+        Buffer an update for the given tasks, merging it over any update still pending for them.
+
+        Args:
+            task_ids: IDs of the tasks to update
+            payload: Columns to set
+        """
+        for task_id in task_ids:
+            self._pending[task_id] = {**self._pending.get(task_id, {}), **payload}
+        if len(self._pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Flushing {self.name} status updates failed, will retry: {str(e)}")
+
+    async def flush(self) -> None:
+        """
+        Write all pending updates. Updates that fail transiently are kept for the next flush
+        and the first such error is raised once every group has been attempted.
+        """
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            groups: Dict[str, List[int]] = {}
+            for task_id, payload in pending.items():
+                groups.setdefault(json.dumps(payload, sort_keys=True, default=str), []).append(task_id)
+
+            first_error = None
+            for task_ids in groups.values():
+                payload = pending[task_ids[0]]
+                try:
+                    await self.write_batch(payload, task_ids)
+                except Exception as e:
+                    attempts = max(self._attempts.get(task_id, 0) for task_id in task_ids) + 1
+                    if not self.is_transient(e) or attempts >= self.max_attempts:
+                        logger.error(
+                            f"Dropping {self.name} status update for tasks {task_ids} after {attempts} attempts: "
+                            f"{str(e)} (payload: {json.dumps(payload, default=str)})"
+                        )
+                        for task_id in task_ids:
+                            self._attempts.pop(task_id, None)
+                        continue
+                    first_error = first_error or e
+                    # Newer updates buffered during the write take precedence over the failed ones
+                    for task_id in task_ids:
+                        self._attempts[task_id] = attempts
+                        self._pending[task_id] = {**payload, **self._pending.get(task_id, {})}
+                else:
+                    for task_id in task_ids:
+                        self._attempts.pop(task_id, None)
+
+            if first_error:
+                raise first_error
+            logger.debug(f"Flushed {self.name} status updates for {len(pending)} tasks in {len(groups)} writes")
+
+    async def _run_flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Flushing {self.name} status updates failed, will retry: {str(e)}")
+
+    def start(self) -> None:
+        """Start flushing in the background every flush_interval seconds."""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def close(self) -> None:
+        """Stop the background flusher and write everything still pending."""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
@@ -1,11 +1,56 @@
-from supabase import create_client, Client
-from typing import List, Optional
+from supabase import create_client, Client, ClientOptions
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import httpx
 import os
+import re
+import time
 from enum import Enum
 from loguru import logger
 from postgrest.exceptions import APIError
 from src.types.audit import AuditStatus
-from datetime import datetime
+from src.services.status_buffer import StatusUpdateBuffer
+from src.utils.response_cache import response_cache
+from src.utils.seen_url_index import seen_url_index
+from src.utils.canonical_url import canonicalize_url
+from src.utils.resilience import CircuitOpenError, dependency_from_env
+from datetime import date, datetime
+
+# supabase-py is synchronous, so queries run on a dedicated thread pool to keep the event loop free.
+# All threads share the client above and therefore its HTTP connection pool.
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+_db_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+
+T = TypeVar("T")
+
+# Error codes of conditions that clear up on their own: serialization failures, deadlocks, connection
+# limits, restarts, PostgREST losing its database connection, and HTTP statuses from the gateway
+# (PostgREST reports the status as the code when the error body is not JSON)
+TRANSIENT_ERROR_CODES = {
+    "40001", "40P01", "53300", "57P01", "57P03", "08000", "08001", "08003", "08006",
+    "PGRST000", "PGRST001", "PGRST002", "429", "502", "503", "504",
+}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PATCH", "PUT", "DELETE"}
+
+
+def is_transient_supabase_error(error: BaseException, idempotent: bool) -> bool:
+    """
+    Failed connections and transient database errors are retried. Errors after the request
+    was sent, such as read timeouts, are only retried for idempotent requests, so an insert
+    or RPC is never applied twice.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(error, httpx.TransportError):
+        return idempotent
+    if isinstance(error, APIError):
+        return str(error.code) in TRANSIENT_ERROR_CODES
+    return False
+
+
+supabase_dependency = dependency_from_env("Supabase", "SUPABASE", is_transient_supabase_error, deadline_seconds=60)
 
 # Initialize Supabase client
 supabase_url = os.getenv("SUPABASE_URL")
@@ -14,27 +59,137 @@ supabase_key = os.getenv("SUPABASE_ANON_KEY")
 if not supabase_url or not supabase_key:
     raise ValueError("Missing Supabase environment variables")
 
-supabase: Client = create_client(supabase_url, supabase_key)
+# Queries run in threads that cannot be cancelled, so the per-call deadline is the client's own
+# request timeout: a timed out request is then really abandoned instead of finishing unseen
+supabase: Client = create_client(supabase_url, supabase_key, options=ClientOptions(
+    postgrest_client_timeout=supabase_dependency.deadline_seconds or 120,
+    storage_client_timeout=supabase_dependency.deadline_seconds or 20,
+))
 
 
-async def upload_screenshot_to_storage(screenshot: bytes, filename: str) -> str:
+async def run_in_db_executor(func: Callable[[], T], label: str) -> T:
     """
-    Upload a base64 encoded screenshot to Supabase storage.
+    Run a blocking Supabase call on the database thread pool and log how long it took.
+    
+    Args:
+        func: Zero-argument callable performing the blocking call
+        label: Name used to identify the call in timing logs
+        
+    Returns:
+        The return value of `func`
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_db_executor, context.run, func)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.debug(f"Supabase {label} took {elapsed_ms:.1f}ms")
+
+
+async def execute_query(query, label: str):
+    """
+    Execute a PostgREST query builder without blocking the event loop.
+    
+    Transient failures are retried through `supabase_dependency`; writes that may already have
+    been applied are only retried when the HTTP method is idempotent.
     
     Args:
-        screenshot_base64 (str): Base64 encoded screenshot data
+        query: A supabase-py query builder, e.g. supabase.table("positions").select("*")
+        label: Name used to identify the query in timing logs
+        
+    Returns:
+        The APIResponse returned by `query.execute()`
+    """
+    idempotent = getattr(query, "http_method", "POST") in IDEMPOTENT_METHODS
+    return await supabase_dependency.call(
+        lambda: run_in_db_executor(query.execute, label),
+        idempotent=idempotent,
+        label=f"Supabase {label}",
+        threaded=True,
+    )
+
+
+# Rows per page when walking a table with keyset pagination
+AUDIT_PAGE_SIZE = int(os.getenv("AUDIT_PAGE_SIZE", "500"))
+# Embedded relations selected in place of a field of the same name in sparse field lists
+CLOSED_ROLE_AUDIT_TASK_RELATIONS = {"job": "job(*, company(*, logo(*)))"}
+OPEN_ROLE_AUDIT_TASK_RELATIONS = {"company": "company(*, logo(filename_disk))"}
+_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def build_select(fields: Optional[List[str]], relations: dict) -> str:
+    """
+    Build a PostgREST select clause for a sparse field list.
+    
+    Args:
+        fields: Column or relation names to return, or None for every column and relation
+        relations: Relation names mapped to their embedded select
+        
+    Returns:
+        str: The select clause, which always includes id as pages are keyed on it
+        
+    Raises:
+        ValueError: If a field name is not a plain identifier
+    """
+    if not fields:
+        return ", ".join(["*", *relations.values()])
+    columns = ["id"]
+    for field in fields:
+        if not _FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field: {field}")
+        column = relations.get(field, field)
+        if column not in columns:
+            columns.append(column)
+    return ", ".join(columns)
+
+
+async def iter_pages(fetch_page: Callable[..., Awaitable[List[dict]]], page_size: int = AUDIT_PAGE_SIZE, after_id: Optional[int] = None, **filters) -> AsyncIterator[List[dict]]:
+    """
+    Walk a keyset-paginated query page by page, so callers never hold the whole table.
+    
+    Args:
+        fetch_page: Page function taking after_id, limit and the given filters, returning rows ordered by id
+        page_size: Rows per page
+        after_id: Start after this ID instead of at the first row
+        **filters: Passed through to fetch_page
+        
+    Yields:
+        List[dict]: Non-empty pages of rows
+    """
+    while True:
+        page = await fetch_page(after_id=after_id, limit=page_size, **filters)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]["id"]
+
+
+async def upload_screenshot_to_storage(screenshot: bytes, filename: str, content_type: str = "image/png") -> str:
+    """
+    Upload an encoded screenshot to Supabase storage.
+    
+    Args:
+        screenshot (bytes): Encoded image data
         filename (str): Name to save the file as
+        content_type (str): MIME type of the image, e.g. image/webp
         
     Returns:
         str: Public URL of the uploaded file
     """
     try:
         # Remove base64 prefix if present
-        # Upload to screenshots bucket
-        response = supabase.storage.from_("audit").upload(
-            path=filename,
-            file=screenshot,
-            file_options={"contentType": "image/png", "upsert": "true"}
+        # Upload to screenshots bucket; an upsert can safely be retried
+        response = await supabase_dependency.call(
+            lambda: run_in_db_executor(lambda: supabase.storage.from_("audit").upload(
+                path=filename,
+                file=screenshot,
+                file_options={"contentType": content_type, "upsert": "true"}
+            ), "upload_screenshot_to_storage"),
+            label="Supabase upload_screenshot_to_storage",
+            threaded=True,
         )
         
         # Get public URL
@@ -50,21 +205,51 @@ async def get_open_jobs():
     """Fetch all open jobs from the positions table."""
     logger.info("Fetching open jobs")
     try:
-        response = supabase.table("positions").select("*, companies(*)").eq("status", "open").eq("hidden", False).execute()
+        query = supabase.table("positions").select("*, companies(*)").eq("status", "open").eq("hidden", False)
+        response = await execute_query(query, "get_open_jobs")
         return response.data or []
     except APIError as e:
         raise Exception(f"Error fetching open jobs: {str(e)}")
 
-async def clear_closed_role_audit_tasks():
-    """Clear all closed role audit tasks."""
+async def get_position_statuses_page(after_id: Optional[int] = None, limit: int = AUDIT_PAGE_SIZE) -> List[dict]:
+    """Fetch the company and status of one page of positions ordered by ID, for company close rates."""
     try:
-        response = supabase.table("closed_role_audit_tasks") \
-            .delete() \
-            .neq("id", 0) \
-            .execute()
+        query = supabase.table("positions") \
+            .select("id, company, status") \
+            .order("id") \
+            .limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        response = await execute_query(query, "get_position_statuses_page")
+        return response.data or []
+    except APIError as e:
+        raise Exception(f"Error fetching position statuses: {str(e)}")
+
+async def reset_closed_role_audit_tasks():
+    """
+    Mark every closed role audit task as not run, keeping its ID and check history.
+    
+    Task IDs stay the same across full audits, and checkedAt, tier and tokens are kept
+    for scheduling and the daily budget.
+    
+    Returns:
+        List[dict]: The reset tasks
+    """
+    try:
+        query = supabase.table("closed_role_audit_tasks") \
+            .update({
+                "status": AuditStatus.NOT_RUN,
+                "statusMessage": "Task has not run",
+                "result": None,
+                "justification": None,
+                "screenshot": None
+            }) \
+            .neq("id", 0)
+        response = await execute_query(query, "reset_closed_role_audit_tasks")
+        response_cache.invalidate("closed_role_audit_tasks")
         return response.data
     except APIError as e:
-        raise Exception(f"Error clearing closed role audit tasks: {str(e)}")
+        raise Exception(f"Error resetting closed role audit tasks: {str(e)}")
 
 async def insert_closed_role_audit_tasks(job_ids: List[str]):
     """Insert new closed role audit tasks for given job IDs."""
@@ -75,76 +260,230 @@ async def insert_closed_role_audit_tasks(job_ids: List[str]):
     } for job_id in job_ids]
     
     try:
-        response = supabase.table("closed_role_audit_tasks") \
-            .insert(tasks) \
-            .execute()
+        query = supabase.table("closed_role_audit_tasks") \
+            .insert(tasks)
+        response = await execute_query(query, "insert_closed_role_audit_tasks")
+        response_cache.invalidate("closed_role_audit_tasks")
         return response.data
     except APIError as e:
         raise Exception(f"Error inserting closed role audit tasks: {str(e)}")
 
+async def get_closed_role_audit_history():
+    """
+    Fetch the latest audit state of every closed role audit task, without joins.
+    
+    Used by incremental audits to decide which jobs need to be checked again.
+    """
+    try:
+        query = supabase.table("closed_role_audit_tasks") \
+            .select("id, job, status, result, tier, tokens, checkedAt, etag, lastModified, contentLength")
+        response = await execute_query(query, "get_closed_role_audit_history")
+        return response.data or []
+    except APIError as e:
+        raise Exception(f"Error fetching closed role audit history: {str(e)}")
+
+async def delete_closed_role_audit_tasks_by_ids(task_ids: List[str]):
+    """Delete closed role audit tasks by their IDs."""
+    try:
+        query = supabase.table("closed_role_audit_tasks") \
+            .delete() \
+            .in_("id", task_ids)
+        response = await execute_query(query, "delete_closed_role_audit_tasks_by_ids")
+        response_cache.invalidate("closed_role_audit_tasks")
+        return response.data
+    except APIError as e:
+        raise Exception(f"Error deleting closed role audit tasks: {str(e)}")
+
 async def get_closed_role_audit_tasks_by_ids(task_ids: List[str]):
     """Fetch specific closed role audit tasks by their IDs."""
     try:
-        response = supabase.table("closed_role_audit_tasks") \
+        query = supabase.table("closed_role_audit_tasks") \
             .select("*, job(*, company(*))") \
-            .in_("id", task_ids) \
-            .execute()
+            .in_("id", task_ids)
+        response = await execute_query(query, "get_closed_role_audit_tasks_by_ids")
         return response.data
     except APIError as e:
         raise Exception(f"Error fetching tasks: {str(e)}")
 
+async def get_closed_role_audit_tasks_page(
+    after_id: Optional[int] = None,
+    limit: int = AUDIT_PAGE_SIZE,
+    status: Optional[List[str]] = None,
+    result: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Fetch one page of closed role audit tasks ordered by ID.
+    
+    Args:
+        after_id: Return tasks with an ID greater than this cursor
+        limit: Maximum number of tasks
+        status: Only tasks with one of these statuses
+        result: Only tasks with one of these results
+        fields: Sparse field list, see build_select
+        
+    Returns:
+        List[dict]: The tasks of the page
+    """
+    try:
+        query = supabase.table("closed_role_audit_tasks") \
+            .select(build_select(fields, CLOSED_ROLE_AUDIT_TASK_RELATIONS)) \
+            .order("id") \
+            .limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        if status:
+            query = query.in_("status", status)
+        if result:
+            query = query.in_("result", result)
+        response = await execute_query(query, "get_closed_role_audit_tasks_page")
+        return response.data or []
+    except APIError as e:
+        raise Exception(f"Error fetching closed role audit tasks page: {str(e)}")
+
 async def get_all_closed_role_audit_tasks():
     """Fetch all closed role audit tasks."""
     try:
-        response = supabase.table("closed_role_audit_tasks") \
-            .select("*, job(*, company(*, logo(*)))") \
-            .execute()
+        query = supabase.table("closed_role_audit_tasks") \
+            .select("*, job(*, company(*, logo(*)))")
+        response = await execute_query(query, "get_all_closed_role_audit_tasks")
             
         return response.data
     except APIError as e:
         raise Exception(f"Error fetching all closed role audit tasks: {str(e)}")
 
+def _is_transient_status_error(error: BaseException) -> bool:
+    """Whether a failed status write may succeed on a later flush; updates are PATCHes, so idempotent."""
+    return isinstance(error, CircuitOpenError) or is_transient_supabase_error(error.__cause__ or error, True)
+
+async def _write_closed_role_task_status(payload: dict, task_ids: List[int]):
+    """Write one coalesced status payload to a group of closed role audit tasks."""
+    try:
+        query = supabase.table("closed_role_audit_tasks") \
+            .update(payload) \
+            .in_("id", task_ids)
+        await execute_query(query, "update_closed_role_task_status")
+        response_cache.invalidate("closed_role_audit_tasks")
+    except APIError as e:
+        raise Exception(f"Error updating task status: {str(e)}") from e
+
+closed_role_status_buffer = StatusUpdateBuffer("closed_role_audit_tasks", _write_closed_role_task_status, _is_transient_status_error)
+
 async def update_closed_role_task_status(task_ids: List[str], status: AuditStatus, status_message: str, additional_payload: dict = None):
     """
     Update task status and optionally additional fields for specific tasks.
     
+    The update is buffered and written by closed_role_status_buffer; call
+    flush_status_buffers() when it must be persisted before continuing.
+    
     Args:
         task_ids: List of task IDs to update
         status: AuditStatus enum value
         status_message: Status message string
         additional_payload: Optional dictionary containing additional fields to update (e.g. result, justification, screenshot)
     """
-    try:
-        payload = {
-            "status": status,
-            "statusMessage": status_message
-        }
+    payload = {
+        "status": status,
+        "statusMessage": status_message
+    }
+    
+    if additional_payload:
+        payload.update(additional_payload)
         
-        if additional_payload:
-            payload.update(additional_payload)
-            
-        response = supabase.table("closed_role_audit_tasks") \
-            .update(payload) \
-            .in_("id", task_ids) \
-            .execute()
-        return response.data
+    await closed_role_status_buffer.add(task_ids, payload)
+
+async def record_audit_usage(browser_sessions: int, tokens: int):
+    """
+    Add the cost of a closed role check to the current UTC day's audit budget usage.
+    
+    Usage is kept in its own table because audit tasks, and their tier and tokens, are
+    deleted when their job closes. Expects this schema:
+    
+        create table audit_usage (
+            day date primary key,
+            browser_sessions int not null default 0,
+            tokens bigint not null default 0
+        );
+        
+        create or replace function record_audit_usage(p_browser_sessions int, p_tokens bigint)
+        returns void language sql as $$
+            insert into audit_usage (day, browser_sessions, tokens)
+                values ((now() at time zone 'utc')::date, p_browser_sessions, p_tokens)
+                on conflict (day) do update set
+                    browser_sessions = audit_usage.browser_sessions + excluded.browser_sessions,
+                    tokens = audit_usage.tokens + excluded.tokens;
+        $$;
+    
+    Args:
+        browser_sessions: Browser sessions the check used
+        tokens: Model tokens the check used
+    """
+    try:
+        query = supabase.rpc("record_audit_usage", {
+            "p_browser_sessions": browser_sessions,
+            "p_tokens": tokens
+        })
+        await execute_query(query, "record_audit_usage")
+    except APIError as e:
+        raise Exception(f"Error recording audit usage: {str(e)}")
+
+async def get_audit_usage(day: date) -> Optional[dict]:
+    """Get the audit budget usage row of a UTC day, if anything was used on it."""
+    try:
+        query = supabase.table("audit_usage") \
+            .select("browser_sessions, tokens") \
+            .eq("day", day.isoformat())
+        response = await execute_query(query, "get_audit_usage")
+        return response.data[0] if response.data else None
     except APIError as e:
-        raise Exception(f"Error updating task status: {str(e)}")
+        raise Exception(f"Error fetching audit usage: {str(e)}")
 
 ###### OPEN ROLE AUDIT ##########################
 
 async def get_all_open_role_audit_tasks():
     """Fetch all open role audit tasks."""
     try:
-        response = supabase.table("open_role_audit_tasks") \
-            .select("*, company(*, logo(filename_disk))") \
-            .execute()
+        query = supabase.table("open_role_audit_tasks") \
+            .select("*, company(*, logo(filename_disk))")
+        response = await execute_query(query, "get_all_open_role_audit_tasks")
             
         return response.data
         
     except APIError as e:
         raise Exception(f"Error fetching all open role audit tasks: {str(e)}")
 
+async def get_open_role_audit_tasks_page(
+    after_id: Optional[int] = None,
+    limit: int = AUDIT_PAGE_SIZE,
+    status: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None
+) -> List[dict]:
+    """
+    Fetch one page of open role audit tasks ordered by ID.
+    
+    Args:
+        after_id: Return tasks with an ID greater than this cursor
+        limit: Maximum number of tasks
+        status: Only tasks with one of these statuses
+        fields: Sparse field list, see build_select
+        
+    Returns:
+        List[dict]: The tasks of the page
+    """
+    try:
+        query = supabase.table("open_role_audit_tasks") \
+            .select(build_select(fields, OPEN_ROLE_AUDIT_TASK_RELATIONS)) \
+            .order("id") \
+            .limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        if status:
+            query = query.in_("status", status)
+        response = await execute_query(query, "get_open_role_audit_tasks_page")
+        return response.data or []
+    except APIError as e:
+        raise Exception(f"Error fetching open role audit tasks page: {str(e)}")
+
 async def insert_open_role_audit_task(url: str):
     """Insert a new open role audit task."""
     task = {
@@ -154,9 +493,10 @@ async def insert_open_role_audit_task(url: str):
     }
     
     try:
-        response = supabase.table("open_role_audit_tasks") \
-            .insert(task) \
-            .execute()
+        query = supabase.table("open_role_audit_tasks") \
+            .insert(task)
+        response = await execute_query(query, "insert_open_role_audit_task")
+        response_cache.invalidate("open_role_audit_tasks")
         return response.data
     except APIError as e:
         raise Exception(f"Error inserting open role audit task: {str(e)}")
@@ -165,78 +505,151 @@ async def insert_open_role_audit_task(url: str):
 async def get_open_role_audit_tasks_by_ids(task_ids: List[str]):
     """Fetch open role audit tasks by their IDs."""
     try:
-        response = supabase.table("open_role_audit_tasks") \
+        query = supabase.table("open_role_audit_tasks") \
             .select("*") \
-            .in_("id", task_ids) \
-            .execute()
+            .in_("id", task_ids)
+        response = await execute_query(query, "get_open_role_audit_tasks_by_ids")
         return response.data
     except APIError as e:
         raise Exception(f"Error fetching open role audit tasks by IDs: {str(e)}")
     
     
+async def _write_open_role_task_status(payload: dict, task_ids: List[int]):
+    """Write one coalesced status payload to a group of open role audit tasks."""
+    try:
+        query = supabase.table("open_role_audit_tasks") \
+            .update(payload) \
+            .in_("id", task_ids)
+        await execute_query(query, "update_open_role_task_status")
+        response_cache.invalidate("open_role_audit_tasks")
+    except APIError as e:
+        raise Exception(f"Error updating task status: {str(e)}") from e
+
+open_role_status_buffer = StatusUpdateBuffer("open_role_audit_tasks", _write_open_role_task_status, _is_transient_status_error)
+
 async def update_open_role_task_status(task_ids: List[str], status: AuditStatus, status_message: str, extra_data: dict = None):
     """Update status and related fields for open role audit tasks.
     
+    The update is buffered and written by open_role_status_buffer; call
+    flush_status_buffers() when it must be persisted before continuing.
+    
     Args:
         task_ids: List of task IDs to update
         status: New AuditStatus value
         status_message: Status message to set
         extra_data: Optional dict of additional fields to update
     """
-    try:
-        update_data = {
-            "status": status,
-            "status_message": status_message,
-            "updated_at": datetime.now().isoformat().replace('Z', '+00:00')
-        }
+    update_data = {
+        "status": status,
+        "status_message": status_message,
+        "updated_at": datetime.now().isoformat().replace('Z', '+00:00')
+    }
+    
+    if extra_data:
+        update_data.update(extra_data)
         
-        if extra_data:
-            update_data.update(extra_data)
-            
-        response = supabase.table("open_role_audit_tasks") \
-            .update(update_data) \
-            .in_("id", task_ids) \
-            .execute()
-            
-        return response.data
-    except APIError as e:
-        raise Exception(f"Error updating task status: {str(e)}")
+    await open_role_status_buffer.add(task_ids, update_data)
+    
+
+def start_status_buffers():
+    """Start the background flushers of the task status buffers."""
+    closed_role_status_buffer.start()
+    open_role_status_buffer.start()
+
+async def flush_status_buffers():
+    """Write every buffered task status update now."""
+    await asyncio.gather(closed_role_status_buffer.flush(), open_role_status_buffer.flush())
+
+async def close_status_buffers():
+    """Stop the background flushers and write every buffered task status update."""
+    results = await asyncio.gather(closed_role_status_buffer.close(), open_role_status_buffer.close(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Failed to flush task status updates on shutdown: {str(result)}")
     
 
 async def delete_open_role_audit_task(task_id: int):
     """Delete an open role audit task by its ID."""
     try:
-        response = supabase.table("open_role_audit_tasks") \
+        query = supabase.table("open_role_audit_tasks") \
             .delete() \
-            .eq("id", task_id) \
-            .execute()
+            .eq("id", task_id)
+        response = await execute_query(query, "delete_open_role_audit_task")
+        response_cache.invalidate("open_role_audit_tasks")
         return response.data
     except APIError as e:
         raise Exception(f"Error deleting open role audit task: {str(e)}")
 
 ###### SCRAPED JOBS ##########################
 async def insert_scraped_jobs(jobs: List[dict]):
-    """Insert scraped jobs for a specific task."""
+    """Insert scraped jobs for a specific task, storing each job's canonical URL for deduplication."""
+    jobs = [{**job, "canonical_url": canonicalize_url(job["url"])} if job.get("url") else job for job in jobs]
     try:
-        response = supabase.table("scraped_positions") \
-            .insert(jobs) \
-            .execute()
+        query = supabase.table("scraped_positions") \
+            .insert(jobs)
+        response = await execute_query(query, "insert_scraped_jobs")
+        response_cache.invalidate("scraped_positions")
+        seen_url_index.add(job["url"] for job in jobs if job.get("url"))
         return response.data
     except APIError as e:
         logger.error(f"Error inserting scraped jobs: {str(e)}")
 
-async def filter_jobs_to_scrape(urls: List[str]):
-    """Filter jobs to scrape by urls that do not exist in the db"""
+# URLs per IN lookup, keeping the PostgREST request line well below server limits
+FILTER_URL_CHUNK_SIZE = int(os.getenv("FILTER_URL_CHUNK_SIZE", "100"))
+
+async def get_scraped_position_urls_page(after_id: Optional[int] = None, limit: int = AUDIT_PAGE_SIZE) -> List[dict]:
+    """Fetch one page of scraped position IDs and URLs ordered by ID, for the seen URL index."""
     try:
+        query = supabase.table("scraped_positions") \
+            .select("id, url, canonical_url") \
+            .order("id") \
+            .limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        response = await execute_query(query, "get_scraped_position_urls_page")
+        return response.data or []
+    except APIError as e:
+        raise Exception(f"Error fetching scraped position URLs: {str(e)}")
+
+async def filter_jobs_to_scrape(urls: List[str]):
+    """
+    Filter jobs to scrape by urls that do not exist in the db.
+    
+    URLs are compared by canonical URL, so links to the same posting that differ in tracking
+    parameters, fragments or host aliases count as one. URLs found in the local seen URL
+    index are dropped without a query. The rest, which is every URL while the index is still
+    loading in the background, are looked up in chunks of FILTER_URL_CHUNK_SIZE, selecting
+    only the canonical_url column.
+    
+    Args:
+        urls: Job posting URLs found on a listing page
         
-        response = supabase.table("scraped_positions") \
-            .select("*") \
-            .in_("url", urls) \
-            .execute()
+    Returns:
+        List[str]: URLs not yet scraped, one per canonical URL, in input order
+    """
+    try:
+        seen_url_index.refresh_in_background(
+            lambda after_id: iter_pages(get_scraped_position_urls_page, after_id=after_id)
+        )
+        urls_by_canonical = {}
+        for url in urls:
+            urls_by_canonical.setdefault(canonicalize_url(url), url)
+        candidates = [canonical for canonical in urls_by_canonical if canonical not in seen_url_index]
         
-        already_scraped_urls = [job["url"] for job in response.data]
+        already_scraped = set()
+        for i in range(0, len(candidates), FILTER_URL_CHUNK_SIZE):
+            query = supabase.table("scraped_positions") \
+                .select("canonical_url") \
+                .in_("canonical_url", candidates[i:i + FILTER_URL_CHUNK_SIZE])
+            response = await execute_query(query, "filter_jobs_to_scrape")
+            already_scraped.update(job["canonical_url"] for job in response.data or [])
+        seen_url_index.add(already_scraped)
         
-        return [url for url in urls if url not in already_scraped_urls]
+        logger.info(
+            f"{len(urls)} URLs are {len(urls_by_canonical)} postings: {len(urls_by_canonical) - len(candidates)} rejected "
+            f"by the seen URL index, {len(already_scraped)} more by the database"
+        )
+        return [urls_by_canonical[canonical] for canonical in candidates if canonical not in already_scraped]
     except APIError as e:
         raise Exception(f"Error filtering jobs to scrape: {str(e)}")
     
@@ -245,11 +658,11 @@ async def filter_jobs_to_scrape(urls: List[str]):
 async def get_last_scrape_broadcast():
     """Get the last scrape broadcast date."""
     try:
-        response = supabase.table("config") \
+        query = supabase.table("config") \
             .select("lastUpdatedTime") \
             .eq("id", "scraping_automation") \
-            .limit(1) \
-            .execute()
+            .limit(1)
+        response = await execute_query(query, "get_last_scrape_broadcast")
         return response.data[0]["lastUpdatedTime"]
     except APIError as e:
         raise Exception(f"Error getting last scrape broadcast: {str(e)}")
@@ -282,13 +695,13 @@ def get_visa_text(visa: str) -> str:
 async def get_new_jobs_to_send_out(site: str):
     """Get the new jobs to send out with transformed data structure."""
     try:
-        response = supabase.table("scraped_positions") \
+        query = supabase.table("scraped_positions") \
             .select("*, company(*, logo(*))") \
             .eq("status", "open") \
             .eq("site", site) \
             .not_.is_("title", None) \
-            .gte("createdAt", datetime.now().date().isoformat()) \
-            .execute()
+            .gte("createdAt", datetime.now().date().isoformat())
+        response = await execute_query(query, "get_new_jobs_to_send_out")
             
         transformed_positions = []
         for position in response.data:
@@ -318,10 +731,10 @@ async def get_new_jobs_to_send_out(site: str):
 async def update_config_last_updated_time():
     """Update the last updated time for the config table."""
     try:
-        response = supabase.table("config") \
+        query = supabase.table("config") \
             .update({"lastUpdatedTime": datetime.now().isoformat().replace('Z', '+00:00')}) \
-            .eq("id", "scraping_automation") \
-            .execute()
+            .eq("id", "scraping_automation")
+        response = await execute_query(query, "update_config_last_updated_time")
         return response.data
     except APIError as e:
         raise Exception(f"Error updating config last updated time: {str(e)}")
\ No newline at end of file
@@ -1,13 +1,48 @@
-from pydantic import BaseModel
+from dataclasses import dataclass, field
+from typing import List, Optional
+from pydantic import BaseModel, model_validator
 
 class TaskRequest(BaseModel):
-    taskId: int
+    taskId: Optional[int] = None
+    taskIds: Optional[List[int]] = None
     type: str
     
+    @model_validator(mode="after")
+    def check_task_ids(self) -> "TaskRequest":
+        if self.taskIds is not None and not self.taskIds:
+            raise ValueError("taskIds must not be empty")
+        if self.taskId is None and self.taskIds is None:
+            raise ValueError("Either taskId or taskIds is required")
+        return self
+    
+    @property
+    def is_batch(self) -> bool:
+        return self.taskIds is not None
+    
+    @property
+    def task_ids(self) -> List[int]:
+        return self.taskIds if self.is_batch else [self.taskId]
+    
     @property
     def is_closed_role_task(self) -> bool:
         return self.type == "CLOSED_ROLE_AUDIT"
 
     @property 
     def is_open_role_task(self) -> bool:
-        return self.type == "OPEN_ROLE_AUDIT"
\ No newline at end of file
+        return self.type == "OPEN_ROLE_AUDIT"
+
+
+@dataclass
+class EnqueueResult:
+    """Outcome of enqueueing a batch of Cloud Tasks."""
+    created: int = 0
+    already_enqueued: int = 0
+    failed: List[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "alreadyEnqueued": self.already_enqueued,
+            "failedCount": len(self.failed),
+            "failed": self.failed,
+        }
@@ -0,0 +1,198 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+
+# Daily budgets for closed role audits; 0 disables the limit
+AUDIT_DAILY_BROWSER_SESSIONS = int(os.getenv("AUDIT_DAILY_BROWSER_SESSIONS", "0"))
+AUDIT_DAILY_TOKENS = int(os.getenv("AUDIT_DAILY_TOKENS", "0"))
+# Token cost assumed for a browser check until enough checks have recorded their usage
+AUDIT_DEFAULT_TOKENS_PER_CHECK = int(os.getenv("AUDIT_DEFAULT_TOKENS_PER_CHECK", "3000"))
+
+# Score weights of each priority signal
+AUDIT_WEIGHT_STALENESS = float(os.getenv("AUDIT_WEIGHT_STALENESS", "1.0"))
+AUDIT_WEIGHT_POSTING_AGE = float(os.getenv("AUDIT_WEIGHT_POSTING_AGE", "1.0"))
+AUDIT_WEIGHT_CLOSE_RATE = float(os.getenv("AUDIT_WEIGHT_CLOSE_RATE", "2.0"))
+AUDIT_WEIGHT_UNSURE = float(os.getenv("AUDIT_WEIGHT_UNSURE", "1.5"))
+# Staleness and posting age stop adding to the score past these values
+AUDIT_STALENESS_SATURATION_HOURS = float(os.getenv("AUDIT_STALENESS_SATURATION_HOURS", "168"))
+AUDIT_POSTING_AGE_SATURATION_DAYS = float(os.getenv("AUDIT_POSTING_AGE_SATURATION_DAYS", "60"))
+# Pseudo-count pulling close rates of companies with few positions towards the overall rate
+CLOSE_RATE_PRIOR_WEIGHT = float(os.getenv("CLOSE_RATE_PRIOR_WEIGHT", "5"))
+
+
+@dataclass
+class AuditCost:
+    sessions: int = 0
+    tokens: int = 0
+
+
+@dataclass
+class AuditSchedule:
+    """Audit tasks picked for dispatch, highest priority first, and the ones left for a later day."""
+    selected: List[dict] = field(default_factory=list)
+    deferred: List[dict] = field(default_factory=list)
+    used: AuditCost = field(default_factory=AuditCost)
+    planned: AuditCost = field(default_factory=AuditCost)
+
+    def to_dict(self) -> dict:
+        return {
+            "deferredCount": len(self.deferred),
+            "budget": {
+                "browserSessions": AUDIT_DAILY_BROWSER_SESSIONS or None,
+                "tokens": AUDIT_DAILY_TOKENS or None,
+                "usedBrowserSessions": self.used.sessions,
+                "usedTokens": self.used.tokens,
+                "plannedBrowserSessions": self.planned.sessions,
+                "plannedTokens": self.planned.tokens,
+            },
+        }
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def company_close_rates(positions: Iterable[dict]) -> Tuple[Dict[str, float], float]:
+    """
+    Share of each company's positions that were closed, smoothed towards the overall rate.
+
+    Args:
+        positions: Rows with company and status
+
+    Returns:
+        Tuple[Dict[str, float], float]: Close rate per company ID, and the overall rate for unknown companies
+    """
+    totals = defaultdict(int)
+    closed = defaultdict(int)
+    for position in positions:
+        company = str(position.get("company"))
+        totals[company] += 1
+        if position.get("status") == "closed":
+            closed[company] += 1
+
+    overall = sum(closed.values()) / sum(totals.values()) if totals else 0.0
+    rates = {
+        company: (closed[company] + CLOSE_RATE_PRIOR_WEIGHT * overall) / (total + CLOSE_RATE_PRIOR_WEIGHT)
+        for company, total in totals.items()
+    }
+    return rates, overall
+
+
+def daily_usage(usage: Optional[dict]) -> AuditCost:
+    """Browser sessions and tokens spent by closed role checks today, from the day's audit_usage row."""
+    if not usage:
+        return AuditCost()
+    return AuditCost(sessions=usage.get("browser_sessions") or 0, tokens=usage.get("tokens") or 0)
+
+
+def check_cost(tier: str, tokens: Optional[int]) -> AuditCost:
+    """Budget spent by one finished check: a browser session for the browser tier, plus its tokens."""
+    return AuditCost(sessions=1 if tier == "browser" else 0, tokens=tokens or 0)
+
+
+def average_tokens_per_check(history: Iterable[dict]) -> int:
+    """Mean recorded token usage of browser checks, or AUDIT_DEFAULT_TOKENS_PER_CHECK without data."""
+    recorded = [task["tokens"] for task in history if task.get("tier") == "browser" and task.get("tokens")]
+    return round(sum(recorded) / len(recorded)) if recorded else AUDIT_DEFAULT_TOKENS_PER_CHECK
+
+
+def estimate_cost(previous: Optional[dict], tokens_per_check: int) -> AuditCost:
+    """
+    Expected cost of checking a job, based on its previous check.
+
+    Jobs last decided by the HTTP tier are expected to be decided by it again and cost nothing
+    from the budget; everything else is assumed to need a browser session and a model call.
+    """
+    if previous and previous.get("tier") == "http":
+        return AuditCost()
+    return AuditCost(sessions=1, tokens=tokens_per_check)
+
+
+def score_audit_task(job: dict, previous: Optional[dict], close_rate: float, now: datetime) -> float:
+    """
+    Priority of checking a job, higher when it is more likely to have closed since its last check.
+
+    Combines the time since the last check (never checked counts as fully stale), the age of
+    the posting, the company's close rate and whether the last verdict was "unsure".
+
+    Args:
+        job: Open job from the positions table
+        previous: The job's audit task before this run, if any
+        close_rate: Close rate of the job's company
+        now: Current time
+
+    Returns:
+        float: The score
+    """
+    checked_at = _parse_timestamp(previous.get("checkedAt")) if previous else None
+    staleness = 1.0 if checked_at is None else min(1.0, (now - checked_at).total_seconds() / 3600 / AUDIT_STALENESS_SATURATION_HOURS)
+
+    created_at = _parse_timestamp(job.get("createdAt"))
+    posting_age = 0.0 if created_at is None else min(1.0, (now - created_at).total_seconds() / 86400 / AUDIT_POSTING_AGE_SATURATION_DAYS)
+
+    unsure = 1.0 if previous and previous.get("result") == "unsure" else 0.0
+
+    return (
+        AUDIT_WEIGHT_STALENESS * max(0.0, staleness)
+        + AUDIT_WEIGHT_POSTING_AGE * max(0.0, posting_age)
+        + AUDIT_WEIGHT_CLOSE_RATE * close_rate
+        + AUDIT_WEIGHT_UNSURE * unsure
+    )
+
+
+def schedule_closed_role_audits(
+    tasks: List[dict],
+    jobs_by_id: Dict,
+    history: List[dict],
+    positions: Iterable[dict],
+    usage: Optional[dict] = None,
+    now: Optional[datetime] = None,
+) -> AuditSchedule:
+    """
+    Order closed role audit tasks by priority and cut them off at the remaining daily budget.
+
+    Tasks are enqueued in the returned order, so when the budget runs out the jobs most likely
+    to have closed have already been dispatched. Tasks that do not fit are deferred; their
+    growing staleness moves them up on the next day.
+
+    Args:
+        tasks: Audit tasks to dispatch, each with id and job
+        jobs_by_id: Open jobs keyed by ID
+        history: Audit task rows before this run, from get_closed_role_audit_history
+        positions: Rows with company and status, for company close rates
+        usage: Today's audit_usage row, from get_audit_usage
+        now: Current time, defaults to now
+
+    Returns:
+        AuditSchedule: Selected and deferred tasks with the budget spent and planned
+    """
+    now = now or datetime.now(timezone.utc)
+    history_by_job = {task["job"]: task for task in history}
+    close_rates, overall_close_rate = company_close_rates(positions)
+    tokens_per_check = average_tokens_per_check(history)
+
+    def priority(task: dict) -> float:
+        job = jobs_by_id.get(task["job"], {})
+        close_rate = close_rates.get(str(job.get("company")), overall_close_rate)
+        return score_audit_task(job, history_by_job.get(task["job"]), close_rate, now)
+
+    schedule = AuditSchedule(used=daily_usage(usage))
+    remaining_sessions = AUDIT_DAILY_BROWSER_SESSIONS - schedule.used.sessions if AUDIT_DAILY_BROWSER_SESSIONS else None
+    remaining_tokens = AUDIT_DAILY_TOKENS - schedule.used.tokens if AUDIT_DAILY_TOKENS else None
+
+    for task in sorted(tasks, key=priority, reverse=True):
+        cost = estimate_cost(history_by_job.get(task["job"]), tokens_per_check)
+        fits = (remaining_sessions is None or schedule.planned.sessions + cost.sessions <= remaining_sessions) \
+            and (remaining_tokens is None or schedule.planned.tokens + cost.tokens <= remaining_tokens)
+        if fits:
+            schedule.selected.append(task)
+            schedule.planned.sessions += cost.sessions
+            schedule.planned.tokens += cost.tokens
+        else:
+            schedule.deferred.append(task)
+    return schedule
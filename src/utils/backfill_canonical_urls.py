@@ -0,0 +1,88 @@
+"""
+Fill in canonical_url for scraped_positions and positions rows stored before the column existed,
+and refresh rows whose canonical form changed after canonicalization rules were updated.
+
+Usage:
+    uv run -m src.utils.backfill_canonical_urls --table scraped_positions --dry-run
+    uv run -m src.utils.backfill_canonical_urls
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+from loguru import logger
+from src.services.supabase import supabase, execute_query, iter_pages
+from src.utils.canonical_url import canonicalize_url
+
+TABLES = ["scraped_positions", "positions"]
+
+
+async def backfill_table(table: str, dry_run: bool, concurrency: int, page_size: int) -> int:
+    """
+    Set canonical_url on every row of a table where it is missing or outdated.
+
+    Args:
+        table: scraped_positions or positions
+        dry_run: Only count the rows that would change
+        concurrency: Maximum number of updates in flight
+        page_size: Rows read per page
+
+    Returns:
+        int: Number of rows updated, or that would be updated in a dry run
+    """
+    async def fetch_page(after_id: Optional[int] = None, limit: int = page_size) -> List[dict]:
+        query = supabase.table(table) \
+            .select("id, url, canonical_url") \
+            .order("id") \
+            .limit(limit)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        response = await execute_query(query, f"backfill_{table}_page")
+        return response.data or []
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def update(row_id, canonical_url: str):
+        async with semaphore:
+            query = supabase.table(table) \
+                .update({"canonical_url": canonical_url}) \
+                .eq("id", row_id)
+            await execute_query(query, f"backfill_{table}_update")
+
+    scanned = 0
+    changed = 0
+    async for page in iter_pages(fetch_page, page_size=page_size):
+        updates = [
+            (row["id"], canonicalize_url(row["url"]))
+            for row in page
+            if row.get("url") and row.get("canonical_url") != canonicalize_url(row["url"])
+        ]
+        scanned += len(page)
+        changed += len(updates)
+        if not dry_run:
+            await asyncio.gather(*[update(row_id, canonical_url) for row_id, canonical_url in updates])
+        logger.info(f"{table}: scanned {scanned} rows, {changed} {'to update' if dry_run else 'updated'}")
+    return changed
+
+
+async def run(tables: List[str], dry_run: bool, concurrency: int, page_size: int):
+    for table in tables:
+        changed = await backfill_table(table, dry_run, concurrency, page_size)
+        logger.success(f"{table}: {changed} rows {'would be updated' if dry_run else 'updated'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", choices=TABLES, action="append", help="Table to backfill; repeatable, defaults to all")
+    parser.add_argument("--dry-run", action="store_true", help="Report how many rows would change without writing")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of updates in flight")
+    parser.add_argument("--page-size", type=int, default=1000, help="Rows read per page")
+    args = parser.parse_args()
+    asyncio.run(run(args.table or TABLES, args.dry_run, args.concurrency, args.page_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Click IDs and campaign parameters, dropped on every site. Generic names such as ref or
+# source can identify a posting on some career sites, so they are only dropped through the
+# keep_params of the ATS_RULES (e.g. gh_src on Greenhouse, lever-source on Lever)
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_hsenc", "_hsmi", "igshid"}
+TRACKING_PARAM_PREFIXES = ("utm_",)
+
+# Hosts that serve the same postings under another name
+HOST_ALIASES = {
+    "job-boards.greenhouse.io": "boards.greenhouse.io",
+    "careers.google.com": "www.google.com",
+    "google.com": "www.google.com",
+}
+
+_LOCALE_PREFIX = r"(?:/[a-z]{2}(?:-[a-z]{2})?)?"
+
+
+@dataclass
+class CanonicalRule:
+    """
+    Canonicalization of one applicant tracking system or career site.
+
+    keep_params lists the query parameters that identify a posting (None keeps every
+    non-tracking parameter), and path_rewrites normalize alternative paths of a posting.
+    job_id_pattern finds the posting's ID in the canonical path and query; its first
+    matching group is the ID.
+    """
+    hosts: Tuple[str, ...]
+    keep_params: Optional[Set[str]] = None
+    path_rewrites: List[Tuple[re.Pattern, str]] = field(default_factory=list)
+    job_id_pattern: Optional[re.Pattern] = None
+
+
+# Applied to the host after aliasing; subdomains of a listed host match too
+ATS_RULES = [
+    CanonicalRule(
+        hosts=("boards.greenhouse.io", "boards.eu.greenhouse.io"),
+        keep_params={"gh_jid", "for", "token"},
+        path_rewrites=[(re.compile(r"^(/[^/]+/jobs/\d+).*$"), r"\1")],
+        job_id_pattern=re.compile(r"^/[^/]+/jobs/(\d+)|[?&](?:gh_jid|token)=(\d+)"),
+    ),
+    CanonicalRule(
+        hosts=("jobs.lever.co", "jobs.eu.lever.co"),
+        keep_params=set(),
+        path_rewrites=[(re.compile(r"^(/[^/]+/[0-9a-f-]{36})(?:/apply)?/?$", re.IGNORECASE), r"\1")],
+        job_id_pattern=re.compile(r"^/[^/]+/([0-9a-f-]{36})", re.IGNORECASE),
+    ),
+    CanonicalRule(
+        hosts=("jobs.ashbyhq.com",),
+        keep_params=set(),
+        path_rewrites=[(re.compile(r"^(/[^/]+/[0-9a-f-]{36})(?:/application)?/?$", re.IGNORECASE), r"\1")],
+        job_id_pattern=re.compile(r"^/[^/]+/([0-9a-f-]{36})", re.IGNORECASE),
+    ),
+    CanonicalRule(
+        hosts=("myworkdayjobs.com",),
+        keep_params=set(),
+        path_rewrites=[
+            (re.compile(r"^/[a-z]{2}-[a-z]{2}(?=/)", re.IGNORECASE), ""),
+            (re.compile(r"(/job/.+?)/apply(?:/.*)?$", re.IGNORECASE), r"\1"),
+        ],
+        job_id_pattern=re.compile(r"/job/(?:[^/?]+/)*[^/?]*_([a-z0-9-]+)(?:[/?]|$)", re.IGNORECASE),
+    ),
+    CanonicalRule(hosts=("jobs.smartrecruiters.com",), keep_params=set(), job_id_pattern=re.compile(r"^/[^/]+/(\d+)")),
+    CanonicalRule(hosts=("apply.workable.com",), keep_params=set(), job_id_pattern=re.compile(r"^/[^/]+/j/([0-9a-f]+)", re.IGNORECASE)),
+    CanonicalRule(hosts=("jobs.jobvite.com",), keep_params=set(), job_id_pattern=re.compile(r"^/[^/]+/job/(\w+)")),
+    CanonicalRule(
+        hosts=("icims.com",),
+        keep_params=set(),
+        path_rewrites=[(re.compile(r"^(/jobs/\d+)(?:/.*)?$"), r"\1")],
+        job_id_pattern=re.compile(r"^/jobs/(\d+)"),
+    ),
+    CanonicalRule(
+        hosts=("amazon.jobs",),
+        keep_params=set(),
+        path_rewrites=[(re.compile(rf"^{_LOCALE_PREFIX}(/jobs/\d+)(?:/.*)?$"), r"\1")],
+        job_id_pattern=re.compile(r"^/jobs/(\d+)"),
+    ),
+    CanonicalRule(
+        hosts=("www.google.com",),
+        keep_params=set(),
+        path_rewrites=[
+            (re.compile(r"^/jobs/results/(\d+)(?:-[^/]*)?/?$"), r"/about/careers/applications/jobs/results/\1"),
+            (re.compile(r"^(/about/careers/applications/jobs/results/\d+)(?:-[^/]*)?/?$"), r"\1"),
+        ],
+        job_id_pattern=re.compile(r"/jobs/results/(\d+)"),
+    ),
+    CanonicalRule(
+        hosts=("metacareers.com",),
+        keep_params=set(),
+        path_rewrites=[(re.compile(r"^(/jobs/\d+)/?$"), r"\1")],
+        job_id_pattern=re.compile(r"^/jobs/(\d+)"),
+    ),
+    CanonicalRule(
+        hosts=("jobs.apple.com",),
+        keep_params=set(),
+        path_rewrites=[(re.compile(r"^(/[a-z]{2}-[a-z]{2}/details/[\w-]+?)(?:/[^/]*)?$"), r"\1")],
+        job_id_pattern=re.compile(r"/details/(\d+(?:-\d+)?)"),
+    ),
+    CanonicalRule(hosts=("lifeattiktok.com",), keep_params=set()),
+]
+
+
+def _matches_host(host: str, rule_host: str) -> bool:
+    return host == rule_host or host.endswith(f".{rule_host}")
+
+
+def _find_rule(host: str) -> Optional[CanonicalRule]:
+    for rule in ATS_RULES:
+        if any(_matches_host(host, rule_host) for rule_host in rule.hosts):
+            return rule
+    return None
+
+
+def _is_tracking_param(name: str) -> bool:
+    lowered = name.lower()
+    return lowered in TRACKING_PARAMS or lowered.startswith(TRACKING_PARAM_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a job posting URL to one canonical form, so the same posting reached through
+    different links dedupes to one key.
+
+    Lowercases the scheme and host, uses https, drops default ports, fragments, trailing
+    slashes and tracking parameters, resolves host aliases, sorts the remaining query
+    parameters and applies the per-ATS rules in ATS_RULES.
+
+    Args:
+        url: Absolute job posting URL
+
+    Returns:
+        str: The canonical URL, or the stripped input if it is not an absolute http(s) URL
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower().rstrip(".")
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    host = HOST_ALIASES.get(host, host)
+    rule = _find_rule(host)
+
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    if rule:
+        for pattern, replacement in rule.path_rewrites:
+            path = pattern.sub(replacement, path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    params = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name) and (rule is None or rule.keep_params is None or name.lower() in rule.keep_params)
+    ]
+    query = urlencode(sorted(params))
+
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def job_id_from_url(url: str) -> Optional[str]:
+    """
+    ID of the posting a job URL points to, for the ATSs in ATS_RULES that have a job_id_pattern.
+
+    Args:
+        url: Absolute job posting URL
+
+    Returns:
+        Optional[str]: The lowercased posting ID, or None for unknown sites and URLs without one
+    """
+    parts = urlsplit(canonicalize_url(url))
+    rule = _find_rule(parts.netloc)
+    if not rule or not rule.job_id_pattern:
+        return None
+    match = rule.job_id_pattern.search(f"{parts.path}?{parts.query}")
+    if not match:
+        return None
+    return next(group for group in match.groups() if group).lower()
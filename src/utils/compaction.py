@@ -0,0 +1,217 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Pattern
+from urllib.parse import urlparse
+from loguru import logger
+
+# Maximum number of page-content tokens sent to the model per call
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "12000"))
+# A block seen on this many distinct pages of a site is treated as boilerplate
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+BOILERPLATE_MAX_BLOCKS_PER_DOMAIN = int(os.getenv("BOILERPLATE_MAX_BLOCKS_PER_DOMAIN", "5000"))
+BOILERPLATE_MAX_DOMAINS = int(os.getenv("BOILERPLATE_MAX_DOMAINS", "500"))
+
+# Blocks where link text makes up at least this share of the text are navigation, not content
+LINK_DENSITY_THRESHOLD = 0.8
+LINK_DENSITY_MIN_LINKS = 3
+
+_BLOCK_SPLIT_PATTERN = re.compile(r"\n\s*\n")
+_MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\(([^)]*)\)")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def load_encoding():
+    """
+    Load the GPT-4o tokenizer, which may download its vocabulary; None without tiktoken.
+
+    Called from a worker thread at startup; later calls return the loaded encoding.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count GPT-4o tokens, estimating four characters per token when tiktoken is unavailable."""
+    encoding = load_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = load_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+@dataclass
+class CompactionResult:
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+class BoilerplateTracker:
+    """
+    Learns which markdown blocks repeat across different pages of the same site.
+
+    Sites are keyed by site_key, so each company on a shared ATS host is learned separately.
+    Per site, it remembers which pages each block hash was seen on, up to `min_pages`
+    pages, keeping the most recently seen `max_blocks_per_domain` blocks of up to `max_domains` sites.
+    """
+
+    def __init__(self, min_pages: int, max_blocks_per_domain: int, max_domains: int):
+        self.min_pages = min_pages
+        self.max_blocks_per_domain = max_blocks_per_domain
+        self.max_domains = max_domains
+        self._sites: OrderedDict[str, OrderedDict[str, set]] = OrderedDict()
+        # compact_markdown runs in worker threads
+        self._lock = threading.Lock()
+
+    def observe(self, site: str, page_key: str, block_hashes: list[str]) -> None:
+        """Record that the given blocks appear on a page of the site."""
+        with self._lock:
+            blocks = self._sites.setdefault(site, OrderedDict())
+            self._sites.move_to_end(site)
+            while len(self._sites) > self.max_domains:
+                self._sites.popitem(last=False)
+
+            for block_hash in block_hashes:
+                pages = blocks.setdefault(block_hash, set())
+                if len(pages) < self.min_pages:
+                    pages.add(page_key)
+                blocks.move_to_end(block_hash)
+            while len(blocks) > self.max_blocks_per_domain:
+                blocks.popitem(last=False)
+
+    def is_boilerplate(self, site: str, block_hash: str) -> bool:
+        with self._lock:
+            pages = self._sites.get(site, {}).get(block_hash)
+            return bool(pages) and len(pages) >= self.min_pages
+
+
+boilerplate_tracker = BoilerplateTracker(
+    min_pages=BOILERPLATE_MIN_PAGES,
+    max_blocks_per_domain=BOILERPLATE_MAX_BLOCKS_PER_DOMAIN,
+    max_domains=BOILERPLATE_MAX_DOMAINS,
+)
+
+
+def site_key(url: str) -> str:
+    """
+    Site a page belongs to for boilerplate detection: its host plus the first path segment.
+
+    Shared ATS hosts serve many companies, e.g. jobs.lever.co/<company>/..., so a block only
+    counts as boilerplate when it repeats across pages of the same company.
+    """
+    parsed = urlparse(url)
+    first_segment = next((segment for segment in parsed.path.split("/") if segment), "")
+    return f"{(parsed.hostname or '').lower()}/{first_segment.lower()}"
+
+
+def _block_hash(block: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", block).strip().lower().encode("utf-8")).hexdigest()
+
+
+def _is_navigation(block: str) -> bool:
+    links = _MARKDOWN_LINK_PATTERN.findall(block)
+    if len(links) < LINK_DENSITY_MIN_LINKS:
+        return False
+    link_text_length = sum(len(text.strip()) for text, _ in links)
+    text_length = len(_MARKDOWN_LINK_PATTERN.sub(lambda match: match.group(1), block).strip())
+    return text_length > 0 and link_text_length / text_length >= LINK_DENSITY_THRESHOLD
+
+
+def compact_markdown(
+    markdown: str,
+    source_url: str,
+    max_tokens: int = LLM_INPUT_TOKEN_BUDGET,
+    drop_navigation: bool = True,
+    drop_boilerplate: bool = True,
+    require_links: bool = False,
+    keep_pattern: Optional[Pattern] = None,
+) -> CompactionResult:
+    """
+    Reduce page markdown to its main content within a token budget before it is sent to the LLM.
+
+    The markdown is split into blank-line separated blocks. Blocks are dropped if they are
+    duplicates within the page, link-dense navigation, or boilerplate repeated across other
+    pages of the same site. The remaining blocks are kept in order up to `max_tokens`.
+    Tokenizing is CPU-bound, so async callers run this through asyncio.to_thread.
+
+    Args:
+        markdown: Page markdown
+        source_url: URL of the page, used to group pages by site_key
+        max_tokens: Token budget for the returned text
+        drop_navigation: Drop link-dense blocks
+        drop_boilerplate: Drop blocks seen on BOILERPLATE_MIN_PAGES pages of the same site_key
+        require_links: Keep only blocks that contain a link
+        keep_pattern: Blocks matching this pattern are never dropped as navigation or boilerplate
+
+    Returns:
+        CompactionResult: The compacted text with token counts before and after
+    """
+    original_tokens = count_tokens(markdown)
+    site = site_key(source_url)
+    blocks = [block.strip() for block in _BLOCK_SPLIT_PATTERN.split(markdown) if block.strip()]
+    hashes = [_block_hash(block) for block in blocks]
+    boilerplate_tracker.observe(site, source_url, list(set(hashes)))
+
+    kept = []
+    seen = set()
+    for block, block_hash in zip(blocks, hashes):
+        if block_hash in seen:
+            continue
+        seen.add(block_hash)
+        if require_links and not _MARKDOWN_LINK_PATTERN.search(block):
+            continue
+        if keep_pattern and keep_pattern.search(block):
+            kept.append(block)
+            continue
+        if drop_navigation and _is_navigation(block):
+            continue
+        if drop_boilerplate and boilerplate_tracker.is_boilerplate(site, block_hash):
+            continue
+        kept.append(block)
+
+    parts = []
+    remaining = max_tokens
+    for block in kept:
+        block_tokens = count_tokens(block) + 1
+        if block_tokens > remaining:
+            parts.append(truncate_to_tokens(block, remaining))
+            break
+        parts.append(block)
+        remaining -= block_tokens
+
+    text = "\n\n".join(part for part in parts if part)
+    result = CompactionResult(text=text, original_tokens=original_tokens, compacted_tokens=count_tokens(text))
+    logger.info(
+        f"Compacted content of {source_url} from {result.original_tokens} to {result.compacted_tokens} tokens "
+        f"({result.tokens_saved} saved)"
+    )
+    return result
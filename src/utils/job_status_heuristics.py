@@ -0,0 +1,92 @@
+from typing import Literal, Optional
+from urllib.parse import urlparse
+import httpx
+from src.utils.canonical_url import job_id_from_url
+from src.utils.utils import parse_cleaned_html
+
+# Phrases career sites show on closed postings
+CLOSED_MARKERS = [
+    "no longer accepting applications",
+    "this job is no longer available",
+    "this position is no longer available",
+    "this job is no longer open",
+    "this position is no longer open",
+    "this position has been filled",
+    "the position has been filled",
+    "this job posting has expired",
+    "this job has expired",
+    "this posting has been closed",
+    "this job has been closed",
+    "the job you are looking for is no longer",
+    "the job you're looking for is no longer",
+]
+
+# Server-rendered ATS pages whose apply form reliably means the posting is live
+OPEN_MARKERS = {
+    "greenhouse.io": ["id=\"application_form\"", "id=\"application-form\"", "submit application"],
+    "lever.co": ["apply for this job", "postings-btn"],
+}
+
+# Query parameters ATS boards append when they redirect away from a removed posting
+ERROR_QUERY_MARKERS = ["error=true", "error=job_not_found"]
+
+GONE_STATUS_CODES = {404, 410}
+
+# Only the start of very large pages is scanned for markers
+MAX_BODY_CHARS = 2_000_000
+
+def _matches_domain(host: str, domain: str) -> bool:
+    return host == domain or host.endswith(f".{domain}")
+
+
+def classify_http_response(url: str, response: httpx.Response) -> Optional[tuple[Literal["open", "closed"], str]]:
+    """
+    Decide a job's status from a plain HTTP fetch, when the response is unambiguous.
+
+    Parses the page, so call it from a worker thread.
+
+    Args:
+        url: The job posting URL that was requested
+        response: The final response after following redirects
+
+    Returns:
+        Optional[tuple[str, str]]: ("open" | "closed", justification), or None if inconclusive
+    """
+    if response.status_code in GONE_STATUS_CODES:
+        return "closed", f"The job page returned HTTP {response.status_code}."
+
+    # Bot walls, rate limits and server errors say nothing about the posting
+    if response.status_code != 200:
+        return None
+
+    final_url = str(response.url)
+    if response.history:
+        lowered_final_url = final_url.lower()
+        if any(marker in lowered_final_url for marker in ERROR_QUERY_MARKERS):
+            return "closed", f"The job page redirected to an error page: {final_url}."
+        # Only ATS URL shapes we know say where the job ID is; a redirect to another
+        # host (e.g. a company career site embedding the board) is left to the body checks
+        original_id = job_id_from_url(url)
+        same_host = urlparse(url).hostname == urlparse(final_url).hostname
+        if original_id and same_host and job_id_from_url(final_url) != original_id:
+            return "closed", f"The job page redirected to a page without the job ID: {final_url}."
+
+    if "html" not in response.headers.get("content-type", "html"):
+        return None
+    text = response.text[:MAX_BODY_CHARS]
+    body = text.lower()
+    # SPA bundles ship every UI string, so closed markers only count in the rendered markup
+    visible_body = " ".join(parse_cleaned_html(text).get_text(" ").lower().split())
+
+    for marker in CLOSED_MARKERS:
+        if marker in visible_body:
+            return "closed", f"The job page contains \"{marker}\"."
+
+    host = (urlparse(final_url).hostname or "").lower()
+    for domain, markers in OPEN_MARKERS.items():
+        if _matches_domain(host, domain):
+            for marker in markers:
+                if marker in body:
+                    return "open", f"The {domain} posting still shows its application form (\"{marker}\")."
+
+    return None
@@ -0,0 +1,109 @@
+import re
+from html.parser import HTMLParser
+from typing import List
+from urllib.parse import urljoin, urlparse, urldefrag
+
+# Job posting URL shapes of common applicant tracking systems, matched against absolute URLs
+ATS_JOB_PATTERNS = {
+    "greenhouse": re.compile(r"^https?://(?:boards|job-boards)(?:\.eu)?\.greenhouse\.io/[^/]+/jobs/\d+", re.IGNORECASE),
+    "greenhouse_embed": re.compile(r"[?&]gh_jid=\d+", re.IGNORECASE),
+    "lever": re.compile(r"^https?://jobs(?:\.eu)?\.lever\.co/[^/]+/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE),
+    "workday": re.compile(r"^https?://[^/]+\.myworkdayjobs\.com/(?:[a-z]{2}-[a-z]{2}/)?[^/]+/job/[^?#]+", re.IGNORECASE),
+    "ashby": re.compile(r"^https?://jobs\.ashbyhq\.com/[^/]+/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE),
+    "smartrecruiters": re.compile(r"^https?://jobs\.smartrecruiters\.com/[^/]+/\d+", re.IGNORECASE),
+    "icims": re.compile(r"^https?://[^/]+\.icims\.com/jobs/\d+", re.IGNORECASE),
+    "workable": re.compile(r"^https?://apply\.workable\.com/[^/]+/j/[0-9a-f]+", re.IGNORECASE),
+    "jobvite": re.compile(r"^https?://jobs\.jobvite\.com/[^/]+/job/\w+", re.IGNORECASE),
+}
+
+# Job posting paths of company career sites we audit, keyed by domain (subdomains included)
+DOMAIN_JOB_PATTERNS = {
+    "lifeattiktok.com": re.compile(r"^/search/\d+"),
+    "careers.google.com": re.compile(r"^/jobs/results/\d+"),
+    "google.com": re.compile(r"^/about/careers/applications/jobs/results/\d+"),
+    "amazon.jobs": re.compile(r"^/(?:[a-z]{2}/)?jobs/\d+"),
+    "metacareers.com": re.compile(r"^/jobs/\d+"),
+    "jobs.careers.microsoft.com": re.compile(r"^/global/[a-z]{2}/job/\d+"),
+    "jobs.apple.com": re.compile(r"^/[a-z]{2}-[a-z]{2}/details/\d+"),
+    "careers.salesforce.com": re.compile(r"^/[a-z]{2}/jobs/jr\d+", re.IGNORECASE),
+}
+
+
+class _AnchorParser(HTMLParser):
+    """Collects the href of every anchor in a document."""
+
+    def __init__(self):
+        super().__init__()
+        self.hrefs: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+
+
+def extract_anchor_urls(html: str, source_url: str) -> List[str]:
+    """
+    Collect absolute, de-duplicated anchor URLs from an HTML document, in document order.
+
+    Args:
+        html: HTML content of the listing page
+        source_url: URL of the listing page, used to resolve relative links
+
+    Returns:
+        List[str]: Absolute http(s) URLs without fragments
+    """
+    parser = _AnchorParser()
+    parser.feed(html)
+    parser.close()
+
+    urls = []
+    seen = set()
+    for href in parser.hrefs:
+        url, _ = urldefrag(urljoin(source_url, href.strip()))
+        if urlparse(url).scheme not in ("http", "https") or url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+    return urls
+
+
+def _matches_domain(host: str, domain: str) -> bool:
+    return host == domain or host.endswith(f".{domain}")
+
+
+def is_job_posting_url(url: str) -> bool:
+    """
+    Check a URL against the known ATS and per-domain job posting patterns.
+
+    Args:
+        url: Absolute URL
+
+    Returns:
+        bool: True if a rule identifies the URL as a job posting
+    """
+    if any(pattern.search(url) for pattern in ATS_JOB_PATTERNS.values()):
+        return True
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+    return any(
+        _matches_domain(host, domain) and pattern.search(path)
+        for domain, pattern in DOMAIN_JOB_PATTERNS.items()
+    )
+
+
+def extract_job_links_with_rules(html: str, source_url: str) -> List[str]:
+    """
+    Extract job posting links from a listing page using URL rules only.
+
+    Args:
+        html: HTML content of the listing page
+        source_url: URL of the listing page
+
+    Returns:
+        List[str]: Job posting URLs in document order, empty if no rule matched
+    """
+    return [url for url in extract_anchor_urls(html, source_url) if is_job_posting_url(url)]
@@ -1,96 +1,206 @@
 import sys
 from pathlib import Path
 from loguru import logger
+import asyncio
+import contextvars
 import os
+import shutil
 from datetime import datetime
-from src.services.cloud_storage import upload_file_to_bucket
+from typing import Dict, List, Optional
+from src.services.cloud_storage import upload_local_file_to_bucket
 
 # Create logs directory if it doesn't exist
 LOGS_DIR = Path("logs")
 LOGS_DIR.mkdir(exist_ok=True)
 
-def setup_logging(run_id: str):
+# Maximum number of files uploaded at the same time across all runs
+LOG_UPLOAD_CONCURRENCY = int(os.getenv("LOG_UPLOAD_CONCURRENCY", "8"))
+UPLOADED_FILE_PATTERNS = ["*.log", "*.txt", "*.html", "*.md"]
+CONTENT_TYPES = {".html": "text/html", ".md": "text/markdown"}
+
+_upload_semaphore = asyncio.Semaphore(LOG_UPLOAD_CONCURRENCY)
+# Uploads scheduled in the background, kept referenced until they finish
+_background_uploads: set[asyncio.Task] = set()
+
+CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <magenta>{extra[run_id]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+# Run whose file sinks receive the logs of the current task. Context variables are copied into
+# asyncio tasks and worker threads, so concurrent tasks each log to their own files.
+_current_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("log_run_id", default=None)
+# File sink IDs and the number of active tasks per run, as two tasks may share a run ID
+_run_sinks: Dict[str, List[int]] = {}
+_run_users: Dict[str, int] = {}
+
+
+def _add_run_id(record):
+    """Loguru patcher tagging each record with the run of the task that emitted it."""
+    record["extra"].setdefault("run_id", _current_run_id.get() or "-")
+
+
+logger.configure(patcher=_add_run_id)
+
+
+def configure_logging(level: str = "INFO"):
     """
-    Configure logging with both console and file output.
+    Configure the process-wide console sink. Called once at application startup.
     
     Args:
-        run_id: Optional identifier for the current run. If not provided, will use timestamp.
+        level: Minimum level written to the console
     """
-    # Remove default handler
     logger.remove()
-    # Ensure logs directory exists
-    os.makedirs(LOGS_DIR, exist_ok=True)
+    logger.add(sys.stdout, colorize=True, format=CONSOLE_FORMAT, level=level)
+
+
+def setup_logging(run_id: str):
+    """
+    Route the current task's logs to file sinks of its own run.
     
-    # Add console handler with colors
-    logger.add(
-        sys.stdout,
-        colorize=True,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level="INFO"
-    )
+    Only records emitted in the current context (this task and anything it awaits, spawns
+    or runs in worker threads) reach the run's files, so tasks can run concurrently in one
+    process. The sinks are removed again by release_logging or schedule_log_upload.
+    
+    Args:
+        run_id: Identifier of the run, used as the log directory name
+    """
+    _current_run_id.set(run_id)
+    _run_users[run_id] = _run_users.get(run_id, 0) + 1
+    if run_id in _run_sinks:
+        return run_id
     
     # Create run-specific log directory
     run_log_dir = LOGS_DIR / run_id
-    run_log_dir.mkdir(exist_ok=True)
-    
-    # Add file handler for all logs
-    logger.add(
-        run_log_dir / "all.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="DEBUG",
-        rotation="1 day",
-        retention="7 days",
-        mode="w"
-    )
-    
-    # Add file handler for errors only
-    logger.add(
-        run_log_dir / "errors.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="ERROR",
-        rotation="1 day",
-        retention="30 days",
-        mode="w"
-    )
+    run_log_dir.mkdir(parents=True, exist_ok=True)
+    
+    def belongs_to_run(record) -> bool:
+        return record["extra"].get("run_id") == run_id
+    
+    _run_sinks[run_id] = [
+        # File handler for all logs
+        logger.add(
+            run_log_dir / "all.log",
+            format=FILE_FORMAT,
+            filter=belongs_to_run,
+            level="DEBUG",
+            mode="w"
+        ),
+        # File handler for errors only
+        logger.add(
+            run_log_dir / "errors.log",
+            format=FILE_FORMAT,
+            filter=belongs_to_run,
+            level="ERROR",
+            mode="w"
+        ),
+    ]
     
     return run_id
 
-async def upload_logs_to_cloud(run_id: str, cloud_prefix: str):
+def release_logging(run_id: str) -> bool:
     """
-    Upload log files to cloud storage.
+    Stop the current task from logging to the run's files, closing them once no task uses the run.
     
     Args:
-        run_id: The identifier for the run whose logs should be uploaded
+        run_id: Identifier of the run passed to setup_logging
+        
+    Returns:
+        bool: True if this was the last task of the run and its files are complete
     """
-    run_log_dir = LOGS_DIR / run_id
+    if _current_run_id.get() == run_id:
+        _current_run_id.set(None)
+    remaining = _run_users.get(run_id, 1) - 1
+    if remaining > 0:
+        _run_users[run_id] = remaining
+        return False
+    _run_users.pop(run_id, None)
+    for sink_id in _run_sinks.pop(run_id, []):
+        logger.remove(sink_id)
+    return True
+
+async def discard_logs(run_id: str):
+    """
+    Close the current task's log sinks and delete the run's local files without uploading them.
     
-    if not run_log_dir.exists():
-        logger.warning(f"No logs found for run {run_id}")
-        return
+    If another task is still logging to the same run, the files are left to whichever finishes last.
     
-    log_files = list(run_log_dir.glob("*.log")) + list(run_log_dir.glob("*.txt")) + list(run_log_dir.glob("*.html")) + list(run_log_dir.glob("*.md"))
-    for log_file in log_files:
+    Args:
+        run_id: Identifier of the run passed to setup_logging
+    """
+    if not release_logging(run_id):
+        return
+    try:
+        await asyncio.to_thread(shutil.rmtree, LOGS_DIR / run_id, ignore_errors=True)
+    except Exception as e:
+        logger.error(f"Failed to delete local log directory: {str(e)}")
+
+async def _upload_log_file(log_file: Path, cloud_path: str) -> bool:
+    """Upload one file under the global upload limit, returning whether it succeeded."""
+    async with _upload_semaphore:
         try:
-            with open(log_file, 'r') as f:
-                content = f.read()
-            
-            date_str = datetime.now().strftime("%Y%m%d")
-            
-            # Upload to cloud storage
-            cloud_path = f"{cloud_prefix}/{date_str}/{run_id}/{log_file.name}"
-            await upload_file_to_bucket(
+            await upload_local_file_to_bucket(
                 file_path=cloud_path,
-                content=content,
-                content_type="text/plain"
+                local_path=str(log_file),
+                content_type=CONTENT_TYPES.get(log_file.suffix, "text/plain")
             )
             logger.info(f"Uploaded {log_file.name} to cloud storage")
+            return True
         except Exception as e:
             logger.error(f"Failed to upload {log_file.name}: {str(e)}")
+            return False
+
+async def upload_logs_to_cloud(run_id: str, cloud_prefix: str):
+    """
+    Upload log files and saved page content of a run to cloud storage, then delete them locally.
     
-    # Delete the run log directory after successful upload
+    Files are streamed from disk gzip-compressed and uploaded concurrently.
+    
+    Args:
+        run_id: The identifier for the run whose logs should be uploaded
+        cloud_prefix: Folder in the bucket the run's files are stored under
+    """
+    run_log_dir = LOGS_DIR / run_id
+    
+    if not run_log_dir.exists():
+        logger.warning(f"No logs found for run {run_id}")
+        return
+    
+    date_str = datetime.now().strftime("%Y%m%d")
+    log_files = [log_file for pattern in UPLOADED_FILE_PATTERNS for log_file in run_log_dir.glob(pattern)]
+    results = await asyncio.gather(*[
+        _upload_log_file(log_file, f"{cloud_prefix}/{date_str}/{run_id}/{log_file.name}")
+        for log_file in log_files
+    ])
+    logger.info(f"Uploaded {sum(results)}/{len(log_files)} files for run {run_id}")
+    
+    # Delete the run log directory after the upload
     try:
-        import shutil
-        shutil.rmtree(run_log_dir)
+        await asyncio.to_thread(shutil.rmtree, run_log_dir)
         logger.info(f"Deleted local log directory for run {run_id}")
     except Exception as e:
-        logger.error(f"Failed to delete local log directory: {str(e)}") 
\ No newline at end of file
+        logger.error(f"Failed to delete local log directory: {str(e)}")
+
+def schedule_log_upload(run_id: str, cloud_prefix: str) -> Optional[asyncio.Task]:
+    """
+    Close the current task's log sinks and upload the run's logs in the background, so the
+    task can respond without waiting for it. If another task is still logging to the same
+    run, the upload is left to whichever finishes last.
+    
+    Args:
+        run_id: The identifier for the run whose logs should be uploaded
+        cloud_prefix: Folder in the bucket the run's files are stored under
+        
+    Returns:
+        Optional[asyncio.Task]: The scheduled upload, or None if the run is still in use
+    """
+    if not release_logging(run_id):
+        return None
+    task = asyncio.create_task(upload_logs_to_cloud(run_id, cloud_prefix))
+    _background_uploads.add(task)
+    task.add_done_callback(_background_uploads.discard)
+    return task
+
+async def drain_log_uploads():
+    """Wait for every scheduled background upload to finish, e.g. before shutdown."""
+    if _background_uploads:
+        logger.info(f"Waiting for {len(_background_uploads)} log uploads to finish")
+        await asyncio.gather(*list(_background_uploads), return_exceptions=True)
@@ -0,0 +1,106 @@
+from typing import List, Optional
+import asyncio
+import os
+import httpx
+from loguru import logger
+from src.services.http_client import get_http_client
+from src.services.domain_limiter import DomainLimitTimeout, domain_limiter
+
+PRECHECK_CONCURRENCY = int(os.getenv("PRECHECK_CONCURRENCY", "20"))
+
+# Status codes that mean the page is gone, as opposed to a bot wall or rate limit
+GONE_STATUS_CODES = {404, 410}
+
+
+def extract_validators(response: httpx.Response) -> dict:
+    """
+    Pull the cache validators used to detect page changes out of a response.
+
+    Args:
+        response: Response from a HEAD or GET request
+
+    Returns:
+        dict: etag, lastModified, contentLength and statusCode (values may be None)
+    """
+    content_length = response.headers.get("content-length")
+    return {
+        "etag": response.headers.get("etag"),
+        "lastModified": response.headers.get("last-modified"),
+        "contentLength": int(content_length) if content_length and content_length.isdigit() else None,
+        "statusCode": response.status_code,
+    }
+
+
+async def fetch_page_validators(url: str) -> Optional[dict]:
+    """
+    Fetch cache validators for a URL with a HEAD request, falling back to a GET whose body is not read.
+
+    Args:
+        url: URL of the page
+
+    Returns:
+        Optional[dict]: Validators from extract_validators, or None if the request failed
+    """
+    client = get_http_client()
+    try:
+        response = await client.head(url)
+        if response.status_code in (405, 501):
+            async with client.stream("GET", url) as response:
+                return extract_validators(response)
+        return extract_validators(response)
+    except httpx.HTTPError as e:
+        logger.debug(f"Precheck failed for {url}: {str(e)}")
+        return None
+
+
+def page_changed(previous: dict, current: Optional[dict]) -> bool:
+    """
+    Decide whether a page changed since the validators in `previous` were recorded.
+
+    Only validators present on both sides are compared, so a site that sends none is
+    treated as unchanged and left to the audit TTL.
+
+    Args:
+        previous: Stored audit row holding etag, lastModified and contentLength
+        current: Freshly fetched validators, or None if the precheck failed
+
+    Returns:
+        bool: True if the page is gone or any comparable validator differs
+    """
+    if not current:
+        return False
+    if current.get("statusCode") in GONE_STATUS_CODES:
+        return True
+    for field in ("etag", "lastModified", "contentLength"):
+        if previous.get(field) is not None and current.get(field) is not None and previous[field] != current[field]:
+            return True
+    return False
+
+
+async def fetch_validators_for_urls(urls: List[str], concurrency: int = PRECHECK_CONCURRENCY) -> List[Optional[dict]]:
+    """
+    Fetch validators for many URLs with bounded concurrency.
+
+    Each request also takes a slot from `domain_limiter`, so prechecks share the per-domain
+    rate and concurrency limits with the audits instead of bursting at one host. A URL whose
+    domain has no free slot within DOMAIN_MAX_WAIT_SECONDS is treated as a failed precheck.
+
+    Args:
+        urls: URLs to precheck
+        concurrency: Maximum number of requests in flight
+
+    Returns:
+        List[Optional[dict]]: Validators for each URL, in input order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(url: str) -> Optional[dict]:
+        async with semaphore:
+            try:
+                async with domain_limiter.limit(url):
+                    return await fetch_page_validators(url)
+            except DomainLimitTimeout as e:
+                logger.debug(f"Precheck skipped for {url}: {str(e)}")
+                return None
+
+    return await asyncio.gather(*[fetch(url) for url in urls])
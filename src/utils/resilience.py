@@ -0,0 +1,204 @@
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one dependency.
+
+    After `failure_threshold` transient failures in a row the circuit opens and calls fail
+    immediately with CircuitOpenError. Once `recovery_seconds` have passed, a single trial
+    call is let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may go through."""
+        if self._opened_at is None:
+            return
+        now = time.monotonic()
+        remaining = self._opened_at + self.recovery_seconds - now
+        # A trial that never reported back (e.g. it was cancelled) stops blocking after recovery_seconds
+        trial_pending = self._trial_started_at is not None and now - self._trial_started_at < self.recovery_seconds
+        if remaining > 0 or trial_pending:
+            raise CircuitOpenError(f"{self.name} circuit is open, retry in {max(remaining, 0):.0f}s")
+        self._trial_started_at = now
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info(f"{self.name} circuit closed")
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_started_at = None
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.error(f"{self.name} circuit opened after {self._failures} consecutive failures")
+            self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (starting at 1)."""
+    return random.uniform(0, min(max_seconds, base_seconds * 2 ** (attempt - 1)))
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Numeric Retry-After of the HTTP response attached to an error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def is_not_rate_limited(error: BaseException) -> bool:
+    """Breaker failure classifier that leaves out 429s: a throttling provider is up, just busy."""
+    return getattr(getattr(error, "response", None), "status_code", None) != 429
+
+
+class Dependency:
+    """
+    Retry, backoff, circuit breaking and deadlines for calls to one external provider.
+
+    `is_transient` decides whether an error is worth retrying and counts against the circuit
+    breaker. Errors that are not transient (bad requests, auth errors) are raised at once and
+    count as the provider being up. `is_breaker_failure` narrows which transient errors count
+    against the breaker, e.g. so rate limits are retried without opening the circuit; those
+    count as the provider being up too. A call that exceeds its deadline is treated as
+    transient, but only retried when the call is idempotent, since the provider may have
+    processed it.
+
+    The deadline is enforced with asyncio.wait_for only for native coroutines. Cancelling a call
+    that runs in a thread does not stop the thread, so the request could still be applied after
+    it was given up on; threaded calls must enforce `deadline_seconds` as their client's own
+    request timeout instead.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_transient: Callable[[BaseException, bool], bool],
+        max_attempts: int,
+        base_delay_seconds: float,
+        max_delay_seconds: float,
+        deadline_seconds: Optional[float],
+        breaker: CircuitBreaker,
+        is_breaker_failure: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.name = name
+        self.is_transient = is_transient
+        self.is_breaker_failure = is_breaker_failure or (lambda error: True)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.deadline_seconds = deadline_seconds
+        self.breaker = breaker
+
+    async def call(self, func: Callable[[], Awaitable[T]], idempotent: bool = True, label: Optional[str] = None, threaded: bool = False) -> T:
+        """
+        Call the provider, retrying transient failures with jittered exponential backoff.
+
+        Args:
+            func: Zero-argument function returning a new awaitable for each attempt
+            idempotent: Whether the call can be repeated after it may have been processed
+            label: Name used to identify the call in logs
+            threaded: Whether `func` runs the call in a thread, in which case no wait_for deadline is applied
+
+        Returns:
+            The result of `func`
+
+        Raises:
+            CircuitOpenError: If the dependency's circuit breaker is open
+            asyncio.TimeoutError: If the last attempt exceeded the deadline
+        """
+        label = label or self.name
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.before_call()
+            try:
+                if self.deadline_seconds and not threaded:
+                    result = await asyncio.wait_for(func(), timeout=self.deadline_seconds)
+                else:
+                    result = await func()
+            except asyncio.TimeoutError as e:
+                self.breaker.record_failure()
+                if not idempotent or attempt == self.max_attempts:
+                    raise
+                error, reason = e, f"no response within {self.deadline_seconds:.0f}s"
+            except Exception as e:
+                # The breaker tracks provider health, so e.g. a read timeout counts as a failure
+                # even for a non-idempotent call that must not be retried
+                if self.is_transient(e, True) and self.is_breaker_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if not self.is_transient(e, idempotent) or attempt == self.max_attempts or self.breaker.is_open:
+                    raise
+                error, reason = e, str(e) or type(e).__name__
+            else:
+                self.breaker.record_success()
+                return result
+
+            retry_after = retry_after_seconds(error)
+            delay = min(retry_after, self.max_delay_seconds) if retry_after else backoff_delay(attempt, self.base_delay_seconds, self.max_delay_seconds)
+            logger.warning(f"{label} failed ({reason}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+            await asyncio.sleep(delay)
+
+
+def dependency_from_env(
+    name: str,
+    prefix: str,
+    is_transient: Callable[[BaseException, bool], bool],
+    max_attempts: int = 3,
+    base_delay_seconds: float = 0.5,
+    max_delay_seconds: float = 20.0,
+    deadline_seconds: Optional[float] = None,
+    failure_threshold: int = 5,
+    recovery_seconds: float = 30.0,
+    is_breaker_failure: Optional[Callable[[BaseException], bool]] = None,
+) -> Dependency:
+    """
+    Build a Dependency whose defaults can be overridden with <prefix>_MAX_ATTEMPTS,
+    <prefix>_RETRY_BASE_SECONDS, <prefix>_RETRY_MAX_SECONDS, <prefix>_DEADLINE_SECONDS (0 disables it),
+    <prefix>_BREAKER_FAILURES and <prefix>_BREAKER_RECOVERY_SECONDS.
+    """
+    deadline = float(os.getenv(f"{prefix}_DEADLINE_SECONDS", str(deadline_seconds or 0)))
+    return Dependency(
+        name=name,
+        is_transient=is_transient,
+        max_attempts=int(os.getenv(f"{prefix}_MAX_ATTEMPTS", str(max_attempts))),
+        base_delay_seconds=float(os.getenv(f"{prefix}_RETRY_BASE_SECONDS", str(base_delay_seconds))),
+        max_delay_seconds=float(os.getenv(f"{prefix}_RETRY_MAX_SECONDS", str(max_delay_seconds))),
+        deadline_seconds=deadline or None,
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", str(failure_threshold))),
+            recovery_seconds=float(os.getenv(f"{prefix}_BREAKER_RECOVERY_SECONDS", str(recovery_seconds))),
+        ),
+        is_breaker_failure=is_breaker_failure,
+    )
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import hashlib
+import json
+import os
+import time
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+# Fallback expiry for cached responses; writes made by this process invalidate them sooner
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    tags: frozenset
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    In-memory cache of serialized JSON responses, invalidated by table tags.
+
+    Each entry is tagged with the tables it was read from. Writes to a table call
+    invalidate() with its tag, which drops the entries and bumps the tag's version so a
+    read that started before the write cannot store its stale result afterwards.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def versions(self, tags: Iterable[str]) -> tuple:
+        """Snapshot of the tags' versions, taken before reading the data to cache."""
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def set(self, key: str, body: bytes, tags: Iterable[str], versions: tuple) -> CachedResponse:
+        """
+        Store a response body, unless one of its tags was invalidated since `versions` was taken.
+
+        Returns:
+            CachedResponse: The entry, returned even when it was too stale to store
+        """
+        tags = tuple(tags)
+        entry = CachedResponse(
+            body=body,
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            tags=frozenset(tags),
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        if self.versions(tags) == versions:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry read from any of the given tables."""
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+        stale_keys = [key for key, entry in self._entries.items() if entry.tags.intersection(tags)]
+        for key in stale_keys:
+            del self._entries[key]
+        if stale_keys:
+            logger.debug(f"Invalidated {len(stale_keys)} cached responses for {', '.join(tags)}")
+
+
+response_cache = ResponseCache(ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def _cache_key(request: Request) -> str:
+    return f"{request.url.path}?{'&'.join(sorted(f'{key}={value}' for key, value in request.query_params.multi_items()))}"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+async def cached_json_response(request: Request, tags: Iterable[str], produce: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Serve a JSON response through the response cache, keyed by route path and query.
+
+    Responses carry a content-based ETag. A request whose If-None-Match matches gets a
+    304 without a body, and without a database query while the entry is cached.
+
+    Args:
+        request: The incoming request
+        tags: Tables the response is read from
+        produce: Coroutine function returning the JSON-serializable data on a cache miss
+
+    Returns:
+        Response: 200 with the JSON body, or 304
+    """
+    tags = tuple(tags)
+    key = _cache_key(request)
+    entry = response_cache.get(key)
+    if entry is None:
+        versions = response_cache.versions(tags)
+        data = await produce()
+        body = json.dumps(jsonable_encoder(data), separators=(",", ":")).encode("utf-8")
+        entry = response_cache.set(key, body, tags, versions)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
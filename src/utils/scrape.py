@@ -19,7 +19,7 @@ async def get_job_postings(url: str, taskId: str, company_id: str, role_type: st
             raise HTTPException(status_code=404, detail="No response received for url")
         
         url_extraction_agent = URLExtractionAgent()
-        response = url_extraction_agent.extract_job_links(markdown_content, url)
+        response = await url_extraction_agent.extract_job_links(markdown_content, url, html)
             
         job_postings = response.job_postings if response else []
         
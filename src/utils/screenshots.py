@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from typing import Literal
+import asyncio
+import base64
+import os
+from loguru import logger
+from playwright.async_api import Page
+
+# Encoding of screenshots sent to the vision model and stored: webp, jpeg or png
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "webp").lower()
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "70"))
+# GPT-4o scales images to fit 2048x2048 and then to 768px on the short side, so larger images
+# only add bytes. Lower values trade detail for fewer vision tokens.
+SCREENSHOT_MAX_LONG_SIDE = int(os.getenv("SCREENSHOT_MAX_LONG_SIDE", "2048"))
+SCREENSHOT_MAX_SHORT_SIDE = int(os.getenv("SCREENSHOT_MAX_SHORT_SIDE", "768"))
+SCREENSHOT_DETAIL = os.getenv("SCREENSHOT_DETAIL", "auto")
+# Also capture a full-size PNG to log how many bytes the pipeline saves
+SCREENSHOT_LOG_PNG_BASELINE = os.getenv("SCREENSHOT_LOG_PNG_BASELINE", "false").lower() == "true"
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+
+
+@dataclass
+class Screenshot:
+    """An encoded screenshot with its base64 form for the vision prompt."""
+    data: bytes
+    base64: str
+    format: Literal["webp", "jpeg", "png"]
+    width: int
+    height: int
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.content_type};base64,{self.base64}"
+
+
+def fit_scale(width: float, height: float, max_long_side: int = SCREENSHOT_MAX_LONG_SIDE, max_short_side: int = SCREENSHOT_MAX_SHORT_SIDE) -> float:
+    """
+    Scale factor that fits an image within the long and short side limits, never upscaling.
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        max_long_side: Maximum length of the longer side
+        max_short_side: Maximum length of the shorter side
+
+    Returns:
+        float: Factor between 0 and 1
+    """
+    if width <= 0 or height <= 0:
+        return 1.0
+    return min(1.0, max_long_side / max(width, height), max_short_side / min(width, height))
+
+
+async def capture_screenshot(page: Page, format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY) -> Screenshot:
+    """
+    Capture the viewport downscaled to the vision model's resolution and encoded by the browser.
+
+    Chromium resizes and encodes the image through the DevTools Page.captureScreenshot command,
+    so no image processing happens in this process. Pages that do not support a CDP session fall
+    back to a full-size JPEG from Playwright.
+
+    Args:
+        page: Playwright page to capture
+        format: webp, jpeg or png
+        quality: Compression quality from 0 to 100 for webp and jpeg
+
+    Returns:
+        Screenshot: The encoded image
+    """
+    if format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported screenshot format: {format}")
+
+    scroll_x, scroll_y, width, height, pixel_ratio = await page.evaluate(
+        "() => [window.scrollX, window.scrollY, window.innerWidth, window.innerHeight, window.devicePixelRatio]"
+    )
+    scale = fit_scale(width * pixel_ratio, height * pixel_ratio)
+    params = {
+        "format": format,
+        # The clip is in CSS pixels, and the capture is additionally multiplied by the device pixel ratio
+        "clip": {"x": scroll_x, "y": scroll_y, "width": width, "height": height, "scale": scale},
+    }
+    if format != "png":
+        params["quality"] = quality
+
+    try:
+        cdp = await page.context.new_cdp_session(page)
+        try:
+            encoded = (await cdp.send("Page.captureScreenshot", params))["data"]
+        finally:
+            await cdp.detach()
+        data = await asyncio.to_thread(base64.b64decode, encoded)
+        screenshot = Screenshot(data, encoded, format, round(width * pixel_ratio * scale), round(height * pixel_ratio * scale))
+    except Exception as e:
+        logger.warning(f"CDP screenshot failed, falling back to a Playwright JPEG: {str(e)}")
+        data = await page.screenshot(type="jpeg", quality=quality)
+        encoded = await asyncio.to_thread(lambda: base64.b64encode(data).decode("utf-8"))
+        screenshot = Screenshot(data, encoded, "jpeg", round(width * pixel_ratio), round(height * pixel_ratio))
+
+    if SCREENSHOT_LOG_PNG_BASELINE:
+        baseline = len(await page.screenshot())
+        logger.info(
+            f"Screenshot {screenshot.width}x{screenshot.height} {screenshot.format}: {len(screenshot.data)} bytes "
+            f"vs {baseline} bytes as full-size PNG ({len(screenshot.data) / baseline:.1%})"
+        )
+    else:
+        logger.info(f"Screenshot {screenshot.width}x{screenshot.height} {screenshot.format}: {len(screenshot.data)} bytes")
+    return screenshot
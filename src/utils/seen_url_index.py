@@ -0,0 +1,157 @@
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+import asyncio
+import hashlib
+import os
+import struct
+import time
+from loguru import logger
+from src.utils.canonical_url import canonicalize_url
+
+SEEN_URL_INDEX_PATH = os.getenv("SEEN_URL_INDEX_PATH", "cache/seen_canonical_urls.idx")
+# Seconds before the index is topped up with URLs scraped since its last refresh
+SEEN_URL_INDEX_REFRESH_SECONDS = float(os.getenv("SEEN_URL_INDEX_REFRESH_SECONDS", "300"))
+# Seconds before the index is rebuilt from scratch, dropping URLs whose rows were deleted
+SEEN_URL_INDEX_REBUILD_SECONDS = float(os.getenv("SEEN_URL_INDEX_REBUILD_SECONDS", "21600"))
+
+# Snapshot format: magic, highest row ID, rebuild time, then the sorted 64-bit hashes
+_MAGIC = b"SUI2"
+_HEADER = struct.Struct("<4sqq")
+_DIGEST_SIZE = 8
+
+
+def url_digest(url: str) -> int:
+    """64-bit hash of a URL's canonical form; collisions are negligible at the number of postings we store."""
+    return int.from_bytes(hashlib.blake2b(canonicalize_url(url).encode("utf-8"), digest_size=_DIGEST_SIZE).digest(), "little")
+
+
+class SeenUrlIndex:
+    """
+    Local index of URLs already stored in scraped_positions, keyed by canonical URL.
+
+    Holds a 64-bit hash per URL plus the highest row ID read, so refreshes only fetch rows
+    added since. A hit means the URL was scraped before and needs no database lookup; a
+    miss still has to be checked against the database, as another instance may have
+    stored it since the last refresh. The index is snapshotted to disk as the row ID and
+    rebuild time followed by the sorted hashes, so a restarted instance only fetches what is new.
+
+    Refreshes run in a background task, so a request never waits for one; until the first
+    load finishes every URL is a miss and is checked against the database. Top-ups only see
+    new rows, so the index is rebuilt from scratch every rebuild_seconds to forget URLs whose
+    rows were deleted; until then such URLs are still skipped.
+    """
+
+    def __init__(self, path: str, refresh_seconds: float, rebuild_seconds: float):
+        self.path = Path(path)
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._digests: set[int] = set()
+        self._max_id = 0
+        self._refreshed_at = 0.0
+        # Wall-clock time of the last full rebuild, kept in the snapshot across restarts
+        self._rebuilt_at = 0
+        self._loaded = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def __contains__(self, url: str) -> bool:
+        return url_digest(url) in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def add(self, urls: Iterable[str]) -> None:
+        """Record URLs known to be stored, e.g. right after inserting them."""
+        self._digests.update(url_digest(url) for url in urls)
+
+    def _load_snapshot(self) -> None:
+        if not self.path.exists():
+            return
+        data = self.path.read_bytes()
+        if len(data) < _HEADER.size or data[:len(_MAGIC)] != _MAGIC or (len(data) - _HEADER.size) % _DIGEST_SIZE:
+            logger.warning(f"Ignoring corrupt or outdated seen URL snapshot {self.path}")
+            return
+        _, self._max_id, self._rebuilt_at = _HEADER.unpack_from(data)
+        body = memoryview(data)[_HEADER.size:]
+        self._digests.update(
+            int.from_bytes(body[offset:offset + _DIGEST_SIZE], "little")
+            for offset in range(0, len(body), _DIGEST_SIZE)
+        )
+
+    def _save_snapshot(self, max_id: int, rebuilt_at: int, digests: List[int]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, max_id, rebuilt_at))
+            f.write(b"".join(digest.to_bytes(_DIGEST_SIZE, "little") for digest in sorted(digests)))
+        os.replace(temp_path, self.path)
+
+    def refresh_in_background(self, iter_rows_after: Callable[[int], AsyncIterator[List[dict]]]) -> None:
+        """
+        Start a background refresh when one is due and none is running.
+
+        The first refresh loads the snapshot. Each refresh then either rebuilds the index, when
+        the last rebuild is older than rebuild_seconds, or fetches rows added since the last one.
+
+        Args:
+            iter_rows_after: Yields pages of rows with id, url and canonical_url, ordered by id, after the given ID
+        """
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        if self._loaded and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        self._refresh_task = asyncio.create_task(self._refresh(iter_rows_after))
+
+    async def _refresh(self, iter_rows_after: Callable[[int], AsyncIterator[List[dict]]]) -> None:
+        try:
+            if not self._loaded:
+                await asyncio.to_thread(self._load_snapshot)
+                self._loaded = True
+                logger.info(f"Loaded {len(self._digests)} seen URLs up to row {self._max_id}")
+
+            if time.time() - self._rebuilt_at >= self.rebuild_seconds:
+                await self._rebuild(iter_rows_after)
+                changed = True
+            else:
+                changed = await self._top_up(iter_rows_after) > 0
+
+            if changed:
+                await asyncio.to_thread(self._save_snapshot, self._max_id, self._rebuilt_at, list(self._digests))
+        except Exception as e:
+            logger.warning(f"Failed to refresh the seen URL index: {str(e)}")
+        finally:
+            # Failed refreshes are retried after refresh_seconds too, rather than on every lookup
+            self._refreshed_at = time.monotonic()
+
+    async def _top_up(self, iter_rows_after: Callable[[int], AsyncIterator[List[dict]]]) -> int:
+        """Add rows stored since the last refresh, returning how many were read."""
+        added = 0
+        async for page in iter_rows_after(self._max_id):
+            self.add(row.get("canonical_url") or row["url"] for row in page if row.get("url"))
+            self._max_id = max(self._max_id, page[-1]["id"])
+            added += len(page)
+        if added:
+            logger.info(f"Added {added} scraped rows to the seen URL index ({len(self._digests)} URLs)")
+        return added
+
+    async def _rebuild(self, iter_rows_after: Callable[[int], AsyncIterator[List[dict]]]) -> None:
+        """
+        Replace the index with every stored row.
+
+        URLs added while the rebuild runs belong to rows it reads or to rows after its last
+        ID, which the next top-up fetches, so swapping in the new set loses nothing.
+        """
+        digests: set[int] = set()
+        max_id = 0
+        rows = 0
+        async for page in iter_rows_after(0):
+            digests.update(url_digest(row.get("canonical_url") or row["url"]) for row in page if row.get("url"))
+            max_id = max(max_id, page[-1]["id"])
+            rows += len(page)
+        removed = len(self._digests - digests)
+        self._digests = digests
+        self._max_id = max_id
+        self._rebuilt_at = int(time.time())
+        logger.info(f"Rebuilt the seen URL index from {rows} scraped rows ({len(digests)} URLs, {removed} dropped)")
+
+
+seen_url_index = SeenUrlIndex(SEEN_URL_INDEX_PATH, SEEN_URL_INDEX_REFRESH_SECONDS, SEEN_URL_INDEX_REBUILD_SECONDS)
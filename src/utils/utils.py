@@ -1,8 +1,9 @@
 import re
 import os
+import asyncio
 from urllib.parse import urlparse
-from src.services.cloud_storage import upload_file_to_bucket
-from markdownify import markdownify as md
+from bs4 import BeautifulSoup
+from markdownify import MarkdownConverter
 
 def sanitize_url_for_filename(url: str) -> str:
     """
@@ -55,9 +56,44 @@ def save_content_to_files(html_content: str, markdown_content: str, pathname: st
     with open(markdown_filename, 'w', encoding='utf-8') as f:
         f.write(markdown_content)
 
-async def get_markdown_content(html: str):
+# Elements that never carry job content: scripts, styling, media, and site chrome
+STRIPPED_TAGS = ["script", "style", "noscript", "template", "head", "svg", "img", "iframe", "nav", "footer"]
+MARKDOWN_CONVERTED_TAGS = ['a', 'button', 'div', 'span', 'li', 'h1', 'h2', 'h3', 'h4', 'p', 'tr']
+
+# lxml is faster when installed; html.parser ships with Python
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+_markdown_converter = MarkdownConverter(convert=MARKDOWN_CONVERTED_TAGS)
+
+
+def parse_cleaned_html(html: str) -> BeautifulSoup:
+    """
+    Parse an HTML document into a tree without the elements in STRIPPED_TAGS.
+    
+    Args:
+        html (str): The HTML content to parse
+        
+    Returns:
+        BeautifulSoup: The cleaned tree
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    for element in soup.find_all(STRIPPED_TAGS):
+        # Elements nested inside an already removed element are gone too
+        if not element.decomposed:
+            element.decompose()
+    return soup
+
+
+def convert_html_to_markdown(html: str) -> tuple[str, str]:
     """
-    Get the markdown content from a HTML string and save to files.
+    Clean an HTML document and convert it to markdown with a single parse.
+    
+    The document is parsed into a tree once, unwanted elements are removed from the tree,
+    and the same tree is serialized as cleaned HTML and rendered as markdown.
     
     Args:
         html (str): The HTML content to process
@@ -65,13 +101,23 @@ async def get_markdown_content(html: str):
     Returns:
         tuple[str, str]: A tuple containing (html_content, markdown_content)
     """
-    # Strip unwanted tags
-    cleaned_html = re.sub(r'<(script|img|head|style|footer)[^>]*>.*?</\1>|<(script|img|head|style|footer)[^>]*?/>', '', html, flags=re.DOTALL)
+    soup = parse_cleaned_html(html)
+    return str(soup), _markdown_converter.convert_soup(soup)
+
+
+async def get_markdown_content(html: str):
+    """
+    Get the markdown content from a HTML string.
     
-    # Convert HTML to Markdown
-    markdown_content = md(cleaned_html, convert=['a', 'button', 'div', 'span', 'li', 'h1', 'h2', 'h3', 'h4', 'p', 'tr'])
+    Conversion is CPU-bound on large pages, so it runs in a worker thread.
     
-    return cleaned_html, markdown_content
+    Args:
+        html (str): The HTML content to process
+        
+    Returns:
+        tuple[str, str]: A tuple containing (html_content, markdown_content)
+    """
+    return await asyncio.to_thread(convert_html_to_markdown, html)
 
 
 